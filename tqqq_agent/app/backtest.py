@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from .ensemble import lgb_bull_prob, voter_signals, vote
+from .features import FEATURE_COLS
+from .utils import build_features, fetch_ohlcv, lstm_windows
+
+logger = logging.getLogger('tqqq_agent')
+
+TRADING_DAYS = 252
+
+
+def _lstm_bull_series(models, df: pd.DataFrame, seq_len: int, batch_size: Optional[int]) -> np.ndarray:
+    out = np.full(len(df), np.nan)
+    if len(df) < seq_len:
+        return out
+    windows = lstm_windows(df, FEATURE_COLS, seq_len=seq_len)
+    out[seq_len - 1:] = models.predict_lstm_windows(windows, batch_size=batch_size)[:, 0]
+    return out
+
+
+def voter_probs(df: pd.DataFrame, models, seq_len: int = 252, batch_size: Optional[int] = None,
+                trade_close: Optional[pd.Series] = None, leverage: float = 3.0) -> pd.DataFrame:
+    # Per-row inputs of every voter over the whole history, computed in batches.
+    # next_ret is the return earned by holding the traded instrument from row t to t+1:
+    # trade_close (e.g. TQQQ) where available, else QQQ scaled by leverage.
+    close = df['QQQ']
+    feats = df[FEATURE_COLS].to_numpy(dtype=np.float64)
+    out = pd.DataFrame(index=df.index)
+    out['close'] = close
+    out['sma200'] = close.rolling(200).mean()
+    out['lgb_prob'] = lgb_bull_prob(models.predict_lgb_prob(models.scaler.transform(feats)))
+    out['lstm_bull'] = _lstm_bull_series(models, df, seq_len, batch_size)
+    next_ret = close.pct_change().shift(-1) * leverage
+    if trade_close is not None:
+        traded = trade_close.reindex(df.index).pct_change().shift(-1)
+        next_ret = traded.fillna(next_ret)
+    out['next_ret'] = next_ret
+    # rows where every voter is defined and a next-day return exists
+    return out.dropna()
+
+
+def evaluate(probs: pd.DataFrame, th_lgb: float, th_lstm: float, th_vote: int,
+             cost_bps: float = 0.0) -> Dict:
+    close = probs['close'].to_numpy()
+    next_ret = probs['next_ret'].to_numpy()
+    signal_sma, signal_lgb, signal_lstm = voter_signals(
+        close, probs['sma200'].to_numpy(), probs['lgb_prob'].to_numpy(),
+        probs['lstm_bull'].to_numpy(), th_lgb, th_lstm)
+    _, long = vote(signal_sma, signal_lgb, signal_lstm, th_vote)
+    position = long.astype(np.float64)
+
+    trades = np.abs(np.diff(position, prepend=0.0))
+    strat_ret = position * next_ret - trades * cost_bps / 1e4
+    equity = pd.Series(np.cumprod(1.0 + strat_ret), index=probs.index, name='equity')
+
+    up = next_ret > 0
+    hit_rate = {name: float(np.mean(sig.astype(bool) == up)) if len(up) else float('nan')
+                for name, sig in (('sma', signal_sma), ('lgb', signal_lgb),
+                                  ('lstm', signal_lstm), ('vote', long))}
+    years = len(position) / TRADING_DAYS
+    return {
+        'equity': equity,
+        'position': pd.Series(position, index=probs.index, name='position'),
+        'total_return': float(equity.iloc[-1] - 1.0) if len(equity) else 0.0,
+        'turnover': float(trades.sum()),
+        'turnover_per_year': float(trades.sum() / years) if years else 0.0,
+        'exposure': float(position.mean()) if len(position) else 0.0,
+        'hit_rate': hit_rate,
+    }
+
+
+def run_backtest(df: pd.DataFrame, models, th_lgb: float, th_lstm: float, th_vote: int,
+                 seq_len: int = 252, batch_size: Optional[int] = None, trade_close: Optional[pd.Series] = None,
+                 leverage: float = 3.0, cost_bps: float = 0.0) -> Dict:
+    probs = voter_probs(df, models, seq_len=seq_len, batch_size=batch_size,
+                        trade_close=trade_close, leverage=leverage)
+    result = evaluate(probs, th_lgb, th_lstm, th_vote, cost_bps=cost_bps)
+    result['probs'] = probs
+    return result
+
+
+def main(argv=None):
+    from .main import (MODEL_DIR, LGB_FILE, LSTM_FILE, SCALER_FILE, BAR_CACHE_DIR,
+                       TH_LGB, TH_LSTM, TH_VOTE)
+    from .models import Models
+
+    parser = argparse.ArgumentParser(description='Walk-forward backtest of the three-vote ensemble')
+    parser.add_argument('--period', default='max', help="history to replay, e.g. '10y' or 'max'")
+    parser.add_argument('--trade-symbol', default='TQQQ')
+    parser.add_argument('--leverage', type=float, default=3.0,
+                        help='QQQ multiplier used before the traded symbol has history')
+    parser.add_argument('--cost-bps', type=float, default=0.0)
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='LSTM windows per forward pass (default LSTM_BATCH_SIZE)')
+    parser.add_argument('--thresh-lgb', type=float, default=TH_LGB)
+    parser.add_argument('--thresh-lstm', type=float, default=TH_LSTM)
+    parser.add_argument('--thresh-vote', type=int, default=TH_VOTE)
+    args = parser.parse_args(argv)
+
+    models = Models(MODEL_DIR, LGB_FILE, LSTM_FILE, SCALER_FILE)
+    models.load()
+
+    bars = fetch_ohlcv(['QQQ', '^VIX', args.trade_symbol], period=args.period, interval='1d',
+                       cache_dir=BAR_CACHE_DIR)
+    df = bars['Adj Close'][['QQQ', '^VIX']].dropna()
+    df.columns = ['QQQ', 'VIX']
+    df = build_features(df, bars['Volume']['QQQ'])
+
+    result = run_backtest(df, models, args.thresh_lgb, args.thresh_lstm, args.thresh_vote,
+                          batch_size=args.batch_size, trade_close=bars['Adj Close'][args.trade_symbol],
+                          leverage=args.leverage, cost_bps=args.cost_bps)
+    equity = result['equity']
+    if equity.empty:
+        logger.error('Not enough history to backtest: %d feature rows', len(df))
+        return result
+    logger.info('Backtest %s → %s (%d days)', equity.index[0].date(), equity.index[-1].date(), len(equity))
+    logger.info('Total return: %.1f%%  exposure: %.0f%%', 100 * result['total_return'], 100 * result['exposure'])
+    logger.info('Turnover: %.0f switches (%.1f/yr)', result['turnover'], result['turnover_per_year'])
+    for name, rate in result['hit_rate'].items():
+        logger.info('Hit rate %-4s: %.3f', name, rate)
+    return result
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    main()
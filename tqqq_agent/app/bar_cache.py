@@ -0,0 +1,150 @@
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# OHLCV fields stored per ticker, in column order of the on-disk array
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+_PERIOD_RE = re.compile(r'^(\d+)(d|wk|mo|y)$')
+
+
+def period_start(period: str, now: Optional[pd.Timestamp] = None) -> Optional[pd.Timestamp]:
+    # translate a yfinance period string ('2y', '6mo', '5d', 'max', 'ytd') into a start date
+    now = (now or pd.Timestamp.now(tz='UTC')).tz_localize(None).normalize()
+    if period in (None, 'max'):
+        return None
+    if period == 'ytd':
+        return pd.Timestamp(year=now.year, month=1, day=1)
+    m = _PERIOD_RE.match(period)
+    if not m:
+        raise ValueError(f'Unsupported period: {period}')
+    n, unit = int(m.group(1)), m.group(2)
+    if unit == 'd':
+        return now - pd.DateOffset(days=n)
+    if unit == 'wk':
+        return now - pd.DateOffset(weeks=n)
+    if unit == 'mo':
+        return now - pd.DateOffset(months=n)
+    return now - pd.DateOffset(years=n)
+
+
+class BarCache:
+    """Per-ticker OHLCV store backed by memory-mapped .npy files.
+
+    Each ticker keeps two arrays under ``<cache_dir>/<interval>/``: the bar
+    timestamps as int64 nanoseconds and a float64 (n, len(FIELDS)) matrix, plus
+    a small JSON file with the start of the period the bars were fetched for.
+    """
+
+    def __init__(self, cache_dir: str, interval: str = '1d'):
+        self.interval = interval
+        self.root = Path(cache_dir) / interval
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _paths(self, ticker: str):
+        safe = re.sub(r'[^A-Za-z0-9._-]', '_', ticker)
+        return self.root / f'{safe}.dates.npy', self.root / f'{safe}.ohlcv.npy', self.root / f'{safe}.meta.json'
+
+    def _write(self, path: Path, write):
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=path.suffix)
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+
+    def covers(self, ticker: str, start: Optional[pd.Timestamp]) -> bool:
+        # True when the cached bars were fetched from start or earlier (start None: the full history)
+        try:
+            meta = json.loads(self._paths(ticker)[2].read_text())
+        except (OSError, ValueError):
+            return False
+        if self.last_date(ticker) is None:
+            return False
+        if meta.get('start') is None:
+            return True
+        return start is not None and start >= pd.Timestamp(meta['start'])
+
+    def tail_start(self, ticker: str) -> pd.Timestamp:
+        # the bar before the last cached one: the last may have been partial, the one before is final
+        dates = np.load(self._paths(ticker)[0], mmap_mode='r')
+        return pd.Timestamp(int(dates[-2] if len(dates) > 1 else dates[-1]))
+
+    def adjusted(self, ticker: str, fresh: pd.DataFrame) -> bool:
+        # True when a fresh download's Adj Close differs from the cache on a final overlapping bar,
+        # i.e. the provider re-adjusted history for a dividend or split
+        cached = self.load(ticker)
+        if cached is None or len(cached) < 2 or fresh is None or not len(fresh):
+            return False
+        index = pd.DatetimeIndex(fresh.index)
+        fresh = pd.Series(fresh.reindex(columns=FIELDS)['Adj Close'].to_numpy(),
+                          index=index.tz_localize(None) if index.tz is not None else index)
+        both = fresh.index.intersection(cached.index[:-1])
+        if not len(both):
+            return False
+        return not np.allclose(fresh[both].to_numpy(dtype=np.float64), cached.loc[both, 'Adj Close'].to_numpy(),
+                               rtol=1e-6, equal_nan=True)
+
+    def load(self, ticker: str) -> Optional[pd.DataFrame]:
+        dates_path, bars_path, _ = self._paths(ticker)
+        if not dates_path.exists() or not bars_path.exists():
+            return None
+        dates = np.load(dates_path, mmap_mode='r')
+        bars = np.load(bars_path, mmap_mode='r')
+        if len(dates) != len(bars):
+            # torn write from an older process; treat as a miss and refetch
+            return None
+        index = pd.DatetimeIndex(np.asarray(dates).view('datetime64[ns]'))
+        return pd.DataFrame(bars, index=index, columns=FIELDS)
+
+    def last_date(self, ticker: str) -> Optional[pd.Timestamp]:
+        dates_path = self._paths(ticker)[0]
+        if not dates_path.exists():
+            return None
+        dates = np.load(dates_path, mmap_mode='r')
+        if len(dates) == 0:
+            return None
+        return pd.Timestamp(int(dates[-1]))
+
+    def store(self, ticker: str, frame: pd.DataFrame, replace: bool = False,
+              start: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        # merge new bars into the cache; newer downloads win on overlapping dates. replace=True
+        # stores a full-period download on its own and records start (None: the full history)
+        frame = frame.reindex(columns=FIELDS).dropna(how='all')
+        if frame.index.tz is not None:
+            frame.index = frame.index.tz_localize(None)
+        existing = None if replace else self.load(ticker)
+        if existing is not None and len(existing):
+            frame = pd.concat([existing, frame])
+            frame = frame[~frame.index.duplicated(keep='last')]
+        frame = frame.sort_index()
+
+        dates_path, bars_path, _ = self._paths(ticker)
+        dates = frame.index.values.astype('datetime64[ns]').view('int64')
+        bars = np.ascontiguousarray(frame.values, dtype=np.float64)
+        # write both arrays to temp files first so readers never see a partial update
+        for path, arr in ((bars_path, bars), (dates_path, dates)):
+            self._write(path, lambda f: np.save(f, arr))
+        if replace:
+            meta = {'start': None if start is None else start.isoformat()}
+            self._write(self._paths(ticker)[2], lambda f: f.write(json.dumps(meta).encode()))
+        return pd.DataFrame(bars, index=pd.DatetimeIndex(dates.view('datetime64[ns]')), columns=FIELDS)
+
+
+def split_download(raw: pd.DataFrame, tickers: List[str]) -> Dict[str, pd.DataFrame]:
+    # yf.download returns (field, ticker) MultiIndex columns; older versions use
+    # flat field columns when a single ticker is requested
+    out = {}
+    if isinstance(raw.columns, pd.MultiIndex):
+        level = 'Ticker' if 'Ticker' in raw.columns.names else 1
+        available = set(raw.columns.get_level_values(level))
+        for t in tickers:
+            if t in available:
+                out[t] = raw.xs(t, axis=1, level=level).dropna(how='all')
+    elif len(tickers) == 1:
+        out[tickers[0]] = raw.dropna(how='all')
+    return out
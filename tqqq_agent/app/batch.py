@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .ensemble import lgb_bull_prob, voter_signals, vote
+from .features import FEATURE_COLS
+from .utils import build_features, fetch_ohlcv
+
+logger = logging.getLogger('tqqq_agent')
+
+# signal symbol -> leveraged ETF that is traded on its signal
+DEFAULT_UNIVERSE = 'QQQ:TQQQ,SPY:UPRO,SOXX:SOXL'
+SEQ_LEN = 252
+
+
+def parse_universe(spec: str) -> List[Tuple[str, str]]:
+    pairs = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        signal, _, trade = item.partition(':')
+        pairs.append((signal.strip(), (trade or signal).strip()))
+    if not pairs:
+        raise ValueError(f'Empty symbol universe: {spec!r}')
+    return pairs
+
+
+def _symbol_features(args):
+    # runs in a worker process; pandas objects arrive pickled
+    symbol, close, vix, volume = args
+    df = pd.concat({symbol: close, 'VIX': vix}, axis=1).dropna()
+    return symbol, build_features(df, volume, price_col=symbol)
+
+
+def symbol_features(bars: pd.DataFrame, symbols: List[str], workers: int = 1) -> Dict[str, pd.DataFrame]:
+    close, volume = bars['Adj Close'], bars['Volume']
+    jobs = [(s, close[s], close['^VIX'], volume[s]) for s in symbols if s in close.columns]
+    if workers <= 1 or len(jobs) <= 1:
+        return dict(map(_symbol_features, jobs))
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        return dict(pool.map(_symbol_features, jobs))
+
+
+def signals_from_bars(bars: pd.DataFrame, universe: List[Tuple[str, str]], models,
+                      th_lgb: float, th_lstm: float, th_vote: int, workers: int = 1) -> List[Dict]:
+    feats = symbol_features(bars, [s for s, _ in universe], workers=workers)
+    ready = []
+    for signal_symbol, trade_symbol in universe:
+        df = feats.get(signal_symbol)
+        if df is None or len(df) < SEQ_LEN:
+            logger.error('Not enough historical rows for %s: %d', signal_symbol, 0 if df is None else len(df))
+            continue
+        ready.append((signal_symbol, trade_symbol, df))
+    if not ready:
+        return []
+
+    # one scaler/LightGBM call and one LSTM batch for the whole universe
+    X = np.vstack([df[FEATURE_COLS].iloc[-1:].to_numpy(dtype=np.float64) for _, _, df in ready])
+    lgb_prob = lgb_bull_prob(models.predict_lgb_prob(models.scaler.transform(X)))
+    seqs = np.stack([df[FEATURE_COLS].iloc[-SEQ_LEN:].to_numpy(dtype=np.float32) for _, _, df in ready])
+    regime_probs = models.predict_lstm_windows(seqs)
+
+    close = np.array([df[s].iloc[-1] for s, _, df in ready])
+    sma200 = np.array([df[s].iloc[-200:].mean() for s, _, df in ready])
+    return vote_results([(s, t, df.index[-1]) for s, t, df in ready], lgb_prob, regime_probs, close, sma200,
+                        th_lgb, th_lstm, th_vote)
+
+
+def vote_results(entries: List[Tuple[str, str, pd.Timestamp]], lgb_prob, regime_probs, close, sma200,
+                 th_lgb: float, th_lstm: float, th_vote: int) -> List[Dict]:
+    # entries: (signal symbol, trade symbol, bar date) per row of the model outputs
+    signal_sma, signal_lgb, signal_lstm = voter_signals(close, sma200, lgb_prob, regime_probs[:, 0],
+                                                        th_lgb, th_lstm)
+    bullish_count, go_long = vote(signal_sma, signal_lgb, signal_lstm, th_vote)
+
+    results = []
+    for i, (signal_symbol, trade_symbol, date) in enumerate(entries):
+        results.append({
+            'symbol': signal_symbol,
+            'trade_symbol': trade_symbol,
+            'date': date.strftime('%Y-%m-%d'),
+            'sma200': bool(signal_sma[i]),
+            'lgb_prob': float(lgb_prob[i]),
+            'lstm_bull': float(regime_probs[i, 0]),
+            'bullish_count': int(bullish_count[i]),
+            'signal': f'LONG {trade_symbol} (100%)' if go_long[i] else 'CASH / SHORT',
+        })
+    return results
+
+
+def run_batch(universe: List[Tuple[str, str]], models, th_lgb: float, th_lstm: float, th_vote: int,
+              workers: int = 1, period: str = '2y', cache_dir: Optional[str] = None,
+              provider=None, **fetch_options) -> List[Dict]:
+    tickers = sorted({s for s, _ in universe}) + ['^VIX']
+    if provider is None:
+        # a single batched download covers every signal symbol plus VIX
+        bars = fetch_ohlcv(tickers, period=period, interval='1d', cache_dir=cache_dir)
+    else:
+        # one request per ticker through app/ingest.py (concurrency limit, retries)
+        from .ingest import fetch_bars
+        bars = fetch_bars(tickers, period=period, interval='1d', provider=provider,
+                          cache_dir=cache_dir, **fetch_options)
+    return signals_from_bars(bars, universe, models, th_lgb, th_lstm, th_vote, workers=workers)
+
+
+def main(argv=None):
+    from .main import (MODEL_DIR, LGB_FILE, LSTM_FILE, SCALER_FILE, BAR_CACHE_DIR,
+                       DATA_PROVIDER, FETCH_OPTIONS, TH_LGB, TH_LSTM, TH_VOTE)
+    from .ingest import provider_from_spec
+    from .models import Models
+
+    parser = argparse.ArgumentParser(description='Ensemble signals for a universe of symbols')
+    parser.add_argument('--universe', default=os.getenv('SYMBOL_UNIVERSE', DEFAULT_UNIVERSE),
+                        help='comma-separated SIGNAL:TRADE pairs, e.g. QQQ:TQQQ,SPY:UPRO')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('BATCH_WORKERS', os.cpu_count() or 1)))
+    parser.add_argument('--period', default='2y')
+    args = parser.parse_args(argv)
+
+    models = Models(MODEL_DIR, LGB_FILE, LSTM_FILE, SCALER_FILE)
+    models.load()
+    results = run_batch(parse_universe(args.universe), models, TH_LGB, TH_LSTM, TH_VOTE,
+                        workers=args.workers, period=args.period, cache_dir=BAR_CACHE_DIR,
+                        provider=provider_from_spec(DATA_PROVIDER), **FETCH_OPTIONS)
+    for r in results:
+        logger.info('%s→%s %s SMA200=%s LGB=%.2f LSTM=%.2f votes=%d/3 → %s', r['symbol'], r['trade_symbol'],
+                    r['date'], 'Bullish' if r['sma200'] else 'Bearish', r['lgb_prob'], r['lstm_bull'],
+                    r['bullish_count'], r['signal'])
+    return results
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    main()
@@ -0,0 +1,74 @@
+import zipfile
+from pathlib import Path
+from typing import List
+
+from .runtime import compiled_paths
+
+# Smoke checks for `python -m tqqq_agent.app.main --check`. Everything here inspects
+# files and settings only: nothing is unpickled and torch/joblib/pandas are not imported.
+
+PICKLE_MAGIC = b'\x80'
+
+
+def check_artifacts(model_dir: str, lgb_file: str, lstm_file: str, scaler_file: str,
+                    backend: str, n_features: int) -> List[str]:
+    problems = []
+    model_dir = Path(model_dir)
+    if not model_dir.is_dir():
+        return [f'MODEL_DIR does not exist: {model_dir}']
+
+    def present(path: Path) -> bool:
+        if not path.exists():
+            problems.append(f'missing model file: {path}')
+            return False
+        if path.stat().st_size == 0:
+            problems.append(f'empty model file: {path}')
+            return False
+        return True
+
+    if backend == 'compiled':
+        import numpy as np
+        paths = compiled_paths(model_dir, lgb_file, lstm_file, scaler_file)
+        if present(paths['scaler']):
+            with np.load(paths['scaler'], allow_pickle=False) as z:
+                if len(z['mean']) != n_features:
+                    problems.append(f"{paths['scaler'].name}: expects {len(z['mean'])} features, "
+                                    f'FEATURE_COLS has {n_features}')
+        if present(paths['lgb']):
+            with np.load(paths['lgb'], allow_pickle=False) as z:
+                if len(z['feature']) and int(z['feature'].max()) >= n_features:
+                    problems.append(f"{paths['lgb'].name}: splits on feature {int(z['feature'].max())}, "
+                                    f'FEATURE_COLS has {n_features}')
+        if present(paths['lstm']) and not zipfile.is_zipfile(paths['lstm']):
+            problems.append(f"{paths['lstm'].name}: not a TorchScript archive")
+        return problems
+
+    for name in (lgb_file, scaler_file):
+        path = model_dir / name
+        if present(path):
+            with open(path, 'rb') as f:
+                if f.read(1) != PICKLE_MAGIC:
+                    problems.append(f'{path.name}: not a joblib/pickle file')
+    path = model_dir / lstm_file
+    if present(path):
+        # torch.save writes a zip archive holding data.pkl
+        if not zipfile.is_zipfile(path):
+            problems.append(f'{path.name}: not a PyTorch checkpoint')
+        else:
+            with zipfile.ZipFile(path) as z:
+                if not any(n.endswith('data.pkl') for n in z.namelist()):
+                    problems.append(f'{path.name}: checkpoint has no data.pkl')
+    return problems
+
+
+def check_config(th_lgb: float, th_lstm: float, th_vote: int, backend: str) -> List[str]:
+    problems = []
+    if not 0.0 <= th_lgb <= 1.0:
+        problems.append(f'THRESH_LGB must be within [0, 1], got {th_lgb}')
+    if not 0.0 <= th_lstm <= 1.0:
+        problems.append(f'THRESH_LSTM must be within [0, 1], got {th_lstm}')
+    if not 1 <= th_vote <= 3:
+        problems.append(f'THRESH_VOTE must be 1, 2 or 3, got {th_vote}')
+    if backend not in ('eager', 'compiled'):
+        problems.append(f'MODEL_BACKEND must be eager or compiled, got {backend}')
+    return problems
@@ -0,0 +1,23 @@
+import numpy as np
+
+# Shared voting rules for the SMA200 + LightGBM + LSTM ensemble. Everything here
+# works on scalars as well as on whole arrays, so the live signal and the
+# backtest apply identical comparisons.
+
+
+def lgb_bull_prob(probs) -> np.ndarray:
+    # predict_proba returns (n, 2); a raw Booster returns (n,) probabilities
+    probs = np.asarray(probs, dtype=np.float64)
+    return probs if probs.ndim == 1 else probs[:, 1]
+
+
+def voter_signals(close, sma200, lgb_prob, lstm_bull, th_lgb: float, th_lstm: float):
+    signal_sma = (np.asarray(close) > np.asarray(sma200)).astype(np.int8)
+    signal_lgb = (np.asarray(lgb_prob) > th_lgb).astype(np.int8)
+    signal_lstm = (np.asarray(lstm_bull) >= th_lstm).astype(np.int8)
+    return signal_sma, signal_lgb, signal_lstm
+
+
+def vote(signal_sma, signal_lgb, signal_lstm, th_vote: int):
+    bullish_count = signal_sma + signal_lgb + signal_lstm
+    return bullish_count, bullish_count >= th_vote
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .instrumentation import incr
+
+logger = logging.getLogger('tqqq_agent')
+
+COLUMNS = ('id', 'ts', 'run_id', 'kind', 'symbol', 'bar_date', 'payload')
+
+
+class SQLiteStore:
+    """Local append-only events table; UPDATE and DELETE are rejected by triggers."""
+
+    placeholder = '?'
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, run_id TEXT, kind TEXT NOT NULL,
+                symbol TEXT, bar_date TEXT, payload TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS events_kind_ts ON events (kind, ts);
+            CREATE TRIGGER IF NOT EXISTS events_no_update BEFORE UPDATE ON events
+                BEGIN SELECT RAISE(ABORT, 'events is append-only'); END;
+            CREATE TRIGGER IF NOT EXISTS events_no_delete BEFORE DELETE ON events
+                BEGIN SELECT RAISE(ABORT, 'events is append-only'); END;
+        ''')
+        return conn
+
+
+class PostgresStore:
+    """The same table in Postgres (e.g. the Aurora cluster), through psycopg 3 or psycopg2."""
+
+    placeholder = '%s'
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+
+    def connect(self):
+        try:
+            import psycopg
+        except ImportError:
+            try:
+                import psycopg2 as psycopg
+            except ImportError:
+                raise RuntimeError('EVENT_LOG_URL is a Postgres URL but neither psycopg nor psycopg2 is installed')
+        conn = psycopg.connect(self.dsn)
+        with conn.cursor() as cur:
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS events (
+                    id BIGSERIAL PRIMARY KEY, ts DOUBLE PRECISION NOT NULL, run_id TEXT, kind TEXT NOT NULL,
+                    symbol TEXT, bar_date TEXT, payload TEXT NOT NULL);
+                CREATE INDEX IF NOT EXISTS events_kind_ts ON events (kind, ts);
+                CREATE OR REPLACE FUNCTION events_append_only() RETURNS trigger AS $$
+                    BEGIN RAISE EXCEPTION 'events is append-only'; END $$ LANGUAGE plpgsql;
+                DROP TRIGGER IF EXISTS events_append_only ON events;
+                CREATE TRIGGER events_append_only BEFORE UPDATE OR DELETE ON events
+                    FOR EACH ROW EXECUTE FUNCTION events_append_only();
+            ''')
+        conn.commit()
+        return conn
+
+
+def store_from_url(url: str):
+    # EVENT_LOG_URL: 'sqlite:///path/events.sqlite' (or a bare path) or 'postgresql://user:pw@host/db'
+    if url.startswith(('postgres://', 'postgresql://')):
+        return PostgresStore(url)
+    return SQLiteStore(url[len('sqlite:///'):] if url.startswith('sqlite:///') else url)
+
+
+def write_batch(store, conn, rows: List[tuple]):
+    # one commit per batch. psycopg2's executemany sends one statement per row, so it gets a
+    # single multi-row INSERT; sqlite3 reuses one prepared statement and psycopg 3 pipelines
+    cols = ', '.join(COLUMNS[1:])
+    marks = ', '.join([store.placeholder] * (len(COLUMNS) - 1))
+    cur = conn.cursor()
+    try:
+        if type(conn).__module__.startswith('psycopg2'):
+            from psycopg2.extras import execute_values
+            execute_values(cur, f'INSERT INTO events ({cols}) VALUES %s', rows, page_size=max(len(rows), 1))
+        else:
+            cur.executemany(f'INSERT INTO events ({cols}) VALUES ({marks})', rows)
+    finally:
+        cur.close()
+    conn.commit()
+
+
+def read_events(store, kind: Optional[str] = None, since: Optional[float] = None,
+                until: Optional[float] = None) -> List[Dict]:
+    where, params = [], []
+    for clause, value in (('kind = {}', kind), ('ts >= {}', since), ('ts < {}', until)):
+        if value is not None:
+            where.append(clause.format(store.placeholder))
+            params.append(value)
+    sql = f'SELECT {", ".join(COLUMNS)} FROM events'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    conn = store.connect()
+    try:
+        cur = conn.cursor()
+        cur.execute(sql + ' ORDER BY id', params)
+        rows = cur.fetchall()
+    finally:
+        conn.close()
+    return [dict(zip(COLUMNS, r), payload=json.loads(r[-1])) for r in rows]
+
+
+class EventLog:
+    """Append-only event records, persisted in batches by a background writer thread.
+
+    log() only serializes the record and puts it on a bounded queue; when the queue is
+    full the record is dropped and counted (events.dropped) rather than blocking the
+    caller. The writer inserts up to batch_size records per transaction, at least every
+    flush_seconds. A failed batch is kept and retried; new records queue up meanwhile.
+    """
+
+    def __init__(self, store, run_id: Optional[str] = None, batch_size: int = 256,
+                 queue_size: int = 10000, flush_seconds: float = 1.0, retry_seconds: float = 5.0):
+        self.store = store
+        self.run_id = run_id
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.retry_seconds = retry_seconds
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='event-log', daemon=True)
+        self._thread.start()
+
+    def log(self, kind: str, payload: Dict, symbol: Optional[str] = None, bar_date=None) -> bool:
+        row = (time.time(), self.run_id, kind, symbol, None if bar_date is None else str(bar_date),
+               json.dumps(payload, sort_keys=True, default=str))
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            incr('events.dropped')
+            return False
+        return True
+
+    def flush(self, timeout: float = 10.0, final: bool = False) -> bool:
+        # wait until everything logged so far is written (or the timeout passes)
+        done = threading.Event()
+        done.final = final
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 10.0):
+        if not self._closed.is_set():
+            # closed stops retries of a failing store; the final marker stops the writer
+            self._closed.set()
+            self.flush(timeout, final=True)
+            self._thread.join(timeout)
+
+    def _take(self, batch: List, markers: List):
+        # block for the first record, then drain what is already queued up to batch_size
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return
+            if isinstance(item, threading.Event):
+                markers.append(item)
+                return
+            batch.append(item)
+
+    def _run(self):
+        conn = None
+        batch, markers = [], []
+        stop = False
+        while not stop:
+            self._take(batch, markers)
+            if batch:
+                try:
+                    if conn is None:
+                        conn = self.store.connect()
+                    write_batch(self.store, conn, batch)
+                    incr('events.written', len(batch))
+                    batch = []
+                except Exception as e:
+                    incr('events.write_errors')
+                    logger.error('Event log write failed (%d records kept for retry): %s', len(batch), e)
+                    if conn is not None:
+                        conn.close()
+                    conn = None
+                    if not self._closed.wait(self.retry_seconds):
+                        continue
+                    logger.error('Event log closed with %d unwritten records', len(batch))
+                    stop = True
+            for m in markers:
+                stop = stop or m.final
+                m.set()
+            markers = []
+        # after giving up on a failing store, release anyone still waiting on a flush
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, threading.Event):
+                item.set()
+        if conn is not None:
+            conn.close()
+
+
+def export(store, out: str, kind: Optional[str] = None, since: Optional[float] = None,
+           until: Optional[float] = None) -> Path:
+    """Columnar copy of the events with each payload expanded into columns.
+
+    Writes Parquet when a Parquet engine (pyarrow/fastparquet) is installed, otherwise a
+    .npz with one array per column; read_export() loads either.
+    """
+    import numpy as np
+    import pandas as pd
+
+    events = read_events(store, kind, since, until)
+    frame = pd.DataFrame([{k: v for k, v in e.items() if k != 'payload'} for e in events],
+                         columns=list(COLUMNS[:-1]))
+    if events:
+        payload = pd.json_normalize([e['payload'] for e in events]).add_prefix('payload.')
+        frame = pd.concat([frame, payload], axis=1)
+    out = Path(out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    if out.suffix != '.npz':
+        try:
+            frame.to_parquet(out.with_suffix('.parquet'), index=False)
+            return out.with_suffix('.parquet')
+        except ImportError:
+            logger.info('No Parquet engine installed; exporting %s as .npz', out.stem)
+    out = out.with_suffix('.npz')
+    # list/dict payload fields become JSON strings so no column needs pickling
+    arrays = {c: (frame[c].to_numpy() if frame[c].dtype.kind in 'biuf'
+                  else np.asarray([v if isinstance(v, str) else json.dumps(v, default=str) for v in frame[c]]))
+              for c in frame.columns}
+    np.savez_compressed(out, **arrays)
+    return out
+
+
+def read_export(path: str):
+    import numpy as np
+    import pandas as pd
+    path = Path(path)
+    if path.suffix == '.parquet':
+        return pd.read_parquet(path)
+    with np.load(path, allow_pickle=False) as z:
+        return pd.DataFrame({k: z[k] for k in z.files})
+
+
+def main(argv=None):
+    from .main import EVENT_LOG_URL
+
+    parser = argparse.ArgumentParser(description='Export the event log to a columnar file')
+    parser.add_argument('--url', default=EVENT_LOG_URL)
+    parser.add_argument('--kind', default=None, help='features, prediction or decision')
+    parser.add_argument('--since', default=None, help='start date (inclusive), e.g. 2025-01-01')
+    parser.add_argument('--until', default=None, help='end date (exclusive)')
+    parser.add_argument('--out', required=True, help='output path (.parquet, or .npz without a Parquet engine)')
+    args = parser.parse_args(argv)
+    if not args.url:
+        parser.error('EVENT_LOG_URL is not set')
+
+    def ts(date):
+        import pandas as pd
+        return None if date is None else pd.Timestamp(date).timestamp()
+
+    path = export(store_from_url(args.url), args.out, args.kind, ts(args.since), ts(args.until))
+    logger.info('Exported events to %s', path)
+    return path
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    main()
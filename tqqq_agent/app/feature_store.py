@@ -0,0 +1,175 @@
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .features import FEATURE_COLS, RSI_PERIOD, WINDOWS
+from .instrumentation import incr
+
+# Rows before this index are dropped, like build_features' dropna(): ret_200/vol_200 need
+# 200 prior closes even though FEATURE_COLS itself only uses the shorter windows.
+WARMUP = max(WINDOWS)
+
+
+def _rolling_mean(x: np.ndarray, p: int) -> np.ndarray:
+    out = np.full(len(x), np.nan)
+    if len(x) >= p:
+        out[p - 1:] = np.lib.stride_tricks.sliding_window_view(x, p).mean(axis=1)
+    return out
+
+
+def _rolling_std(x: np.ndarray, p: int) -> np.ndarray:
+    out = np.full(len(x), np.nan)
+    if len(x) >= p:
+        out[p - 1:] = np.lib.stride_tricks.sliding_window_view(x, p).std(axis=1, ddof=1)
+    return out
+
+
+def _pct_change(x: np.ndarray, p: int) -> np.ndarray:
+    out = np.full(len(x), np.nan)
+    out[p:] = x[p:] / x[:-p] - 1.0
+    return out
+
+
+def compute_features(index, close, vix, volume,
+                     feature_cols=FEATURE_COLS) -> Tuple[np.ndarray, np.ndarray]:
+    """Only the FEATURE_COLS columns of build_features, as one float32 (n, k) matrix.
+
+    index is a DatetimeIndex aligned with the close/vix/volume arrays. Returns the
+    kept bar dates (int64 ns) and a C-contiguous float32 matrix in feature_cols order,
+    with the same rows build_features keeps.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    diff = np.full(len(close), np.nan)
+    diff[1:] = np.diff(close)
+    ret_1 = _pct_change(close, 1)
+    cols = {
+        'VIX': np.asarray(vix, dtype=np.float64),
+        'volume': np.asarray(volume, dtype=np.float64),
+        'ret_1': ret_1,
+        'rsi': 100 - 100 / (1 + _rolling_mean(np.clip(diff, 0, None), RSI_PERIOD)
+                             / _rolling_mean(np.abs(diff), RSI_PERIOD)),
+        'month': np.asarray(index.month, dtype=np.float64),
+        'dow': np.asarray(index.dayofweek, dtype=np.float64),
+    }
+    for name in feature_cols:
+        kind, _, p = name.partition('_')
+        if name not in cols and kind == 'ret':
+            cols[name] = _pct_change(close, int(p))
+        elif name not in cols and kind == 'vol':
+            cols[name] = _rolling_std(ret_1, int(p))
+    X = np.empty((len(close), len(feature_cols)), dtype=np.float64)
+    for j, name in enumerate(feature_cols):
+        X[:, j] = cols[name]
+
+    keep = np.isfinite(X).all(axis=1)
+    keep[:WARMUP] = False
+    # build_features also drops rows where its other columns are undefined: vol_200 needs the 200
+    # preceding 1-day returns, which covers every shorter window, so a missing close drops 200 rows
+    missing = np.concatenate([[0], np.cumsum(~np.isfinite(ret_1))])
+    ends = np.arange(1, len(close) + 1)
+    keep &= missing[ends] == missing[np.maximum(ends - WARMUP, 0)]
+    dates = np.asarray(index.values).astype('datetime64[ns]').view('int64')[keep]
+    return dates, np.ascontiguousarray(X[keep], dtype=np.float32)
+
+
+def features_from_bars(bars, symbol: str = 'QQQ', vix: str = '^VIX') -> Tuple[np.ndarray, np.ndarray]:
+    # bars: (field, ticker) OHLCV frame from fetch_ohlcv / synthetic_bars
+    close = bars['Adj Close']
+    return compute_features(bars.index, close[symbol].to_numpy(), close[vix].to_numpy(),
+                            bars['Volume'][symbol].to_numpy())
+
+
+class FeatureStore:
+    """Per-symbol float32 feature matrices in FEATURE_COLS order, memory-mapped from .npy files.
+
+    Each symbol keeps ``<symbol>.dates.npy`` (int64 ns), ``<symbol>.features.npy``
+    (float32, C order) and ``<symbol>.meta.json`` with the column contract and the
+    model metadata passed to store(). Loaded matrices can be passed to scaler.transform
+    and torch.from_numpy without a copy.
+    """
+
+    def __init__(self, root: str, feature_cols=FEATURE_COLS):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.feature_cols = list(feature_cols)
+
+    def _paths(self, symbol: str):
+        safe = re.sub(r'[^A-Za-z0-9._-]', '_', symbol)
+        return (self.root / f'{safe}.dates.npy', self.root / f'{safe}.features.npy',
+                self.root / f'{safe}.meta.json')
+
+    def meta(self, symbol: str) -> Optional[Dict]:
+        meta_path = self._paths(symbol)[2]
+        if not meta_path.exists():
+            return None
+        return json.loads(meta_path.read_text())
+
+    def load(self, symbol: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        dates_path, feats_path, _ = self._paths(symbol)
+        meta = self.meta(symbol)
+        if meta is None or not dates_path.exists() or not feats_path.exists():
+            return None
+        if meta.get('feature_cols') != self.feature_cols or meta.get('dtype') != 'float32':
+            # written for another feature contract; treat as a miss and rebuild
+            return None
+        dates = np.load(dates_path, mmap_mode='r')
+        X = np.load(feats_path, mmap_mode='r')
+        if len(dates) != len(X):
+            return None
+        return dates, X
+
+    def store(self, symbol: str, dates: np.ndarray, X: np.ndarray,
+              models: Optional[Dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        if X.shape[1:] != (len(self.feature_cols),):
+            raise ValueError(f'expected {len(self.feature_cols)} feature columns, got shape {X.shape}')
+        dates_path, feats_path, meta_path = self._paths(symbol)
+        meta = {'feature_cols': self.feature_cols, 'dtype': 'float32', 'warmup': WARMUP,
+                'rows': int(len(X)), 'models': models or {}}
+        arrays = ((feats_path, np.ascontiguousarray(X, dtype=np.float32)),
+                  (dates_path, np.asarray(dates, dtype=np.int64)))
+        # temp files first so readers never see a partial update; meta goes last
+        for path, arr in arrays:
+            fd, tmp = tempfile.mkstemp(dir=self.root, suffix='.npy')
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, arr)
+            os.replace(tmp, path)
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, meta_path)
+        return self.load(symbol)
+
+    def build(self, symbol: str, bars, vix: str = '^VIX',
+              models: Optional[Dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Stored features for bars, computing only the rows after the last stored one.
+
+        The second-to-last stored row is recomputed from the bars and must match, or the
+        history was revised (e.g. re-adjusted closes) and every row is rebuilt; the last
+        stored row is always recomputed, since it may have come from a partial bar.
+        Returns the rows from the first bar onward.
+        """
+        close, volume = bars['Adj Close'], bars['Volume'][symbol].to_numpy()
+        c, v = close[symbol].to_numpy(), close[vix].to_numpy()
+        bar_dates = np.asarray(bars.index.values).astype('datetime64[ns]').view('int64')
+        stored = self.load(symbol)
+        if stored is not None and len(stored[0]) >= 2:
+            dates, X = stored
+            pos = int(np.searchsorted(bar_dates, dates[-2]))
+            if WARMUP <= pos < len(bar_dates) and bar_dates[pos] == dates[-2]:
+                # WARMUP bars of history before the overlap are enough for every window
+                lo = pos - WARMUP
+                new_dates, new_X = compute_features(bars.index[lo:], c[lo:], v[lo:], volume[lo:], self.feature_cols)
+                if len(new_dates) and new_dates[0] == dates[-2] and np.array_equal(new_X[0], X[-2]):
+                    incr('feature_store.rows_appended', len(new_dates) - 1)
+                    dates = np.concatenate([dates[:-2], new_dates])
+                    X = np.concatenate([X[:-2], new_X])
+                    first = int(np.searchsorted(dates, bar_dates[0]))
+                    return self.store(symbol, dates[first:], X[first:], models=models)
+        incr('feature_store.rebuilds')
+        dates, X = compute_features(bars.index, c, v, volume, self.feature_cols)
+        return self.store(symbol, dates, X, models=models)
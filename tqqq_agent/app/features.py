@@ -0,0 +1,161 @@
+import math
+import pickle
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+# Feature order expected by the scaler, LightGBM and LSTM (order matters)
+FEATURE_COLS = ['ret_5','ret_10','ret_20','vol_20','VIX','rsi','volume','month','dow','ret_1']
+# Return/volatility windows computed by build_features
+WINDOWS = (5, 10, 20, 50, 100, 200)
+RSI_PERIOD = 14
+
+
+class FeatureEngine:
+    """Incremental version of utils.build_features.
+
+    Keeps ring buffers of recent closes and 1-day returns plus running sums
+    (and sums of squares) per window, so each new bar costs O(windows) instead
+    of recomputing every rolling statistic over the full history.
+    """
+
+    def __init__(self, windows: Iterable[int] = WINDOWS, rsi_period: int = RSI_PERIOD,
+                 resum_every: int = 1000):
+        self.windows = tuple(sorted(windows))
+        self.rsi_period = rsi_period
+        # running sums drift slightly with float error; rebuild them from the buffers periodically
+        self.resum_every = resum_every
+        size = max(self.windows + (rsi_period,))
+        self._size = size
+        self._closes = np.full(size + 1, np.nan)
+        self._rets = np.full(size, np.nan)
+        self._gains = np.zeros(rsi_period)
+        self._moves = np.zeros(rsi_period)
+        self._sum = {p: 0.0 for p in self.windows}
+        self._sumsq = {p: 0.0 for p in self.windows}
+        self._gain_sum = 0.0
+        self._move_sum = 0.0
+        # a non-finite return poisons the running sums; rebuild them at this n, once it has
+        # left every window
+        self._resum_at = None
+        self.n = 0
+        self.last_date = None
+
+    @property
+    def ready(self) -> bool:
+        # same rows build_features keeps after dropna(): every window has a full history
+        return self.n > self._size
+
+    def update(self, date, close: float, vix: float, volume: float) -> Optional[Dict[str, float]]:
+        # push one bar; returns the build_features row for it, or None while warming up
+        prev = self._closes[(self.n - 1) % (self._size + 1)] if self.n else np.nan
+        self._closes[self.n % (self._size + 1)] = close
+        if self.n:
+            ret = close / prev - 1.0
+            k = (self.n - 1)  # number of returns seen before this one
+            for p in self.windows:
+                self._sum[p] += ret
+                self._sumsq[p] += ret * ret
+                if k >= p:
+                    old = self._rets[(k - p) % self._size]
+                    self._sum[p] -= old
+                    self._sumsq[p] -= old * old
+            self._rets[k % self._size] = ret
+
+            diff = close - prev
+            j = k % self.rsi_period
+            self._gain_sum += max(diff, 0.0) - self._gains[j]
+            self._move_sum += abs(diff) - self._moves[j]
+            self._gains[j] = max(diff, 0.0)
+            self._moves[j] = abs(diff)
+            if not math.isfinite(ret):
+                # the first update whose windows no longer include return k
+                self._resum_at = k + self._size + 2
+        self.n += 1
+        self.last_date = date
+        if self.n % self.resum_every == 0 or self.n == getattr(self, '_resum_at', None):
+            self._resum()
+        if not self.ready:
+            return None
+        return self._row(date, close, vix, volume, self.n, self._sum, self._sumsq, self._gain_sum, self._move_sum)
+
+    def preview(self, date, close: float, vix: float, volume: float) -> Optional[Dict[str, float]]:
+        # the row update() would return for this bar, without pushing it (e.g. a partial intraday bar)
+        if not self.n or self.n + 1 <= self._size:
+            return None
+        prev = self._closes[(self.n - 1) % (self._size + 1)]
+        ret = close / prev - 1.0
+        k = self.n - 1
+        sums, sumsq = {}, {}
+        for p in self.windows:
+            old = self._rets[(k - p) % self._size] if k >= p else 0.0
+            sums[p] = self._sum[p] + ret - old
+            sumsq[p] = self._sumsq[p] + ret * ret - old * old
+        diff = close - prev
+        j = k % self.rsi_period
+        gain_sum = self._gain_sum + max(diff, 0.0) - self._gains[j]
+        move_sum = self._move_sum + abs(diff) - self._moves[j]
+        return self._row(date, close, vix, volume, self.n + 1, sums, sumsq, gain_sum, move_sum)
+
+    def _resum(self):
+        k = self.n - 1
+        for p in self.windows:
+            if k >= p:
+                idx = [(k - i) % self._size for i in range(1, p + 1)]
+                window = self._rets[idx]
+                self._sum[p] = float(window.sum())
+                self._sumsq[p] = float((window * window).sum())
+        self._gain_sum = float(self._gains.sum())
+        self._move_sum = float(self._moves.sum())
+
+    def _row(self, date, close, vix, volume, n, sums, sumsq, gain_sum, move_sum) -> Optional[Dict[str, float]]:
+        # n counts the bars including this one; sums are the running window sums after it
+        if vix is None or volume is None or math.isnan(vix) or math.isnan(volume) or move_sum <= 0:
+            # build_features drops rows with missing inputs (or an undefined RSI)
+            return None
+        row = {'QQQ': close, 'VIX': vix, 'volume': volume}
+        size = self._size + 1
+        for p in self.windows:
+            row[f'ret_{p}'] = close / self._closes[(n - 1 - p) % size] - 1.0
+            var = (sumsq[p] - sums[p] * sums[p] / p) / (p - 1)
+            # clamps float error below zero; a NaN variance stays NaN
+            row[f'vol_{p}'] = math.sqrt(max(var, 0.0))
+        row['ret_1'] = close / self._closes[(n - 2) % size] - 1.0
+        row['rsi'] = 100 - 100 / (1 + gain_sum / move_sum)
+        if not all(math.isfinite(v) for v in row.values()):
+            # a NaN close in some window: build_features drops the row
+            return None
+        row['month'] = date.month
+        row['dow'] = date.weekday()
+        return row
+
+    @staticmethod
+    def vector(row: Dict[str, float], feature_cols=FEATURE_COLS) -> np.ndarray:
+        return np.array([[row[c] for c in feature_cols]], dtype=np.float64)
+
+    @classmethod
+    def from_frame(cls, df, vol_series, **kwargs) -> 'FeatureEngine':
+        # warm up from the same inputs build_features takes (df with QQQ/VIX columns)
+        engine = cls(**kwargs)
+        volume = vol_series.reindex(df.index).to_numpy(dtype=np.float64)
+        closes = df['QQQ'].to_numpy(dtype=np.float64)
+        vix = df['VIX'].to_numpy(dtype=np.float64)
+        for i, date in enumerate(df.index):
+            engine.update(date, closes[i], vix[i], volume[i])
+        return engine
+
+    def save(self, path):
+        path = Path(path)
+        tmp = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp, 'wb') as f:
+            pickle.dump(self, f)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path) -> 'FeatureEngine':
+        with open(path, 'rb') as f:
+            engine = pickle.load(f)
+        if not isinstance(engine, cls):
+            raise TypeError(f'{path} does not contain a {cls.__name__}')
+        return engine
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+import abc
+import argparse
+import asyncio
+import io
+import logging
+import os
+import random
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from .bar_cache import FIELDS, BarCache, period_start
+from .instrumentation import incr, stage, timed
+
+logger = logging.getLogger('tqqq_agent')
+
+
+class TransientError(Exception):
+    """Provider failure worth retrying (rate limit, 5xx, dropped connection)."""
+
+
+# exception class names (anywhere in the MRO) that mean a network or rate-limit failure, across
+# the builtins, requests and curl_cffi (which yfinance uses) without importing either
+TRANSIENT_NAMES = {'ConnectionError', 'Timeout', 'TimeoutError', 'ChunkedEncodingError', 'YFRateLimitError'}
+
+
+def is_transient(e: BaseException) -> bool:
+    return any(c.__name__ in TRANSIENT_NAMES for c in type(e).__mro__)
+
+
+def _normalize(frame: pd.DataFrame) -> pd.DataFrame:
+    # every provider returns FIELDS columns on a tz-naive DatetimeIndex named Date
+    frame = frame.reindex(columns=FIELDS)
+    index = pd.DatetimeIndex(frame.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    frame.index = index.rename('Date')
+    return frame.dropna(how='all').sort_index()
+
+
+class Provider(abc.ABC):
+    """Per-ticker bar source. fetch() returns a FIELDS frame from start (inclusive) onward,
+    or the whole period when start is None.
+
+    Blocking calls go through _blocking(), on a pool of at most max_threads threads owned
+    by the provider. A call abandoned by a timeout keeps its thread slot until it returns,
+    so timed-out retries wait for a slot instead of stacking more blocked threads.
+    """
+
+    max_threads = 8
+
+    @abc.abstractmethod
+    async def fetch(self, ticker: str, period: str = '2y', interval: str = '1d',
+                    start: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        ...
+
+    async def _blocking(self, fn, *args):
+        if getattr(self, '_pool', None) is None:
+            self._pool = ThreadPoolExecutor(self.max_threads, thread_name_prefix=type(self).__name__)
+            self._slots = threading.BoundedSemaphore(self.max_threads)
+        if not self._slots.acquire(blocking=False):
+            incr('ingest.threads_busy')
+            raise TransientError(f'all {self.max_threads} provider threads are busy')
+        future = self._pool.submit(fn, *args)
+        # released when the call returns (or is cancelled before starting), not when the caller gives up
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
+
+
+class YFinanceProvider(Provider):
+    def __init__(self, timeout: float = 30.0):
+        self.timeout = timeout
+
+    def _history(self, ticker, period, interval, start):
+        from .utils import _yfinance
+        # Ticker.history per thread; yf.download shares module state between concurrent calls
+        kwargs = {'start': start.strftime('%Y-%m-%d')} if start is not None else {'period': period}
+        try:
+            frame = _yfinance().Ticker(ticker).history(interval=interval, auto_adjust=False,
+                                                       timeout=self.timeout, raise_errors=True, **kwargs)
+        except Exception as e:
+            # network and rate-limit errors are retried; an unknown ticker or bad request is not
+            if is_transient(e):
+                raise TransientError(f'{ticker}: {e}') from e
+            raise
+        return _normalize(frame)
+
+    async def fetch(self, ticker, period='2y', interval='1d', start=None):
+        return await self._blocking(self._history, ticker, period, interval, start)
+
+
+class ReplayProvider(Provider):
+    """Serves bars recorded as <root>/<ticker>.parquet or <root>/<ticker>.csv (see write_replay)."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def load(self, ticker: str) -> pd.DataFrame:
+        for suffix, reader in (('.parquet', pd.read_parquet), ('.csv', pd.read_csv)):
+            path = self.root / f'{ticker}{suffix}'
+            if path.exists():
+                frame = reader(path)
+                if 'Date' in frame.columns:
+                    frame = frame.set_index('Date')
+                return _normalize(frame)
+        raise LookupError(f'No replay data for {ticker} in {self.root}')
+
+    async def fetch(self, ticker, period='2y', interval='1d', start=None):
+        frame = await self._blocking(self.load, ticker)
+        start = start if start is not None else period_start(period, now=frame.index.max())
+        return frame if start is None else frame[frame.index >= start]
+
+
+class HTTPProvider(Provider):
+    """Reads CSV bars from GET <base_url>/bars?ticker=&interval=&period=|start= (see serve_replay)."""
+
+    def __init__(self, base_url: str, timeout: float = 10.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def _get(self, url: str) -> pd.DataFrame:
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as resp:
+                body = resp.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 429 or e.code >= 500:
+                raise TransientError(f'HTTP {e.code} from {url}') from e
+            raise LookupError(f'HTTP {e.code} from {url}') from e
+        except (urllib.error.URLError, ConnectionError, TimeoutError) as e:
+            raise TransientError(f'{url}: {e}') from e
+        return _normalize(pd.read_csv(io.BytesIO(body), index_col='Date', parse_dates=['Date']))
+
+    async def fetch(self, ticker, period='2y', interval='1d', start=None):
+        query = {'ticker': ticker, 'interval': interval}
+        query.update({'start': start.strftime('%Y-%m-%d')} if start is not None else {'period': period})
+        url = f'{self.base_url}/bars?{urllib.parse.urlencode(query)}'
+        return await self._blocking(self._get, url)
+
+
+def provider_from_spec(spec: str) -> Provider:
+    # DATA_PROVIDER: 'yfinance' (default), 'replay:<dir>' or 'http://host:port'
+    if not spec or spec == 'yfinance':
+        return YFinanceProvider()
+    if spec.startswith('replay:'):
+        return ReplayProvider(spec[len('replay:'):])
+    if spec.startswith(('http://', 'https://')):
+        return HTTPProvider(spec)
+    raise ValueError(f'Unknown DATA_PROVIDER: {spec}')
+
+
+class Ingestor:
+    """Concurrent per-ticker fetches with retry and request coalescing.
+
+    At most `concurrency` provider calls run at once. TransientError and timeouts
+    are retried up to `retries` times with full-jitter exponential backoff (the
+    semaphore is released while sleeping). Identical requests that are already in
+    flight share one provider call.
+    """
+
+    def __init__(self, provider: Provider, concurrency: int = 8, retries: int = 3,
+                 backoff: float = 0.5, max_backoff: float = 8.0, timeout: float = 30.0,
+                 rng: Optional[random.Random] = None):
+        self.provider = provider
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.rng = rng or random.Random()
+        self._sem = None
+        self._inflight = {}
+
+    async def _attempts(self, ticker, period, interval, start):
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._sem:
+                    incr('ingest.requests')
+                    with stage('ingest.request'):
+                        return await asyncio.wait_for(
+                            self.provider.fetch(ticker, period=period, interval=interval, start=start),
+                            self.timeout)
+            except (TransientError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.rng.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                incr('ingest.retries')
+                logger.warning('Fetch %s failed (%s); retry %d/%d in %.2fs',
+                               ticker, e or type(e).__name__, attempt + 1, self.retries, delay)
+                await asyncio.sleep(delay)
+
+    async def fetch(self, ticker: str, period: str = '2y', interval: str = '1d',
+                    start: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.concurrency)
+        key = (ticker, period, interval, start)
+        task = self._inflight.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(self._attempts(ticker, period, interval, start))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            incr('ingest.coalesced')
+        # shield: one cancelled caller must not cancel the fetch other callers wait on
+        frame = await asyncio.shield(task)
+        # coalesced callers get their own copy, so one caller's edits never reach another
+        return frame.copy() if shared else frame
+
+    async def fetch_many(self, tickers: List[str], period: str = '2y', interval: str = '1d',
+                         starts: Optional[Dict[str, pd.Timestamp]] = None) -> Dict[str, pd.DataFrame]:
+        starts = starts or {}
+        frames = await asyncio.gather(*(self.fetch(t, period, interval, starts.get(t)) for t in tickers))
+        return dict(zip(tickers, frames))
+
+
+@timed('fetch')
+def fetch_bars(tickers: List[str], period: str = '2y', interval: str = '1d',
+               provider: Optional[Provider] = None, cache_dir: Optional[str] = None,
+               **ingestor_kwargs) -> pd.DataFrame:
+    # Same (field, ticker) frame as utils.fetch_ohlcv, fetched one ticker per request through
+    # an Ingestor. With a cache_dir, a ticker cached for this period only requests its tail;
+    # one fetched for a shorter period, or whose history was re-adjusted, gets the full period.
+    ingestor = Ingestor(provider or YFinanceProvider(), **ingestor_kwargs)
+    cache = BarCache(cache_dir, interval=interval) if cache_dir else None
+    start = period_start(period)
+    starts = {t: cache.tail_start(t) for t in tickers if cache.covers(t, start)} if cache else {}
+
+    async def fetch_all():
+        frames = await ingestor.fetch_many(list(dict.fromkeys(tickers)), period, interval, starts)
+        stale = [t for t in starts if cache.adjusted(t, frames[t])]
+        if stale:
+            incr('fetch.readjusted', len(stale))
+            frames.update(await ingestor.fetch_many(stale, period, interval))
+            for t in stale:
+                del starts[t]
+        return frames
+
+    frames = asyncio.run(fetch_all())
+    out = {}
+    for t in tickers:
+        bars = cache.store(t, frames[t], replace=t not in starts, start=start) if cache else frames[t]
+        out[t] = bars if start is None else bars[bars.index >= start]
+    return pd.concat(out, axis=1, names=['Ticker', 'Price']).swaplevel(axis=1).sort_index(axis=1)
+
+
+def write_replay(bars: pd.DataFrame, root: str):
+    # record a (field, ticker) frame as one CSV per ticker for ReplayProvider
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    for t in bars.columns.get_level_values(1).unique():
+        frame = bars.xs(t, axis=1, level=1).reindex(columns=FIELDS)
+        frame.rename_axis('Date').to_csv(root / f'{t}.csv')
+
+
+def serve_replay(source: ReplayProvider, host: str = '127.0.0.1', port: int = 0,
+                 fail_first: int = 0) -> ThreadingHTTPServer:
+    """Local stand-in for a bar API that HTTPProvider can talk to.
+
+    fail_first answers the first N requests per ticker with 503, to exercise retries.
+    server.requests counts requests per ticker.
+    """
+    failures = {}
+    requests = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urllib.parse.urlparse(self.path)
+            query = {k: v[0] for k, v in urllib.parse.parse_qs(url.query).items()}
+            ticker = query.get('ticker')
+            if url.path != '/bars' or not ticker:
+                return self._send(404, b'not found')
+            requests[ticker] = requests.get(ticker, 0) + 1
+            try:
+                frame = source.load(ticker)
+            except LookupError:
+                return self._send(404, b'unknown ticker')
+            if failures.get(ticker, 0) < fail_first:
+                failures[ticker] = failures.get(ticker, 0) + 1
+                return self._send(503, b'try again')
+            if 'start' in query:
+                frame = frame[frame.index >= pd.Timestamp(query['start'])]
+            else:
+                start = period_start(query.get('period', '2y'), now=frame.index.max())
+                frame = frame if start is None else frame[frame.index >= start]
+            self._send(200, frame.to_csv().encode(), 'text/csv')
+
+        def _send(self, code, body, content_type='text/plain'):
+            self.send_response(code)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            logger.debug('%s - ' + fmt, self.address_string(), *args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.requests = requests
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve recorded bars over HTTP for DATA_PROVIDER=http://...')
+    parser.add_argument('--dir', required=True, help='directory of <ticker>.csv/.parquet files (see write_replay)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.getenv('REPLAY_PORT', 8765)))
+    args = parser.parse_args(argv)
+    server = serve_replay(ReplayProvider(args.dir), args.host, args.port)
+    logger.info('Serving %s on http://%s:%d/bars', args.dir, args.host, server.server_port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    main()
@@ -0,0 +1,169 @@
+import functools
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+logger = logging.getLogger('tqqq_agent')
+
+
+class Metrics:
+    """Process-wide stage timers and counters.
+
+    ``with METRICS.stage('fetch'):`` records count / total / max seconds per
+    stage name; ``METRICS.incr('fetch.requests')`` bumps a counter. Snapshots
+    can be dumped as a JSON log line, Prometheus text or StatsD lines.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings = {}
+        self.counters = {}
+        # counter values and stage counts already sent by to_statsd()
+        self._sent = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            t = self.timings.get(name)
+            if t is None:
+                self.timings[name] = [1, seconds, seconds, seconds]
+            else:
+                t[0] += 1
+                t[1] += seconds
+                t[2] = max(t[2], seconds)
+                t[3] = seconds
+
+    def incr(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self.timings.clear()
+            self.counters.clear()
+            self._sent.clear()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            stages = {k: {'count': c, 'total_ms': round(tot * 1e3, 3), 'max_ms': round(mx * 1e3, 3),
+                          'last_ms': round(last * 1e3, 3)}
+                      for k, (c, tot, mx, last) in self.timings.items()}
+            return {'stages': stages, 'counters': dict(self.counters)}
+
+    def to_json(self, **extra) -> str:
+        return json.dumps(dict(self.snapshot(), **extra), sort_keys=True)
+
+    def to_prometheus(self, prefix: str = 'tqqq') -> str:
+        snap = self.snapshot()
+        lines = [f'# TYPE {prefix}_stage_seconds summary']
+        for name, s in sorted(snap['stages'].items()):
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {s["count"]}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {s["total_ms"] / 1e3:.6f}')
+        lines.append(f'# TYPE {prefix}_stage_seconds_max gauge')
+        for name, s in sorted(snap['stages'].items()):
+            lines.append(f'{prefix}_stage_seconds_max{{stage="{name}"}} {s["max_ms"] / 1e3:.6f}')
+        lines.append(f'# TYPE {prefix}_events_total counter')
+        for name, n in sorted(snap['counters'].items()):
+            lines.append(f'{prefix}_events_total{{event="{name}"}} {n}')
+        return '\n'.join(lines) + '\n'
+
+    def to_statsd(self, prefix: str = 'tqqq') -> str:
+        # StatsD adds up |c values, so each call sends the counter increments since the previous
+        # call, and the last timing only of stages that ran again since then
+        with self._lock:
+            lines = []
+            for name, (count, _, _, last) in sorted(self.timings.items()):
+                if count != self._sent.get(('stage', name)):
+                    lines.append(f'{prefix}.stage.{name}:{round(last * 1e3, 3)}|ms')
+                    self._sent[('stage', name)] = count
+            for name, n in sorted(self.counters.items()):
+                delta = n - self._sent.get(('counter', name), 0)
+                if delta:
+                    lines.append(f'{prefix}.{name}:{delta}|c')
+                    self._sent[('counter', name)] = n
+        return '\n'.join(lines)
+
+
+METRICS = Metrics()
+stage = METRICS.stage
+incr = METRICS.incr
+
+
+def timed(name: str):
+    # decorator form of METRICS.stage(name)
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with METRICS.stage(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def export(run_id: str = None):
+    # JSON log line always; Prometheus textfile and StatsD only when configured
+    logger.info('metrics %s', METRICS.to_json(run_id=run_id))
+    path = os.getenv('METRICS_FILE')
+    if path:
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(METRICS.to_prometheus())
+        os.replace(tmp, path)
+    addr = os.getenv('STATSD_ADDR')
+    if addr:
+        host, _, port = addr.partition(':')
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                sock.sendto(METRICS.to_statsd().encode(), (host, int(port or 8125)))
+        except OSError as e:
+            logger.warning('StatsD export failed: %s', e)
+
+
+@contextmanager
+def profiled(name: str = 'run'):
+    # opt-in per-run profiler: PROFILE=cprofile writes <PROFILE_DIR>/<name>.prof,
+    # PROFILE=pyinstrument writes <PROFILE_DIR>/<name>.html
+    mode = os.getenv('PROFILE', '').lower()
+    out_dir = os.getenv('PROFILE_DIR', '.')
+    if mode == 'cprofile':
+        import cProfile
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            path = os.path.join(out_dir, f'{name}.prof')
+            prof.dump_stats(path)
+            logger.info('cProfile written to %s', path)
+    elif mode == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except Exception:
+            logger.warning('PROFILE=pyinstrument but pyinstrument is not installed')
+            yield
+            return
+        prof = Profiler()
+        prof.start()
+        try:
+            yield
+        finally:
+            prof.stop()
+            path = os.path.join(out_dir, f'{name}.html')
+            with open(path, 'w') as f:
+                f.write(prof.output_html())
+            logger.info('pyinstrument profile written to %s', path)
+    else:
+        yield
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import math
+import os
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from .ensemble import lgb_bull_prob, vote
+from .feature_store import features_from_bars
+from .features import FEATURE_COLS, FeatureEngine
+from .instrumentation import incr, stage
+from .models import StreamingLSTM
+from .runtime import FlatForest, FlatScaler, flatten_classifier, flatten_scaler
+from .synthetic import MINUTES_PER_DAY
+
+logger = logging.getLogger('tqqq_agent')
+
+DAY_NS = 86_400_000_000_000
+MINUTE_NS = 60_000_000_000
+SMA_DAYS = 200
+
+
+class BarRing:
+    """Fixed-capacity ring of (timestamp ns, open, high, low, close, volume) bars.
+
+    Appends overwrite the oldest bar once full, so memory is fixed at construction.
+    """
+
+    def __init__(self, capacity: int = MINUTES_PER_DAY):
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, dtype=np.int64)
+        self.ohlcv = np.zeros((capacity, 5), dtype=np.float64)
+        self.n = 0
+
+    def __len__(self) -> int:
+        return min(self.n, self.capacity)
+
+    def append(self, ts: int, o: float, h: float, l: float, c: float, v: float):
+        i = self.n % self.capacity
+        self.ts[i] = ts
+        row = self.ohlcv[i]
+        row[0], row[1], row[2], row[3], row[4] = o, h, l, c, v
+        self.n += 1
+
+    def last(self, k: Optional[int] = None):
+        # the newest k bars (default: all held), oldest first, as copies
+        k = len(self) if k is None else min(k, len(self))
+        idx = np.arange(self.n - k, self.n) % self.capacity
+        return self.ts[idx], self.ohlcv[idx]
+
+
+class IntradaySession:
+    """Re-evaluates the three-vote signal on every intraday bar close.
+
+    Completed days live in a FeatureEngine, a StreamingLSTM and the last 200 daily
+    closes. The current day is the running OHLCV aggregate of its bars, so every bar
+    previews the daily feature row and LSTM step the models would see if the day closed
+    now, without committing either; the first bar of the next day (or close_day())
+    commits it. Raw bars are kept per ticker in a BarRing. Nothing grows with the
+    session, and each bar costs a single-row classifier pass plus one LSTM step.
+
+    Intraday closes are unadjusted while the daily history is adjusted, so the first
+    bars after an ex-dividend date see a slightly shifted ret_* window.
+    """
+
+    def __init__(self, models, th_lgb: float, th_lstm: float, th_vote: int, symbol: str = 'QQQ',
+                 vix: str = '^VIX', capacity: int = MINUTES_PER_DAY, intraday_features: bool = False,
+                 seq_len: int = 252):
+        self.models = models
+        self.thresholds = (th_lgb, th_lstm, th_vote)
+        self.symbol = symbol
+        self.vix_symbol = vix
+        self.intraday_features = intraday_features
+        self.seq_len = seq_len
+        self.rings = {symbol: BarRing(capacity), vix: BarRing(capacity)}
+        # numpy-only classifier and scaler keep a single-row pass well under a millisecond
+        try:
+            self.lgb = models.lgb_model if isinstance(models.lgb_model, FlatForest) else flatten_classifier(models.lgb_model)
+            self.scaler = models.scaler if isinstance(models.scaler, FlatScaler) else flatten_scaler(models.scaler)
+        except (TypeError, AttributeError):
+            self.lgb, self.scaler = models.lgb_model, models.scaler
+        self.engine = None
+        self.stream = None
+        self.vix = math.nan
+        self._closes = np.full(SMA_DAYS, np.nan)
+        self._n_days = 0
+        self._sma_base = 0.0
+        self._last_day = None
+        self._day = None
+        self.last_signal = None
+
+    def warm_up(self, bars: pd.DataFrame):
+        # bars: completed daily bars in the fetch_ohlcv (field, ticker) layout
+        close = bars['Adj Close']
+        df = pd.concat({'QQQ': close[self.symbol], 'VIX': close[self.vix_symbol]}, axis=1).dropna()
+        self.engine = FeatureEngine.from_frame(df, bars['Volume'][self.symbol])
+        _, X = features_from_bars(bars, self.symbol, self.vix_symbol)
+        if len(X) < self.seq_len:
+            raise ValueError(f'Not enough historical rows: {len(X)}')
+        self.stream = StreamingLSTM(self.models, seq_len=self.seq_len)
+        self.stream.warm_up(X[-self.seq_len:])
+        for c in df['QQQ'].to_numpy()[-SMA_DAYS:]:
+            self._push_close(c)
+        self.vix = float(df['VIX'].iloc[-1])
+        self._last_day = int(np.asarray(df.index[-1:]).astype('datetime64[ns]').view('int64')[0]) // DAY_NS
+        self._day = None
+        return self
+
+    def _push_close(self, close: float):
+        self._closes[self._n_days % SMA_DAYS] = close
+        self._n_days += 1
+        # sum of the newest SMA_DAYS - 1 closes; the partial day's close completes the window
+        k = min(self._n_days, SMA_DAYS - 1)
+        idx = np.arange(self._n_days - k, self._n_days) % SMA_DAYS
+        self._sma_base = float(self._closes[idx].sum())
+
+    def on_bar(self, ticker: str, ts, o: float, h: float, l: float, c: float, v: float) -> Optional[Dict]:
+        """Feed one closed bar; returns the re-evaluated signal for signal-symbol bars.
+
+        ts is the bar's exchange-local time (datetime-like or int ns). VIX bars only
+        update the VIX input used from the next signal-symbol bar on.
+        """
+        if self.engine is None:
+            raise RuntimeError('IntradaySession.warm_up() must be called before on_bar()')
+        ns = ts if isinstance(ts, (int, np.integer)) else pd.Timestamp(ts).value
+        ring = self.rings.get(ticker)
+        if ring is None:
+            return None
+        day = ns // DAY_NS
+        if day <= self._last_day:
+            # already part of the daily history
+            return None
+        ring.append(ns, o, h, l, c, v)
+        if ticker == self.vix_symbol:
+            self.vix = float(c)
+            return None
+        if self._day is not None and day != self._day:
+            self.close_day()
+        if self._day is None:
+            self._day, self._date, self._first_ts = day, pd.Timestamp(day * DAY_NS), ns
+            self._open, self._high, self._low, self._volume = o, h, l, 0.0
+            self._prev, self._rv = o, 0.0
+        self._high, self._low = max(self._high, h), min(self._low, l)
+        self._close = c
+        self._volume += v
+        r = math.log(c / self._prev)
+        self._rv += r * r
+        self._prev = c
+        self._ts = ns
+        incr('intraday.bars')
+        return self.evaluate()
+
+    def evaluate(self) -> Optional[Dict]:
+        # the vote for the partial day as it stands
+        if self._day is None:
+            return None
+        with stage('intraday.evaluate'):
+            row = self.engine.preview(self._date, self._close, self.vix, self._volume)
+            if row is None:
+                return None
+            x = np.array([[row[col] for col in FEATURE_COLS]])
+            lgb_prob = float(lgb_bull_prob(self.lgb.predict_proba(self.scaler.transform(x)))[0])
+            regime_probs = self.stream.peek(x[0].astype(np.float32))
+            sma200 = (self._sma_base + self._close) / min(self._n_days + 1, SMA_DAYS)
+            th_lgb, th_lstm, th_vote = self.thresholds
+            signals = [int(self._close > sma200), int(lgb_prob > th_lgb), int(regime_probs[0] >= th_lstm)]
+            bullish_count, go_long = vote(*signals, th_vote)
+            signal = {
+                'time': pd.Timestamp(self._ts), 'close': float(self._close), 'sma200': float(sma200),
+                'lgb_prob': lgb_prob, 'lstm_probs': [float(p) for p in regime_probs], 'signals': signals,
+                'bullish_count': int(bullish_count), 'go_long': bool(go_long),
+            }
+            if self.intraday_features:
+                elapsed = min(1.0, ((self._ts - self._first_ts) // MINUTE_NS + 1) / MINUTES_PER_DAY)
+                signal['intraday'] = {
+                    'ret_open': self._close / self._open - 1.0,
+                    'range': self._high / self._low - 1.0,
+                    'realized_vol': math.sqrt(self._rv),
+                    'elapsed': elapsed,
+                    'volume_pace': self._volume / elapsed,
+                }
+        self.last_signal = signal
+        return signal
+
+    def close_day(self):
+        # commit the partial day as a completed daily bar
+        if self._day is None:
+            return
+        row = self.engine.update(self._date, self._close, self.vix, self._volume)
+        if row is not None:
+            self.stream.step(FeatureEngine.vector(row)[0].astype(np.float32))
+        self._push_close(self._close)
+        self._last_day, self._day = self._day, None
+        incr('intraday.days')
+
+
+def replay(session: IntradaySession, bars: pd.DataFrame, on_signal=None) -> Optional[Dict]:
+    """Feed (field, ticker) intraday bars through session in time order.
+
+    At each timestamp the VIX bar goes first, so the signal bar sees the same-minute VIX.
+    """
+    tickers = [t for t in (session.vix_symbol, session.symbol) if t in bars['Close'].columns]
+    ts = np.asarray(bars.index.values).astype('datetime64[ns]').view('int64')
+    cols = {t: np.column_stack([bars[f][t].to_numpy(dtype=np.float64)
+                                for f in ('Open', 'High', 'Low', 'Close', 'Volume')]) for t in tickers}
+    signal = None
+    for i in range(len(ts)):
+        for t in tickers:
+            o, h, l, c, v = cols[t][i]
+            if c != c:
+                continue
+            out = session.on_bar(t, int(ts[i]), o, h, l, c, 0.0 if v != v else v)
+            if out is not None:
+                signal = out
+                if on_signal is not None:
+                    on_signal(out)
+    return signal
+
+
+def main(argv=None):
+    from .main import (DATA_PROVIDER, FETCH_OPTIONS, LGB_FILE, LSTM_FILE, SCALER_FILE, TH_LGB, TH_LSTM, TH_VOTE,
+                       USE_MOCK_DATA, MOCK_SEED, load_bars, model_dir)
+    from .models import Models
+
+    parser = argparse.ArgumentParser(description='Intraday signal: vote on every bar close of the current session')
+    parser.add_argument('--interval', default=os.getenv('INTRADAY_INTERVAL', '1m'), choices=['1m', '5m'])
+    parser.add_argument('--period', default='1d', help='intraday history to replay on start')
+    parser.add_argument('--poll', type=float, default=0, help='then fetch new bars every N seconds')
+    parser.add_argument('--buffer', type=int, default=int(os.getenv('INTRADAY_BUFFER', MINUTES_PER_DAY)),
+                        help='bars kept per ticker')
+    parser.add_argument('--intraday-features', action='store_true')
+    args = parser.parse_args(argv)
+
+    models = Models(model_dir(), LGB_FILE, LSTM_FILE, SCALER_FILE)
+    models.load()
+    session = IntradaySession(models, TH_LGB, TH_LSTM, TH_VOTE, capacity=args.buffer,
+                              intraday_features=args.intraday_features)
+    step = 5 if args.interval == '5m' else 1
+
+    if USE_MOCK_DATA:
+        from .synthetic import synthetic_bars
+        daily = load_bars()
+        minutes = synthetic_bars(MINUTES_PER_DAY // step, seed=MOCK_SEED + 1,
+                                 start_price=float(daily['Adj Close']['QQQ'].iloc[-1]), freq=f'{step}min',
+                                 end=daily.index[-1] + pd.offsets.BDay(1) + pd.Timedelta(minutes=16 * 60 - step))
+        fetch = None
+    else:
+        from .ingest import fetch_bars, provider_from_spec
+        provider = provider_from_spec(DATA_PROVIDER)
+
+        def fetch(period):
+            return fetch_bars(['QQQ', '^VIX'], period=period, interval=args.interval, provider=provider,
+                              **FETCH_OPTIONS)
+
+        daily = load_bars()
+        minutes = fetch(args.period)
+    # the daily history ends before the first intraday day, which is rebuilt from its bars
+    first_day = minutes.index[0].normalize()
+    session.warm_up(daily[daily.index < first_day])
+
+    def report(signal, changed_only=True):
+        previous = report.last
+        report.last = signal['go_long']
+        if changed_only and previous is not None and previous == signal['go_long']:
+            return
+        logger.info('%s close %.2f: %d/3 bullish (lgb %.2f, lstm bull %.2f) -> %s', signal['time'],
+                    signal['close'], signal['bullish_count'], signal['lgb_prob'], signal['lstm_probs'][0],
+                    'LONG TQQQ' if signal['go_long'] else 'CASH / SHORT')
+    report.last = None
+
+    t0 = time.perf_counter()
+    signal = replay(session, minutes, report)
+    n = session.rings[session.symbol].n
+    logger.info('Replayed %d bars in %.1f ms (%.3f ms/bar)', n, (time.perf_counter() - t0) * 1e3,
+                (time.perf_counter() - t0) * 1e3 / max(n, 1))
+    if signal is not None:
+        report(signal, changed_only=False)
+    while args.poll and fetch is not None:
+        time.sleep(args.poll)
+        try:
+            new = fetch('1d')
+        except Exception as e:
+            logger.error('Intraday fetch failed: %s', e)
+            continue
+        last = session.rings[session.symbol].last(1)[0]
+        if len(last):
+            new = new[np.asarray(new.index.values).astype('datetime64[ns]').view('int64') > last[0]]
+        replay(session, new, report)
+    return signal
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    main()
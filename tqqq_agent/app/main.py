@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import argparse
 import os
 import logging
 try:
@@ -8,246 +9,227 @@ except Exception:
         return
 from datetime import datetime
 from .models import Models
+from .features import FEATURE_COLS
+from .ensemble import lgb_bull_prob, vote
+from .instrumentation import METRICS, export, profiled, stage
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 logger = logging.getLogger('tqqq_agent')
 
 load_dotenv()
-# Ensure yfinance uses a safe, writable tz-cache location to avoid cache-folder errors
-import tempfile
-try:
-    import yfinance as _yf
-    tmp_cache = os.path.join(tempfile.gettempdir(), 'py-yfinance-cache')
-    try:
-        _yf.set_tz_cache_location(tmp_cache)
-    except Exception:
-        # non-fatal: continue without setting cache
-        pass
-except Exception:
-    # yfinance not installed yet or failed to import; that's fine for now
-    pass
+# Heavy dependencies (pandas, yfinance, torch, joblib) are imported only on the code
+# paths that use them, so `--check` starts quickly.
 MODEL_DIR = os.getenv('MODEL_DIR', './models')
 LGB_FILE = os.getenv('LGB_MODEL_FILE', 'lgb_model.pkl')
 LSTM_FILE = os.getenv('LSTM_MODEL_FILE', 'lstm_model.pth')
 SCALER_FILE = os.getenv('SCALER_FILE', 'scaler.pkl')
+# versioned models (app/registry.py); when set, the registry's current version replaces MODEL_DIR
+MODEL_REGISTRY_DIR = os.getenv('MODEL_REGISTRY_DIR') or None
+# local OHLCV store; set BAR_CACHE_DIR= (empty) to always download the full period
+BAR_CACHE_DIR = os.getenv('BAR_CACHE_DIR', './cache/bars') or None
+# bar source: 'yfinance', 'replay:<dir>' (recorded CSV/Parquet) or 'http://host:port' (app/ingest.py)
+DATA_PROVIDER = os.getenv('DATA_PROVIDER', 'yfinance')
+FETCH_OPTIONS = {'concurrency': int(os.getenv('FETCH_CONCURRENCY', 8)),
+                 'retries': int(os.getenv('FETCH_RETRIES', 3)),
+                 'timeout': float(os.getenv('FETCH_TIMEOUT', 30))}
+# optional memory-mapped float32 feature store (app/feature_store.py); unset keeps features in memory
+FEATURE_STORE_DIR = os.getenv('FEATURE_STORE_DIR') or None
+# same-day re-runs reuse features and model outputs; set PREDICTION_CACHE_DIR= (empty) to disable
+PREDICTION_CACHE_DIR = os.getenv('PREDICTION_CACHE_DIR', './cache/predictions') or None
+PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', 256))
+PREDICTION_CACHE_TTL = float(os.getenv('PREDICTION_CACHE_TTL', 86400))
+# model/feature versions kept side by side, so runs on different versions can share the directory
+PREDICTION_CACHE_VERSIONS = int(os.getenv('PREDICTION_CACHE_VERSIONS', 4))
+# append-only log of each run's features, model outputs and decision (app/event_log.py): a SQLite
+# path/URL or postgresql://...; set EVENT_LOG_URL= (empty) to disable
+EVENT_LOG_URL = os.getenv('EVENT_LOG_URL', 'sqlite:///./cache/events.sqlite') or None
 DRY_RUN = os.getenv('DRY_RUN', 'true').lower() in ['1','true','yes']
 TH_LGB = float(os.getenv('THRESH_LGB', 0.60))
 TH_LSTM = float(os.getenv('THRESH_LSTM', 0.65))
 TH_VOTE = int(os.getenv('THRESH_VOTE', 2))
 
-FEATURE_COLS = ['ret_5','ret_10','ret_20','vol_20','VIX','rsi','volume','month','dow','ret_1']
 USE_MOCK_DATA = os.getenv('USE_MOCK_DATA', 'false').lower() in ['1','true','yes']
+# synthetic history used when USE_MOCK_DATA is set (504 bars = 2 years, like the live fetch)
+MOCK_BARS = int(os.getenv('MOCK_BARS', 504))
+MOCK_SEED = int(os.getenv('MOCK_SEED', 0))
+
+
+def check() -> int:
+    # validate configuration and model artifacts without loading any model
+    from .check import check_artifacts, check_config
+    backend = os.getenv('MODEL_BACKEND', 'eager')
+    problems = check_config(TH_LGB, TH_LSTM, TH_VOTE, backend)
+    problems += check_artifacts(MODEL_DIR, LGB_FILE, LSTM_FILE, SCALER_FILE, backend, len(FEATURE_COLS))
+    for p in problems:
+        logger.error('Check failed: %s', p)
+    if not problems:
+        logger.info('Check OK: %s backend artifacts in %s', backend, MODEL_DIR)
+    return 1 if problems else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='TQQQ signal agent')
+    parser.add_argument('--check', action='store_true',
+                        help='validate configuration and model artifacts, then exit (does not import torch)')
+    args = parser.parse_args(argv)
+    if args.check:
+        return check()
+
+    METRICS.reset()
+    run_id = datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+    events = None
+    if EVENT_LOG_URL:
+        from .event_log import EventLog, store_from_url
+        events = EventLog(store_from_url(EVENT_LOG_URL), run_id=run_id)
+    try:
+        with profiled('tqqq_agent'), stage('run'):
+            return run(events)
+    finally:
+        if events is not None:
+            # the signal is already out; this only waits for the background writer to drain
+            events.close()
+        export(run_id=run_id)
 
 
-def main():
+def load_bars():
+    if USE_MOCK_DATA:
+        # seeded synthetic bars in the live (field, ticker) layout, so offline runs go
+        # through the same features and models as live ones
+        from .synthetic import synthetic_bars
+        logger.info('Using synthetic data for offline run (%d bars, seed %d)', MOCK_BARS, MOCK_SEED)
+        return synthetic_bars(MOCK_BARS, tickers=('QQQ',), seed=MOCK_SEED)
+    from .ingest import fetch_bars, provider_from_spec
+    # concurrent per-ticker fetches (or cache top-ups) with retry, so one transient error
+    # does not cost the signal
+    return fetch_bars(['QQQ','^VIX'], period='2y', interval='1d', provider=provider_from_spec(DATA_PROVIDER),
+                      cache_dir=BAR_CACHE_DIR, **FETCH_OPTIONS)
+
+
+def model_dir() -> str:
+    if not MODEL_REGISTRY_DIR:
+        return MODEL_DIR
+    from .registry import ModelRegistry
+    registry = ModelRegistry(MODEL_REGISTRY_DIR, LGB_FILE, LSTM_FILE, SCALER_FILE)
+    version = registry.current()
+    if version is None:
+        raise LookupError(f'No current model version in {MODEL_REGISTRY_DIR}')
+    registry.verify(version)
+    logger.info('Model version %s', version)
+    return str(registry.path(version))
+
+
+def predict(models, X):
+    # classifier on the last feature row, LSTM on the last 252 rows
+    with stage('scaler_transform'):
+        Xs = models.scaler.transform(X[-1:])
+    lgb_prob = float(lgb_bull_prob(models.predict_lgb_prob(Xs))[0])
+    regime_probs = models.predict_lstm_windows(X[None, -252:], batch_size=1)[0]
+    return lgb_prob, [float(p) for p in regime_probs]
+
+
+def run(events=None):
     logger.info('Starting TQQQ signal agent (dry_run=%s)', DRY_RUN)
 
-    models = Models(MODEL_DIR, LGB_FILE, LSTM_FILE, SCALER_FILE)
+    cache = None
     try:
-        models.load()
+        models = Models(model_dir(), LGB_FILE, LSTM_FILE, SCALER_FILE)
+        models.validate_paths()
+        if PREDICTION_CACHE_DIR:
+            from .prediction_cache import PredictionCache, array_digest, artifact_hash, feature_spec_hash
+            cache = PredictionCache(PREDICTION_CACHE_DIR, max_entries=PREDICTION_CACHE_SIZE,
+                                    ttl_seconds=PREDICTION_CACHE_TTL, max_versions=PREDICTION_CACHE_VERSIONS)
+            artifacts = artifact_hash(models.artifact_files())
     except Exception as e:
         logger.error('Model load failed: %s', e)
         return
 
-    # Fetch data (or use mock)
-    if USE_MOCK_DATA:
-        # create simple mock data without external deps
-        logger.info('Using mock data for offline run (no pandas/numpy)')
-        from datetime import timedelta
-        today = datetime.utcnow().date()
-        dates = [today - timedelta(days=i) for i in range(400,100,-1)]  # 300 business-like days
-        dates = list(reversed(dates))
-        # synthetic QQQ price series
-        q = [100.0]
-        import random
-        for _ in range(1, len(dates)):
-            q.append(q[-1] * (1 + random.normalvariate(0.0005, 0.01)))
-        vix = [20 + random.normalvariate(0,1) for _ in dates]
-        vol = [abs(random.normalvariate(1e7, 2e6)) for _ in dates]
-
-        # build a minimal DataFrame-like structure for build_features
-        class MiniDF(dict):
-            def __init__(self, d, idx):
-                super().__init__(d)
-                self.index = idx
-            def copy(self):
-                return MiniDF(dict(self), list(self.index))
-        data = MiniDF({'QQQ': q, '^VIX': vix}, dates)
-        vol_series = vol
-        # build_features expects pandas; for mock run we'll implement a tiny adapter
-        # We'll create a very small pandas-like df using lists and dicts handled in build_features
-        # For simplicity, call build_features only when real pandas is present; otherwise
-        # replicate simplified feature computations here.
-        # Minimal feature calc for mock path:
-        from statistics import mean, stdev
-        df = {}
-        df['QQQ'] = q
-        df['VIX'] = vix
-        df['volume'] = vol
-        # simple returns
-        def pct_change(arr, p):
-            return [(arr[i] - arr[i-p]) / arr[i-p] if i>=p and arr[i-p]!=0 else None for i in range(len(arr))]
-        for p in [5,10,20,50,100,200]:
-            df[f'ret_{p}'] = pct_change(q, p)
-            # rolling std of pct change - approximate
-            ret1 = pct_change(q,1)
-            vol_p = []
-            for i in range(len(ret1)):
-                window = ret1[max(0,i-p+1):i+1]
-                window = [w for w in window if w is not None]
-                vol_p.append(stdev(window) if len(window)>1 else 0.0)
-            df[f'vol_{p}'] = vol_p
-        # rsi simplified: set neutral
-        df['rsi'] = [50.0]*len(q)
-        df['month'] = [d.month for d in dates]
-        df['dow'] = [d.weekday() for d in dates]
-        # convert to a simple object that our prepare_lstm_sequence can handle in mock mode
-        class SeriesLike:
-            def __init__(self, arr):
-                self._arr = arr
-            @property
-            def values(self):
-                return self._arr
-            def __getitem__(self, idx):
-                return self._arr[idx]
-            # allow bracket/negative indexing like .iloc[-1]
-            @property
-            def iloc(self):
-                class _I:
-                    def __init__(self, arr):
-                        self.arr = arr
-                    def __getitem__(self, idx):
-                        return self.arr[idx]
-                return _I(self._arr)
-
-        class SimpleDF:
-            def __init__(self, d, idx):
-                self._d = d
-                self.index = idx
-            def __getitem__(self, key):
-                v = self._d[key]
-                if isinstance(v, list):
-                    return SeriesLike(v)
-                return v
-            def copy(self):
-                return SimpleDF(dict(self._d), list(self.index))
-            def tail(self, n):
-                s = {k: (v[-n:] if isinstance(v, list) else v) for k,v in self._d.items()}
-                return SimpleDF(s, self.index[-n:])
-            def __len__(self):
-                return len(self.index)
-        df = SimpleDF(df, dates)
-    else:
-        from .utils import fetch_data, build_features
-        try:
-            data = fetch_data(['QQQ','^VIX'], period='2y', interval='1d')
-            vol = fetch_data(['QQQ'], period='2y', interval='1d')['QQQ'].to_frame('Volume')
-        except Exception as e:
-            logger.error('Data fetch failed: %s', e)
-            return
-
-        # Normalize into single DF
-        df = data.copy()
-        df.columns = ['QQQ','VIX']
-        # Volume fetch may need reindex
-        vol_series = vol['Volume'] if 'Volume' in vol.columns else vol
+    import numpy as np
+    from .feature_store import FeatureStore, features_from_bars
+    try:
+        bars = load_bars()
+    except Exception as e:
+        logger.error('Data fetch failed: %s', e)
+        return
 
-        df = build_features(df, vol_series)
+    # float32 matrix holding only FEATURE_COLS, in order; fed to the scaler and LSTM without copies
+    with stage('build_features'):
+        cached = None
+        if cache is not None:
+            # the last bar date plus a digest of the inputs, so revised or adjusted bars miss
+            inputs = bars[[('Adj Close', 'QQQ'), ('Adj Close', '^VIX'), ('Volume', 'QQQ')]]
+            bar_key = f'{bars.index[-1]}:{array_digest(inputs.to_numpy(dtype=np.float64))}'
+            spec = feature_spec_hash()
+            cached = cache.get_features('QQQ', bar_key, spec)
+        if cached is not None:
+            dates, X = cached
+        elif FEATURE_STORE_DIR:
+            meta = {'model_dir': str(models.model_dir), 'backend': models.backend,
+                    'files': [LGB_FILE, LSTM_FILE, SCALER_FILE]}
+            dates, X = FeatureStore(FEATURE_STORE_DIR).build('QQQ', bars, models=meta)
+        else:
+            dates, X = features_from_bars(bars, 'QQQ')
+        if cache is not None and cached is None:
+            try:
+                cache.put_features('QQQ', bar_key, spec, dates, X)
+            except Exception as e:
+                logger.warning('Feature cache write failed: %s', e)
 
     # Check sufficient history
-    if len(df) < 252 or len(df) < 200:
-        logger.error('Not enough historical rows: %d', len(df))
+    if len(X) < 252:
+        logger.error('Not enough historical rows: %d', len(X))
         return
 
-    if USE_MOCK_DATA:
-        # simple list-based computations for mock
-        q_series = df['QQQ']
-        latest = q_series[-1]
-        sma200 = sum(q_series[-200:]) / len(q_series[-200:])
-        signal_sma = 1 if latest > sma200 else 0
-
-        # mock LGB probability
-        lgb_probs = models.predict_lgb_prob([[]])
-        try:
-            lgb_prob = float(lgb_probs[0][1])
-        except Exception:
-            lgb_prob = 0.5
-        signal_lgb = 1 if lgb_prob > TH_LGB else 0
-
-        # mock LSTM probs
-        try:
-            regime_probs = models.predict_lstm_probs(None)[0]
-            if hasattr(regime_probs, '__len__'):
-                lstm_bull = float(regime_probs[0])
-            else:
-                lstm_bull = 1/3
-        except Exception:
-            lstm_bull = 1/3
-            regime_probs = [lstm_bull, (1-lstm_bull)/2, (1-lstm_bull)/2]
-        signal_lstm = 1 if lstm_bull >= TH_LSTM else 0
+    # Signal 1: 200-day SMA on QQQ (mapped to TQQQ posture), over the rows that have features
+    closes = bars['Adj Close']['QQQ']
+    kept = np.searchsorted(closes.index.values.astype('datetime64[ns]').view('int64'), dates)
+    q = closes.to_numpy()[kept]
+    latest = q[-1]
+    sma200 = q[-200:].mean()
+    signal_sma = 1 if latest > sma200 else 0
+
+    # Signals 2 and 3: LightGBM and LSTM regime, served from the cache on same-day re-runs
+    entry = None
+    if cache is not None:
+        key = cache.prediction_key(X[-252:], models.backend, signal_sma, TH_LGB, TH_LSTM, TH_VOTE)
+        entry = cache.get_prediction(key, artifacts)
+    if entry is not None:
+        logger.info('Prediction cache hit (%s)', key[:12])
+        lgb_prob, regime_probs = entry['lgb_prob'], entry['lstm_probs']
     else:
-        # Signal 1: 200-day SMA on QQQ (mapped to TQQQ posture)
-        latest = df['QQQ'].iloc[-1]
-        sma200 = df['QQQ'].iloc[-200:].mean()
-        signal_sma = 1 if latest > sma200 else 0
-
-        # Signal 2: LightGBM
-        # Use the explicit FEATURE_COLS (order matters) and validate presence
-        # Support both pandas DataFrame and the lightweight mock SimpleDF
-        if hasattr(df, 'columns'):
-            available_cols = list(df.columns)
-        else:
-            # our SimpleDF stores data in _d
-            available_cols = list(getattr(df, '_d', {}).keys())
-
-        missing_cols = [c for c in FEATURE_COLS if c not in available_cols]
-        if missing_cols:
-            logger.error('Missing feature columns required by scaler: %s', missing_cols)
-            return
-
-        # select features in the exact order expected by the scaler
-        try:
-            X_df = None
-            if hasattr(df, 'columns'):
-                # pandas DataFrame
-                X_df = df[FEATURE_COLS].iloc[-1:]
-            else:
-                # SimpleDF: build row list preserving order
-                row = [df[c].values[-1] if hasattr(df[c], 'values') else df[c][-1] for c in FEATURE_COLS]
-                import numpy as _np
-                X_df = _np.array(row).reshape(1, -1)
-        except Exception:
-            logger.error('Failed to select FEATURE_COLS from dataframe')
-            return
-
         try:
-            Xs = models.scaler.transform(X_df.values if hasattr(X_df, 'values') else X_df)
+            models.load()
+            lgb_prob, regime_probs = predict(models, X)
         except Exception as e:
-            logger.error('Scaler transform failed: %s', e)
+            logger.error('Model inference failed: %s', e)
             return
-        lgb_probs = models.predict_lgb_prob(Xs)
-        if lgb_probs.ndim == 1:
-            # binary raw scores
-            lgb_prob = float(lgb_probs[0])
-        else:
-            lgb_prob = float(lgb_probs[0][1])
-        signal_lgb = 1 if lgb_prob > TH_LGB else 0
+    signal_lgb = 1 if lgb_prob > TH_LGB else 0
+    signal_lstm = 1 if regime_probs[0] >= TH_LSTM else 0
 
-        # Signal 3: LSTM regime
-        from .utils import prepare_lstm_sequence
-        seq = prepare_lstm_sequence(df, FEATURE_COLS, seq_len=252)
-        import torch
-        seq_t = torch.tensor(seq, dtype=torch.float32).unsqueeze(0)
+    bullish_count, go_long = vote(signal_sma, signal_lgb, signal_lstm, TH_VOTE)
+    final_signal = 'LONG TQQQ (100%)' if go_long else 'CASH / SHORT'
+    if cache is not None and entry is None and not models.mocked:
+        # also the audit record: the feature row and model version behind this signal
         try:
-            regime_probs = models.predict_lstm_probs(seq_t)[0]
+            cache.put_prediction(key, artifacts, {
+                'ticker': 'QQQ', 'bar_date': str(bars.index[-1]), 'feature_cols': FEATURE_COLS,
+                'features': [float(v) for v in X[-1]], 'lgb_prob': lgb_prob, 'lstm_probs': regime_probs,
+                'signals': [signal_sma, signal_lgb, signal_lstm], 'bullish_count': int(bullish_count),
+                'go_long': bool(go_long), 'thresholds': [TH_LGB, TH_LSTM, TH_VOTE]})
         except Exception as e:
-            logger.error('LSTM inference failed: %s', e)
-            return
-        signal_lstm = 1 if regime_probs[0] >= TH_LSTM else 0
-
-    bullish_count = signal_sma + signal_lgb + signal_lstm
-    final_signal = 'LONG TQQQ (100%)' if bullish_count >= TH_VOTE else 'CASH / SHORT'
+            logger.warning('Prediction cache write failed: %s', e)
+
+    if events is not None:
+        bar_date = bars.index[-1]
+        events.log('features', {'feature_cols': FEATURE_COLS, 'features': [float(v) for v in X[-1]],
+                                'rows': len(X), 'cached': cached is not None}, 'QQQ', bar_date)
+        events.log('prediction', {'lgb_prob': lgb_prob, 'lstm_probs': regime_probs, 'backend': models.backend,
+                                  'model_dir': str(models.model_dir), 'cache_hit': entry is not None,
+                                  'artifact_hash': artifacts if cache is not None else None}, 'QQQ', bar_date)
+        events.log('decision', {'signals': [signal_sma, signal_lgb, signal_lstm], 'bullish_count': int(bullish_count),
+                                'go_long': bool(go_long), 'signal': final_signal, 'close': float(latest),
+                                'sma200': float(sma200), 'thresholds': [TH_LGB, TH_LSTM, TH_VOTE],
+                                'dry_run': DRY_RUN}, 'QQQ', bar_date)
 
     # Output
     now = datetime.utcnow().strftime('%Y-%m-%d %H:%M')
@@ -263,4 +245,4 @@ def main():
         logger.warning('DRY_RUN is false but execution module not implemented in this prototype')
 
 if __name__ == '__main__':
-    main()
+    raise SystemExit(main())
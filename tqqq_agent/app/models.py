@@ -1,40 +1,152 @@
+import logging
 import os
 import pickle
+import threading
+import warnings
+from collections import deque
+from contextlib import contextmanager
 from pathlib import Path
 
-try:
-    import joblib
-except Exception:
-    joblib = None
-try:
-    import torch
-except Exception:
-    torch = None
+from .ensemble import lgb_bull_prob
+from .instrumentation import incr, timed
+from .runtime import FlatForest, FlatScaler, compiled_paths
+
+# torch and joblib are imported on first use (see _import_torch/_import_joblib) so that
+# importing this module and `main --check` never pay for them
+joblib = None
+torch = None
+_imported = set()
+
+logger = logging.getLogger('tqqq_agent')
+
+# torch.set_num_threads is process-wide: batched scoring changes it only while holding this lock
+_torch_threads = threading.RLock()
+
+
+def _import_torch():
+    global torch
+    if 'torch' not in _imported:
+        _imported.add('torch')
+        try:
+            import torch as _torch
+            torch = _torch
+        except Exception:
+            torch = None
+    return torch
+
+
+_lstm_regime_cls = None
+
+
+def lstm_regime(n_features: int = 10, hidden: int = 64, num_layers: int = 2, dropout: float = 0.3):
+    # the LSTMRegime network that lstm_model.pth state dicts belong to (shared with app/train.py)
+    global _lstm_regime_cls
+    if _lstm_regime_cls is None:
+        _import_torch()
+
+        class LSTMRegime(torch.nn.Module):
+            def __init__(self, n_features, hidden, num_layers, dropout):
+                super().__init__()
+                self.lstm = torch.nn.LSTM(n_features, hidden, num_layers=num_layers, batch_first=True,
+                                          dropout=dropout)
+                self.fc = torch.nn.Linear(hidden, 3)
+
+            def forward(self, x):
+                _, (h, _) = self.lstm(x)
+                return self.fc(h[-1])
+
+        _lstm_regime_cls = LSTMRegime
+    return _lstm_regime_cls(n_features, hidden, num_layers, dropout)
+
+
+def _import_joblib():
+    global joblib
+    if 'joblib' not in _imported:
+        _imported.add('joblib')
+        try:
+            import joblib as _joblib
+            joblib = _joblib
+        except Exception:
+            joblib = None
+    return joblib
+
+
+class MockLGB:
+    def predict_proba(self, X):
+        # return neutral probability 0.5 as plain python list
+        return [[0.5, 0.5] for _ in X]
+
+
+class MockScaler:
+    def transform(self, X):
+        return X
+
+
+class MockLSTM:
+    def __call__(self, seq_tensor):
+        import numpy as _np
+        # return uniform logits for 3 classes, one row per sequence in the batch
+        n = len(seq_tensor) if seq_tensor is not None else 1
+        return _np.log(_np.full((n, 3), 1/3))
+
+    def __repr__(self):
+        return '<MockLSTM>'
+
 
 class Models:
-    def __init__(self, model_dir: str, lgb_file: str, lstm_file: str, scaler_file: str):
+    def __init__(self, model_dir: str, lgb_file: str, lstm_file: str, scaler_file: str,
+                 backend: str = None):
         self.model_dir = Path(model_dir)
         self.lgb_path = self.model_dir / lgb_file
         self.lstm_path = self.model_dir / lstm_file
         self.scaler_path = self.model_dir / scaler_file
+        # 'eager': joblib + PyTorch module; 'compiled': artifacts written by export_models.py
+        self.backend = backend or os.getenv('MODEL_BACKEND', 'eager')
+        if self.backend not in ('eager', 'compiled'):
+            raise ValueError(f'Unknown MODEL_BACKEND: {self.backend}')
+        self.compiled_paths = compiled_paths(model_dir, lgb_file, lstm_file, scaler_file)
 
         self.lgb_model = None
         self.scaler = None
         self.lstm_model = None
 
+    def artifact_files(self):
+        # files the selected backend loads; their contents identify the model version
+        if self.backend == 'compiled':
+            return [self.compiled_paths[k] for k in ('lgb', 'lstm', 'scaler')]
+        return [self.lgb_path, self.lstm_path, self.scaler_path]
+
+    @property
+    def mocked(self) -> bool:
+        return any(isinstance(m, (MockLGB, MockScaler, MockLSTM))
+                   for m in (self.lgb_model, self.scaler, self.lstm_model))
+
     def validate_paths(self):
         missing = []
-        for p in [self.lgb_path, self.lstm_path, self.scaler_path]:
+        for p in self.artifact_files():
             if not p.exists():
                 missing.append(str(p))
         if missing:
             raise FileNotFoundError(f"Missing model files: {missing}")
 
-    def load(self):
+    @timed('models.load')
+    def load(self, mock: bool = False, allow_mock: bool = None):
+        if mock:
+            # explicit mock models for offline runs: no artifacts, no torch/joblib import
+            self.use_mocks()
+            return
         self.validate_paths()
-        # Load LGB and scaler with joblib if available, else try pickle, else use mocks
+        if self.backend == 'compiled':
+            self._load_compiled()
+            return
+        # a neutral 0.5 signal from a mock must never pass for a real one, so a failed load
+        # raises unless mocks are allowed (argument or ALLOW_MOCK_MODELS)
+        if allow_mock is None:
+            allow_mock = os.getenv('ALLOW_MOCK_MODELS', 'false').lower() in ['1', 'true', 'yes']
+        errors = []
+        # Load LGB and scaler with joblib if available, else pickle
         try:
-            if joblib is not None:
+            if _import_joblib() is not None:
                 self.lgb_model = joblib.load(self.lgb_path)
                 self.scaler = joblib.load(self.scaler_path)
             else:
@@ -42,79 +154,356 @@ class Models:
                     self.lgb_model = pickle.load(f)
                 with open(self.scaler_path, 'rb') as f:
                     self.scaler = pickle.load(f)
-        except Exception:
-            # fallback to simple mocks
+        except Exception as e:
             self.lgb_model = None
             self.scaler = None
+            errors.append(f'classifier/scaler: {e}')
 
-        # Try to load LSTM via torch; if unavailable, create a mock LSTM
-        if torch is not None:
+        if _import_torch() is not None:
             try:
-                class LSTMRegime(torch.nn.Module):
-                    def __init__(self):
-                        super().__init__()
-                        self.lstm = torch.nn.LSTM(10, 64, num_layers=2, batch_first=True, dropout=0.3)
-                        self.fc = torch.nn.Linear(64, 3)
-                    def forward(self, x):
-                        _, (h, _) = self.lstm(x)
-                        return self.fc(h[-1])
-
-                self.lstm_model = LSTMRegime()
+                self.lstm_model = lstm_regime()
                 state = torch.load(self.lstm_path, map_location='cpu')
-                # If the saved file is a state dict
-                if isinstance(state, dict):
-                    self.lstm_model.load_state_dict(state)
-                else:
-                    # If the saved file contains the whole model, try loading attributes
-                    try:
-                        self.lstm_model.load_state_dict(state.state_dict())
-                    except Exception:
-                        pass
+                # either a state dict or a whole pickled module
+                self.lstm_model.load_state_dict(state if isinstance(state, dict) else state.state_dict())
                 self.lstm_model.eval()
-            except Exception:
+            except Exception as e:
                 self.lstm_model = None
+                errors.append(f'LSTM: {e}')
         else:
             self.lstm_model = None
+            errors.append('LSTM: torch is not installed')
+
+        if errors:
+            if not allow_mock:
+                raise RuntimeError(f'Model load failed ({"; ".join(errors)}); '
+                                   'set ALLOW_MOCK_MODELS=true to run with neutral mocks')
+            logger.warning('Using mock models (ALLOW_MOCK_MODELS): %s', '; '.join(errors))
+            incr('models.mock_fallbacks')
+            self.use_mocks()
 
-        # If any model failed to load, replace with safe mocks
+    def use_mocks(self):
+        # fill every model that is not loaded with its neutral mock
         if self.lgb_model is None:
-            class MockLGB:
-                def predict_proba(self, X):
-                    # return neutral probability 0.5 as plain python list
-                    return [[0.5, 0.5] for _ in X]
             self.lgb_model = MockLGB()
-
         if self.scaler is None:
-            class MockScaler:
-                def transform(self, X):
-                    return X
             self.scaler = MockScaler()
-
         if self.lstm_model is None:
-            class MockLSTM:
-                def __call__(self, seq_tensor):
-                    import numpy as _np
-                    # return uniform logits for 3 classes
-                    return _np.log(_np.array([[1/3,1/3,1/3]]))
-                def __repr__(self):
-                    return '<MockLSTM>'
-            # create a small wrapper so predict_lstm_probs works similarly
             self.lstm_model = MockLSTM()
 
-    def predict_lgb_prob(self, X):
-        # expects 2D numpy array
+    def _load_compiled(self):
+        # no mock fallback here: the compiled backend is an explicit opt-in
+        if _import_torch() is None:
+            raise RuntimeError('MODEL_BACKEND=compiled needs torch to load the TorchScript LSTM')
+        self.lgb_model = FlatForest.load(self.compiled_paths['lgb'])
+        self.scaler = FlatScaler.load(self.compiled_paths['scaler'])
+        self.lstm_model = torch.jit.load(str(self.compiled_paths['lstm']), map_location='cpu')
+        self.lstm_model.eval()
+        if self.compiled_paths['golden'].exists():
+            self.check_parity(self.compiled_paths['golden'])
+
+    def check_parity(self, golden_path, atol: float = 1e-5):
+        # compare against outputs the original models produced on the same inputs at export time
+        import numpy as _np
+        with _np.load(golden_path, allow_pickle=False) as g:
+            X, seqs = g['X'], g['seqs']
+            lgb_expected, lstm_expected = g['lgb_prob'], g['lstm_probs']
+        lgb_got = self.predict_lgb_prob(self.scaler.transform(X))
+        lstm_got = self.predict_lstm_windows(seqs)
+        lgb_err = float(_np.abs(_np.asarray(lgb_got) - lgb_expected).max())
+        lstm_err = float(_np.abs(lstm_got - lstm_expected).max())
+        if lgb_err > atol or lstm_err > atol:
+            raise ValueError(f'{self.backend} backend parity check failed: '
+                             f'classifier max err {lgb_err:.2e}, LSTM max err {lstm_err:.2e}')
+        return lgb_err, lstm_err
+
+    @timed('models.lgb_predict')
+    def predict_lgb_prob(self, X, threads: int = None):
+        # expects 2D numpy array; threads applies to this call only and never touches the model
         if self.lgb_model is None:
             raise RuntimeError('LGB model not loaded')
-        if hasattr(self.lgb_model, 'predict_proba'):
-            return self.lgb_model.predict_proba(X)
+        incr('models.lgb_rows', len(X))
+        model = self.lgb_model
+        lightgbm = hasattr(model, 'booster_') or hasattr(model, 'dump_model')
+        kwargs = {'num_threads': threads} if threads and lightgbm else {}
+        if threads and not lightgbm and getattr(model, 'n_jobs', 0) is None:
+            # sklearn forests left at n_jobs=None take the (thread-local) joblib setting
+            from joblib import parallel_config
+            with parallel_config(n_jobs=threads):
+                return model.predict_proba(X)
+        if hasattr(model, 'predict_proba'):
+            return model.predict_proba(X, **kwargs)
         # If it's a raw Booster
-        return self.lgb_model.predict(X, raw_score=False)
+        return model.predict(X, raw_score=False, **kwargs)
 
+    @timed('models.lstm_predict')
     def predict_lstm_probs(self, seq_tensor):
         # seq_tensor: torch tensor shape (1, seq_len, features)
         if self.lstm_model is None:
             raise RuntimeError('LSTM model not loaded')
+        incr('models.lstm_sequences', len(seq_tensor) if seq_tensor is not None else 1)
+        if isinstance(self.lstm_model, MockLSTM):
+            # mock LSTM: logits are already a numpy array and torch is not needed
+            import numpy as _np
+            logits = _np.asarray(self.lstm_model(seq_tensor))
+            e = _np.exp(logits - logits.max(axis=1, keepdims=True))
+            return e / e.sum(axis=1, keepdims=True)
+        _import_torch()
         with torch.no_grad():
-            logits = self.lstm_model(seq_tensor)
+            logits = torch.as_tensor(self.lstm_model(seq_tensor))
             probs = torch.softmax(logits, dim=1).numpy()
         return probs
+
+    def predict_lstm_windows(self, windows, batch_size: int = None):
+        # windows: (n, seq_len, features) array, typically the strided view from utils.lstm_windows.
+        # Only one batch at a time is made contiguous, so memory is bounded by batch_size * seq_len.
+        import numpy as _np
+        batch_size = batch_size or int(os.getenv('LSTM_BATCH_SIZE') or 256)
+        mock = isinstance(self.lstm_model, MockLSTM)
+        if not mock:
+            _import_torch()
+        out = _np.empty((len(windows), 3), dtype=_np.float32)
+        for start in range(0, len(windows), batch_size):
+            batch = _np.ascontiguousarray(windows[start:start + batch_size], dtype=_np.float32)
+            if not mock:
+                # inference never writes its input, so read-only (memory-mapped) windows are
+                # wrapped without a copy; torch would otherwise warn about non-writable arrays
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', UserWarning)
+                    batch = torch.from_numpy(batch)
+            out[start:start + len(batch)] = self.predict_lstm_probs(batch)
+        return out
+
+    @contextmanager
+    def host_threads(self, threads: int = None):
+        # torch intra-op threads for one batched call, restored afterwards; the lock keeps
+        # concurrent batched calls from interleaving their set/restore
+        n = threads or int(os.getenv('SCORE_THREADS') or 0) or os.cpu_count() or 1
+        if isinstance(self.lstm_model, MockLSTM) or _import_torch() is None:
+            yield n
+            return
+        with _torch_threads:
+            prev = torch.get_num_threads()
+            torch.set_num_threads(n)
+            try:
+                yield n
+            finally:
+                torch.set_num_threads(prev)
+
+    @staticmethod
+    def batch_rows(seq_len: int, width: int = 64) -> int:
+        # sequences per LSTM batch: about 4M activations (seq_len * max(features, hidden)) per
+        # chunk, i.e. 256 full 252-row windows, and far more for short tails; LSTM_BATCH_SIZE overrides
+        env = int(os.getenv('LSTM_BATCH_SIZE') or 0)
+        return env or int(min(8192, max(64, (1 << 22) // (seq_len * width))))
+
+    @timed('models.score')
+    def score(self, windows, batch_size: int = None, threads: int = None):
+        """Classifier bull probability and LSTM regime probabilities for N full windows.
+
+        windows: (n, seq_len, features) raw feature rows; the classifier scores each window's
+        last row. Returns (lgb_prob (n,), lstm_probs (n, 3)).
+        """
+        import numpy as _np
+        with self.host_threads(threads) as workers:
+            last = _np.asarray(windows[:, -1], dtype=_np.float64)
+            lgb_prob = lgb_bull_prob(self.predict_lgb_prob(self.scaler.transform(last), threads=workers))
+            lstm_probs = self.predict_lstm_windows(windows, batch_size or self.batch_rows(windows.shape[1]))
+        return lgb_prob, lstm_probs
+
+    @timed('models.score')
+    def score_scenarios(self, prefix, tails, batch_size: int = None, threads: int = None):
+        """score() for N windows that share their first rows: window i is prefix + tails[i].
+
+        prefix: (seq_len - h, features) common history; tails: (n, h, features) scenario rows.
+        The eager LSTM runs the prefix once and continues every tail from its (h, c) state,
+        which is exact (each window still starts from a zero state) and costs h steps per
+        scenario instead of seq_len. Other backends score the assembled windows chunk by chunk.
+        """
+        import numpy as _np
+        prefix = _np.asarray(prefix, dtype=_np.float32)
+        tails = _np.asarray(tails, dtype=_np.float32)
+        n, h, _ = tails.shape
+        model = self.lstm_model
+        carried = (len(prefix) and _import_torch() is not None and hasattr(model, 'fc')
+                   and isinstance(getattr(model, 'lstm', None), torch.nn.LSTM))
+        with self.host_threads(threads) as workers:
+            last = tails[:, -1].astype(_np.float64)
+            lgb_prob = lgb_bull_prob(self.predict_lgb_prob(self.scaler.transform(last), threads=workers))
+            if not carried:
+                return lgb_prob, self.predict_lstm_windows(_ScenarioWindows(prefix, tails),
+                                                           batch_size or self.batch_rows(len(prefix) + h))
+            batch_size = batch_size or self.batch_rows(h)
+            incr('models.lstm_sequences', n)
+            out = _np.empty((n, 3), dtype=_np.float32)
+            with torch.no_grad():
+                _, (h0, c0) = model.lstm(torch.from_numpy(prefix)[None])
+                for start in range(0, n, batch_size):
+                    batch = torch.from_numpy(_np.ascontiguousarray(tails[start:start + batch_size]))
+                    b = len(batch)
+                    state = (h0.expand(-1, b, -1).contiguous(), c0.expand(-1, b, -1).contiguous())
+                    _, (hn, _) = model.lstm(batch, state)
+                    out[start:start + b] = torch.softmax(model.fc(hn[-1]), dim=1).numpy()
+        return lgb_prob, out
+
+
+class _ScenarioWindows:
+    # prefix + tails[i] windows, materialized one slice (batch) at a time
+    def __init__(self, prefix, tails):
+        self.prefix, self.tails = prefix, tails
+
+    def __len__(self):
+        return len(self.tails)
+
+    def __getitem__(self, index):
+        import numpy as _np
+        tails = self.tails[index]
+        head = _np.broadcast_to(self.prefix, (len(tails),) + self.prefix.shape)
+        return _np.concatenate([head, tails], axis=1)
+
+
+class StreamingLSTM:
+    """Incremental LSTM inference that carries (h, c) from one bar to the next.
+
+    warm_up() runs a full seq_len window from a zero state, exactly like
+    predict_lstm_probs. step() then advances the saved state by a single
+    timestep. A carried state has seen more than seq_len rows, so every
+    resync_every steps (default 4 * seq_len) the state is rebuilt from the last
+    seq_len rows to keep it close to the full-window result. The forget gates
+    wash out older rows quickly; use drift() to check a model before relying on
+    the default.
+    """
+
+    def __init__(self, models: Models, seq_len: int = 252, resync_every: int = None):
+        self.models = models
+        self.seq_len = seq_len
+        # one full pass per resync_every bars: 1 + seq_len / resync_every timesteps per bar
+        self.resync_every = resync_every or 4 * seq_len
+        self._rows = deque(maxlen=seq_len)
+        self._state = None
+        self._since_sync = 0
+        self.last_probs = None
+
+    @property
+    def incremental(self) -> bool:
+        # mocks (and missing torch) fall back to full-window evaluation
+        model = self.models.lstm_model
+        return (not isinstance(model, MockLSTM) and _import_torch() is not None
+                and hasattr(model, 'lstm') and hasattr(model, 'fc'))
+
+    def _run(self, rows):
+        import numpy as _np
+        model = self.models.lstm_model
+        if not isinstance(model.lstm, torch.nn.LSTM):
+            # TorchScript traces only return what forward() used, so replay the window step by step
+            layers, _ = self._weights()
+            shape = (len(layers), layers[0][1].shape[1])
+            state = (_np.zeros(shape, dtype=_np.float32), _np.zeros(shape, dtype=_np.float32))
+            for row in rows:
+                probs, state = self._step(row, state)
+            return probs, state
+        x = torch.from_numpy(_np.asarray(rows, dtype=_np.float32)).unsqueeze(0)
+        with torch.no_grad():
+            _, (h, c) = model.lstm(x)
+            probs = torch.softmax(model.fc(h[-1]), dim=1).numpy()[0]
+        return probs, (h[:, 0].numpy().copy(), c[:, 0].numpy().copy())
+
+    def _weights(self):
+        # per-layer numpy copies of the LSTM weights; a single timestep is a handful of
+        # small mat-vec products, where torch's per-call dispatch overhead would dominate
+        model = self.models.lstm_model
+        if getattr(self, '_weights_for', None) is not model:
+            lstm = model.lstm
+            self._layers = [
+                (getattr(lstm, f'weight_ih_l{k}').detach().numpy().copy(),
+                 getattr(lstm, f'weight_hh_l{k}').detach().numpy().copy(),
+                 (getattr(lstm, f'bias_ih_l{k}') + getattr(lstm, f'bias_hh_l{k}')).detach().numpy().copy())
+                for k in range(self._num_layers(lstm))]
+            self._fc = (model.fc.weight.detach().numpy().copy(), model.fc.bias.detach().numpy().copy())
+            self._weights_for = model
+        return self._layers, self._fc
+
+    @staticmethod
+    def _num_layers(lstm) -> int:
+        # TorchScript modules don't expose num_layers; count the weight tensors instead
+        k = 0
+        while hasattr(lstm, f'weight_ih_l{k}'):
+            k += 1
+        return k
+
+    def _step(self, row, state):
+        import numpy as _np
+        layers, (fc_w, fc_b) = self._weights()
+        h_prev, c_prev = state
+        h_new, c_new = _np.empty_like(h_prev), _np.empty_like(c_prev)
+        x = _np.asarray(row, dtype=_np.float32)
+        # raw (unscaled) inputs can saturate a gate; exp overflowing to inf gives the right limit
+        with _np.errstate(over='ignore'):
+            for k, (w_ih, w_hh, b) in enumerate(layers):
+                # PyTorch gate order: input, forget, cell, output
+                i, f, g, o = _np.split(w_ih @ x + w_hh @ h_prev[k] + b, 4)
+                c = c_prev[k] / (1 + _np.exp(-f)) + _np.tanh(g) / (1 + _np.exp(-i))
+                x = _np.tanh(c) / (1 + _np.exp(-o))
+                h_new[k], c_new[k] = x, c
+        logits = fc_w @ x + fc_b
+        e = _np.exp(logits - logits.max())
+        return e / e.sum(), (h_new, c_new)
+
+    def warm_up(self, window):
+        # window: (seq_len, features) history ending at the latest bar
+        rows = list(window)[-self.seq_len:]
+        self._rows.clear()
+        self._rows.extend(rows)
+        self._since_sync = 0
+        if not self.incremental:
+            import numpy as _np
+            self._state = None
+            self.last_probs = self.models.predict_lstm_probs(_np.asarray(self._rows)[None])[0]
+            return self.last_probs
+        self.last_probs, self._state = self._run(self._rows)
+        return self.last_probs
+
+    def step(self, row):
+        # advance by one new feature row and return the updated regime probabilities
+        if self.last_probs is None:
+            raise RuntimeError('StreamingLSTM.warm_up() must be called before step()')
+        self._rows.append(row)
+        self._since_sync += 1
+        if self._state is None or self._since_sync >= self.resync_every:
+            return self.warm_up(self._rows)
+        self.last_probs, self._state = self._step(row, self._state)
+        return self.last_probs
+
+    def peek(self, row):
+        # regime probabilities if row were the next bar, without committing it (e.g. a partial
+        # intraday bar that is revised until the close)
+        if self.last_probs is None:
+            raise RuntimeError('StreamingLSTM.warm_up() must be called before peek()')
+        if self._state is None:
+            import numpy as _np
+            rows = _np.asarray(list(self._rows)[1:] + [row], dtype=_np.float32)
+            return self.models.predict_lstm_probs(rows[None])[0]
+        return self._step(row, self._state)[0]
+
+    def drift(self) -> float:
+        # max abs difference between the carried state and a fresh full-window pass
+        import numpy as _np
+        if not self.incremental:
+            return 0.0
+        full = self.models.predict_lstm_probs(torch.from_numpy(_np.asarray(self._rows, dtype=_np.float32))[None])[0]
+        return float(_np.abs(_np.asarray(self.last_probs) - full).max())
+
+    def save(self, path):
+        _import_torch()
+        torch.save({'rows': list(self._rows), 'state': self._state, 'since_sync': self._since_sync,
+                    'last_probs': self.last_probs, 'seq_len': self.seq_len}, str(path))
+
+    def load(self, path):
+        _import_torch()
+        saved = torch.load(str(path), map_location='cpu', weights_only=False)
+        if saved['seq_len'] != self.seq_len:
+            raise ValueError(f"saved seq_len {saved['seq_len']} != {self.seq_len}")
+        self._rows = deque(saved['rows'], maxlen=self.seq_len)
+        self._state = saved['state']
+        self._since_sync = saved['since_sync']
+        self.last_probs = saved['last_probs']
+        return self
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from .features import FEATURE_COLS, RSI_PERIOD, WINDOWS
+from .instrumentation import incr
+
+# bump when compute_features changes in a way FEATURE_COLS/WINDOWS do not capture
+FEATURE_SPEC_VERSION = 1
+
+_digests = {}
+
+
+def file_digest(path) -> str:
+    # sha256 of a file, memoized on (size, mtime) so repeated calls in a process are free
+    path = Path(path)
+    st = path.stat()
+    key = (str(path.resolve()), st.st_size, st.st_mtime_ns)
+    digest = _digests.get(key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        digest = _digests[key] = h.hexdigest()
+    return digest
+
+
+def artifact_hash(paths: Iterable) -> str:
+    h = hashlib.sha256()
+    for p in paths:
+        h.update(Path(p).name.encode())
+        h.update(file_digest(p).encode())
+    return h.hexdigest()
+
+
+def feature_spec_hash(feature_cols=FEATURE_COLS) -> str:
+    spec = {'cols': list(feature_cols), 'windows': list(WINDOWS), 'rsi': RSI_PERIOD,
+            'dtype': 'float32', 'version': FEATURE_SPEC_VERSION}
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+
+def array_digest(arr: np.ndarray) -> str:
+    arr = np.ascontiguousarray(arr)
+    return _key(str(arr.dtype), arr.shape, arr.tobytes())
+
+
+def _key(*parts) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(p if isinstance(p, bytes) else str(p).encode())
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+class PredictionCache:
+    """On-disk cache of feature matrices and model outputs for same-day re-runs.
+
+    Features are keyed on (ticker, last bar date + input digest) under a directory per
+    feature-spec hash; predictions are keyed on the hashed model inputs and thresholds under a
+    directory per model-artifact hash, so changed models never serve old outputs. Processes
+    running different model versions can share the root: old version directories are only
+    removed by prune(), once they are the least recently used past max_versions or hold no
+    live entries. Entries expire after ttl_seconds and the least recently used are evicted
+    past max_entries per directory. Prediction entries keep the feature row they were
+    computed from.
+    """
+
+    def __init__(self, root: str, max_entries: int = 256, ttl_seconds: float = 86400,
+                 max_versions: int = 4):
+        self.root = Path(root)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_versions = max_versions
+
+    def _dir(self, kind: str, version: str) -> Path:
+        path = self.root / kind / version[:16]
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def _fresh(self, path: Path, created_at: float) -> bool:
+        if time.time() - created_at > self.ttl_seconds:
+            path.unlink(missing_ok=True)
+            return False
+        # mtime tracks last use for LRU eviction; created_at in the entry tracks the TTL
+        os.utime(path)
+        return True
+
+    def _write(self, directory: Path, name: str, write) -> Path:
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        path = directory / name
+        os.replace(tmp, path)
+        self.prune(directory.parent.name)
+        return path
+
+    @staticmethod
+    def _mtime(path: Path) -> float:
+        try:
+            return path.stat().st_mtime
+        except OSError:
+            return 0.0
+
+    def prune(self, kind: Optional[str] = None):
+        """Evict expired and least recently used entries, then whole version directories.
+
+        An entry's mtime is its last use, so one untouched for ttl_seconds has expired.
+        A version directory is removed when it has no entries left and has not been
+        touched for ttl_seconds, or when it is not among the max_versions most recently
+        used; the directory of the version just written is always among those.
+        """
+        now = time.time()
+        kinds = [self.root / kind] if kind else [p for p in self.root.iterdir() if p.is_dir()]
+        for base in kinds:
+            if not base.is_dir():
+                continue
+            versions = []
+            for directory in (p for p in base.iterdir() if p.is_dir()):
+                touched = self._mtime(directory)
+                entries = sorted(((self._mtime(p), p) for p in directory.iterdir() if not p.name.endswith('.tmp')),
+                                 key=lambda e: e[0])
+                live = [e for e in entries if now - e[0] <= self.ttl_seconds]
+                for _, old in entries[:len(entries) - len(live)] + live[:max(0, len(live) - self.max_entries)]:
+                    old.unlink(missing_ok=True)
+                last_used = max(live[-1][0] if live else 0.0, touched)
+                if not live and now - last_used > self.ttl_seconds:
+                    shutil.rmtree(directory, ignore_errors=True)
+                else:
+                    versions.append((last_used, directory))
+            versions.sort(key=lambda v: v[0], reverse=True)
+            for _, directory in versions[self.max_versions:]:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    @staticmethod
+    def _count(kind: str, hit: bool):
+        incr(f'cache.{kind}_{"hits" if hit else "misses"}')
+
+    def get_features(self, ticker: str, last_bar, spec: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        path = self._dir('features', spec) / f'{_key(ticker, last_bar)}.npz'
+        try:
+            with np.load(path) as z:
+                created_at, dates, X = float(z['created_at']), z['dates'], z['X']
+        except (OSError, KeyError, ValueError):
+            self._count('features', False)
+            return None
+        hit = self._fresh(path, created_at)
+        self._count('features', hit)
+        return (dates, X) if hit else None
+
+    def put_features(self, ticker: str, last_bar, spec: str, dates: np.ndarray, X: np.ndarray):
+        directory = self._dir('features', spec)
+        self._write(directory, f'{_key(ticker, last_bar)}.npz',
+                    lambda f: np.savez(f, created_at=time.time(), dates=dates, X=X))
+
+    @staticmethod
+    def prediction_key(inputs: np.ndarray, *params) -> str:
+        # inputs: every feature row the models read (the LSTM window; the classifier uses its last row)
+        return _key(np.ascontiguousarray(inputs, dtype=np.float32).tobytes(), *params)
+
+    def get_prediction(self, key: str, artifacts: str) -> Optional[Dict]:
+        path = self._dir('predictions', artifacts) / f'{key}.json'
+        try:
+            entry = json.loads(path.read_text())
+        except (OSError, ValueError):
+            self._count('predictions', False)
+            return None
+        hit = self._fresh(path, entry.get('created_at', 0))
+        self._count('predictions', hit)
+        return entry if hit else None
+
+    def put_prediction(self, key: str, artifacts: str, entry: Dict) -> Dict:
+        entry = dict(entry, key=key, artifact_hash=artifacts, created_at=time.time())
+        body = json.dumps(entry, sort_keys=True).encode()
+        self._write(self._dir('predictions', artifacts), f'{key}.json', lambda f: f.write(body))
+        return entry
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .instrumentation import incr
+from .models import Models
+from .prediction_cache import file_digest
+
+logger = logging.getLogger('tqqq_agent')
+
+MANIFEST = 'manifest.json'
+GOLDEN = 'golden.npz'
+STATE = 'registry.json'
+# training state is not part of a published model
+EXCLUDE = {MANIFEST, 'checkpoint.pt', 'checkpoint.pt.tmp'}
+
+
+def _write_json(path: Path, obj):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(obj, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+class ModelRegistry:
+    """Versioned model directories under one root.
+
+    Each ``<root>/<version>/`` holds the artifacts, ``golden.npz`` (fixed inputs and the
+    outputs the version produced when it was published) and ``manifest.json`` with a
+    sha256 per file. A version is assembled and validated in a temporary directory and
+    renamed into place complete, so a directory without a manifest is never a version.
+    ``registry.json`` names the current version and the versions it replaced, which
+    rollback() walks back through.
+    """
+
+    def __init__(self, root: str, lgb_file: str = 'lgb_model.pkl', lstm_file: str = 'lstm_model.pth',
+                 scaler_file: str = 'scaler.pkl', backend: str = None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.files = (lgb_file, lstm_file, scaler_file)
+        self.backend = backend
+
+    def path(self, version: str) -> Path:
+        return self.root / version
+
+    def manifest(self, version: str) -> Dict:
+        path = self.path(version) / MANIFEST
+        if not path.exists():
+            raise LookupError(f'Model version {version!r} is not published in {self.root}')
+        return json.loads(path.read_text())
+
+    def versions(self) -> List[str]:
+        found = [p for p in self.root.iterdir() if (p / MANIFEST).exists()]
+        return [p.name for p in sorted(found, key=lambda p: json.loads((p / MANIFEST).read_text())['created_at'])]
+
+    def _models(self, version: str, backend: str = None) -> Models:
+        manifest = self.manifest(version)
+        return Models(str(self.path(version)), *manifest['artifacts'], backend=backend or self.backend)
+
+    def publish(self, src: str, version: str = None, activate: bool = False) -> str:
+        """Add the model directory src (e.g. a train.py version) as a new version.
+
+        src is copied in unless it already is <root>/<version>. The eager models must load
+        without mocks; their outputs on fixed inputs become the version's golden file. A
+        failed publish leaves nothing behind under the version's name.
+        """
+        src = Path(src)
+        version = version or src.name
+        dest = self.path(version)
+        if (dest / MANIFEST).exists():
+            raise FileExistsError(f'Model version {version!r} is already published')
+        if src.resolve() == dest.resolve():
+            self._seal(dest, version)
+        else:
+            # assemble and validate under a temporary name, then rename the complete version
+            tmp = Path(tempfile.mkdtemp(dir=self.root, prefix=f'.{version}.'))
+            try:
+                shutil.copytree(src, tmp, dirs_exist_ok=True,
+                                ignore=lambda d, names: [n for n in names if n in EXCLUDE])
+                self._seal(tmp, version)
+                if dest.exists():
+                    # left by an older, interrupted publish: it never had a manifest
+                    shutil.rmtree(dest)
+                os.replace(tmp, dest)
+            except BaseException:
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise
+        logger.info('Published model version %s', version)
+        if activate:
+            self.activate(version)
+        return version
+
+    def _seal(self, directory: Path, version: str):
+        # load without mocks, record golden outputs, then write the manifest
+        import numpy as np
+
+        models = Models(str(directory), *self.files, backend='eager')
+        models.load(allow_mock=False)
+        rng = np.random.RandomState(0)
+        n_features = int(models.lstm_model.lstm.input_size)
+        X = rng.normal(size=(64, n_features))
+        seqs = rng.normal(size=(4, 252, n_features)).astype(np.float32)
+        np.savez(directory / GOLDEN, X=X, seqs=seqs,
+                 lgb_prob=np.asarray(models.predict_lgb_prob(models.scaler.transform(X)), dtype=np.float64),
+                 lstm_probs=models.predict_lstm_windows(seqs))
+
+        metadata = directory / 'metadata.json'
+        files = sorted(p for p in directory.iterdir() if p.is_file() and p.name not in EXCLUDE)
+        _write_json(directory / MANIFEST, {
+            'version': version,
+            'created_at': time.time(),
+            'artifacts': list(self.files),
+            'golden': GOLDEN,
+            'files': {p.name: {'sha256': file_digest(p), 'bytes': p.stat().st_size} for p in files},
+            'metadata': json.loads(metadata.read_text()) if metadata.exists() else {},
+        })
+
+    def verify(self, version: str):
+        # every file the manifest lists must still hash to the published checksum
+        manifest = self.manifest(version)
+        bad = []
+        for name, info in manifest['files'].items():
+            path = self.path(version) / name
+            if not path.exists() or file_digest(path) != info['sha256']:
+                bad.append(name)
+        if bad:
+            raise ValueError(f'Model version {version!r} failed checksum verification: {bad}')
+        return manifest
+
+    def load(self, version: str) -> Models:
+        # checksums, a real (non-mock) load, then parity with the published golden outputs
+        manifest = self.verify(version)
+        models = self._models(version)
+        models.load(allow_mock=False)
+        models.check_parity(self.path(version) / manifest['golden'])
+        return models
+
+    def state(self) -> Dict:
+        path = self.root / STATE
+        return json.loads(path.read_text()) if path.exists() else {'current': None, 'history': []}
+
+    def current(self) -> Optional[str]:
+        return self.state()['current']
+
+    def activate(self, version: str):
+        self.manifest(version)
+        state = self.state()
+        if state['current'] == version:
+            return
+        if state['current'] is not None:
+            state['history'].append(state['current'])
+        state['current'] = version
+        _write_json(self.root / STATE, state)
+        logger.info('Activated model version %s', version)
+
+    def rollback(self) -> str:
+        state = self.state()
+        if not state['history']:
+            raise LookupError('No previous model version to roll back to')
+        state['current'] = state['history'].pop()
+        _write_json(self.root / STATE, state)
+        logger.info('Rolled back to model version %s', state['current'])
+        return state['current']
+
+
+class HotModels:
+    """The registry's current version for a long-running process, swapped without pausing inference.
+
+    New versions are loaded and validated (ModelRegistry.load) on the caller's or the
+    watcher thread while the old version keeps serving; the swap is a single reference
+    assignment. Readers take ``snapshot()`` once per request so one request never mixes
+    versions. The last ``keep`` loaded versions stay in memory, so rolling back is instant.
+    """
+
+    def __init__(self, registry: ModelRegistry, poll_seconds: float = 30, keep: int = 2):
+        self.registry = registry
+        self.poll_seconds = poll_seconds
+        self.keep = keep
+        self._active = (None, None)
+        self._loaded = OrderedDict()
+        self._failed = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def snapshot(self) -> Models:
+        return self._active[1]
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._active[0]
+
+    def _published_at(self, version: str) -> Optional[float]:
+        try:
+            return self.registry.manifest(version)['created_at']
+        except (LookupError, OSError, ValueError, KeyError):
+            return None
+
+    def load(self, version: str = None) -> bool:
+        """Switch to version (default: the registry's current one). Returns True on a swap.
+
+        A version that fails validation is not retried until it is published again (its
+        manifest's created_at changes), and the active one keeps serving; only the first
+        load raises, since there is nothing to fall back to.
+        """
+        version = version or self.registry.current()
+        if version is None:
+            raise LookupError(f'No current model version in {self.registry.root}')
+        with self._lock:
+            if version == self.version:
+                return False
+            if version in self._failed:
+                if self._failed[version] == self._published_at(version):
+                    return False
+                del self._failed[version]
+            models = self._loaded.get(version)
+            if models is None:
+                try:
+                    models = self.registry.load(version)
+                except Exception as e:
+                    incr('registry.load_errors')
+                    if self.version is None:
+                        raise
+                    self._failed[version] = self._published_at(version)
+                    logger.error('Model version %s rejected, still serving %s: %s', version, self.version, e)
+                    return False
+            self._loaded[version] = models
+            self._loaded.move_to_end(version)
+            while len(self._loaded) > self.keep:
+                self._loaded.popitem(last=False)
+            previous = self.version
+            self._active = (version, models)
+        incr('registry.swaps')
+        logger.info('Serving model version %s (was %s)', version, previous)
+        return True
+
+    def rollback(self) -> str:
+        # a refused swap restores registry.json, so it never names a version nobody serves
+        state = self.registry.state()
+        version = self.registry.rollback()
+        self.load(version)
+        if self.version != version:
+            _write_json(self.registry.root / STATE, state)
+            raise RuntimeError(f'Rollback to model version {version} refused; still serving {self.version}')
+        return version
+
+    def _loop(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.load()
+            except Exception as e:
+                logger.error('Model registry poll failed: %s', e)
+
+    def start(self):
+        if self.version is None:
+            self.load()
+        self._thread = threading.Thread(target=self._loop, name='model-reload', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+def main(argv=None):
+    from .main import LGB_FILE, LSTM_FILE, SCALER_FILE, MODEL_REGISTRY_DIR
+
+    parser = argparse.ArgumentParser(description='Publish, verify, activate and roll back model versions')
+    parser.add_argument('--root', default=MODEL_REGISTRY_DIR or './registry')
+    sub = parser.add_subparsers(dest='command', required=True)
+    publish = sub.add_parser('publish', help='add a model directory (e.g. a train.py version)')
+    publish.add_argument('src')
+    publish.add_argument('--version', default=None, help='version name (default: the directory name)')
+    publish.add_argument('--activate', action='store_true')
+    sub.add_parser('list')
+    verify = sub.add_parser('verify')
+    verify.add_argument('version', nargs='?')
+    activate = sub.add_parser('activate')
+    activate.add_argument('version')
+    sub.add_parser('rollback')
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry(args.root, LGB_FILE, LSTM_FILE, SCALER_FILE)
+    if args.command == 'publish':
+        registry.publish(args.src, args.version, activate=args.activate)
+    elif args.command == 'list':
+        current = registry.current()
+        for v in registry.versions():
+            logger.info('%s %s', '*' if v == current else ' ', v)
+    elif args.command == 'verify':
+        version = args.version or registry.current()
+        registry.load(version)
+        logger.info('Model version %s OK', version)
+    elif args.command == 'activate':
+        registry.load(args.version)
+        registry.activate(args.version)
+    elif args.command == 'rollback':
+        registry.rollback()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    main()
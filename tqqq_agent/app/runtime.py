@@ -0,0 +1,188 @@
+from pathlib import Path
+
+import numpy as np
+
+# Flattened inference artifacts produced by export_models.py. They only need numpy
+# to load, so a compiled-backend worker never unpickles sklearn/LightGBM objects.
+
+# LightGBM's kZeroThreshold: values this close to 0 count as zero for missing_type 'Zero'
+ZERO_THRESHOLD = 1e-35
+
+
+class FlatForest:
+    """Tree ensemble stored as flat node arrays and evaluated level by level.
+
+    All trees share one set of arrays; ``roots`` holds each tree's first node.
+    Leaves have ``left == -1``. ``kind`` selects how leaf values combine:
+    'mean' (sklearn forests: averaged class-1 probability) or 'sigmoid'
+    (LightGBM binary: summed raw scores through a logistic link). NaN inputs follow
+    ``default_left``; at ``zero_missing`` nodes (LightGBM missing_type 'Zero') so do zeros.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, default_left, roots, depth, kind,
+                 float32_inputs=False, zero_missing=None):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.zero_missing = (np.zeros(len(self.feature), dtype=bool) if zero_missing is None
+                             else np.asarray(zero_missing, dtype=bool))
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.depth = int(depth)
+        self.kind = str(kind)
+        # sklearn trees compare float32-cast inputs against their thresholds
+        self.float32_inputs = bool(float32_inputs)
+
+    def leaf_values(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32 if self.float32_inputs else np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        for _ in range(self.depth):
+            left = self.left[node]
+            internal = left >= 0
+            if not internal.any():
+                break
+            x = X[rows, np.where(internal, self.feature[node], 0)]
+            missing = np.isnan(x) | (self.zero_missing[node] & (np.abs(x) <= ZERO_THRESHOLD))
+            go_left = np.where(missing, self.default_left[node], x <= self.threshold[node])
+            node = np.where(internal, np.where(go_left, left, self.right[node]), node)
+        return self.value[node]
+
+    def predict_proba(self, X) -> np.ndarray:
+        leaves = self.leaf_values(X)
+        if self.kind == 'sigmoid':
+            p = 1.0 / (1.0 + np.exp(-leaves.sum(axis=1)))
+        else:
+            p = leaves.mean(axis=1)
+        return np.column_stack([1.0 - p, p])
+
+    def save(self, path):
+        np.savez(path, feature=self.feature, threshold=self.threshold, left=self.left, right=self.right,
+                 value=self.value, default_left=self.default_left, roots=self.roots,
+                 depth=self.depth, kind=self.kind, float32_inputs=self.float32_inputs,
+                 zero_missing=self.zero_missing)
+
+    @classmethod
+    def load(cls, path) -> 'FlatForest':
+        with np.load(path, allow_pickle=False) as z:
+            return cls(z['feature'], z['threshold'], z['left'], z['right'], z['value'], z['default_left'],
+                       z['roots'], z['depth'], z['kind'], z['float32_inputs'],
+                       z['zero_missing'] if 'zero_missing' in z.files else None)
+
+
+class FlatScaler:
+    # StandardScaler.transform as two vectors
+    def __init__(self, mean, scale):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean) / self.scale
+
+    def save(self, path):
+        np.savez(path, mean=self.mean, scale=self.scale)
+
+    @classmethod
+    def load(cls, path) -> 'FlatScaler':
+        with np.load(path, allow_pickle=False) as z:
+            return cls(z['mean'], z['scale'])
+
+
+def _flatten_sklearn(model) -> FlatForest:
+    estimators = getattr(model, 'estimators_', None)
+    if estimators is None:
+        estimators = [model]
+    if len(getattr(model, 'classes_', [0, 1])) != 2:
+        raise ValueError('Only binary classifiers can be flattened')
+    parts, roots, offset, depth = [], [], 0, 0
+    for est in estimators:
+        tree = est.tree_
+        leaf = tree.children_left < 0
+        counts = tree.value[:, 0, :]
+        parts.append((
+            np.where(leaf, 0, tree.feature),
+            tree.threshold,
+            np.where(leaf, -1, tree.children_left + offset),
+            np.where(leaf, -1, tree.children_right + offset),
+            counts[:, 1] / counts.sum(axis=1),
+        ))
+        roots.append(offset)
+        offset += tree.node_count
+        depth = max(depth, tree.max_depth)
+    cols = [np.concatenate(c) for c in zip(*parts)]
+    return FlatForest(*cols, default_left=np.zeros(offset, dtype=bool), roots=roots, depth=depth,
+                      kind='mean', float32_inputs=True)
+
+
+def _flatten_lightgbm(booster) -> FlatForest:
+    dump = booster.dump_model()
+    if dump.get('num_class', 1) != 1:
+        raise ValueError('Only binary LightGBM models can be flattened')
+    feature, threshold, left, right, value, default_left, zero_missing, roots = [], [], [], [], [], [], [], []
+    depth = 0
+
+    def add(node, level):
+        nonlocal depth
+        depth = max(depth, level)
+        idx = len(feature)
+        feature.append(0)
+        threshold.append(0.0)
+        left.append(-1)
+        right.append(-1)
+        value.append(0.0)
+        default_left.append(False)
+        zero_missing.append(False)
+        if 'leaf_value' in node:
+            value[idx] = node['leaf_value']
+            return idx
+        if node.get('decision_type', '<=') != '<=':
+            raise ValueError('Categorical LightGBM splits are not supported by FlatForest')
+        feature[idx] = node['split_feature']
+        threshold[idx] = node['threshold']
+        # 'NaN': NaN takes default_left; 'Zero': NaN and zero both do; 'None': NaN is
+        # treated as 0, so it follows the branch 0 would take
+        missing_type = node.get('missing_type')
+        default_left[idx] = (node['default_left'] if missing_type in ('NaN', 'Zero')
+                             else 0.0 <= node['threshold'])
+        zero_missing[idx] = missing_type == 'Zero'
+        left[idx] = add(node['left_child'], level + 1)
+        right[idx] = add(node['right_child'], level + 1)
+        return idx
+
+    for tree in dump['tree_info']:
+        roots.append(add(tree['tree_structure'], 0))
+    return FlatForest(feature, threshold, left, right, value, default_left, roots, depth, kind='sigmoid',
+                      zero_missing=zero_missing)
+
+
+def flatten_classifier(model) -> FlatForest:
+    if hasattr(model, 'booster_'):
+        return _flatten_lightgbm(model.booster_)
+    if hasattr(model, 'dump_model'):
+        return _flatten_lightgbm(model)
+    if hasattr(model, 'tree_') or hasattr(model, 'estimators_'):
+        return _flatten_sklearn(model)
+    raise TypeError(f'Cannot flatten classifier of type {type(model).__name__}')
+
+
+def flatten_scaler(scaler) -> FlatScaler:
+    mean = getattr(scaler, 'mean_', None)
+    scale = getattr(scaler, 'scale_', None)
+    n = getattr(scaler, 'n_features_in_', None) or len(mean if mean is not None else scale)
+    return FlatScaler(mean if mean is not None else np.zeros(n),
+                      scale if scale is not None else np.ones(n))
+
+
+def compiled_paths(model_dir, lgb_file: str, lstm_file: str, scaler_file: str):
+    # compiled artifacts sit next to the originals with the same stem
+    model_dir = Path(model_dir)
+    return {
+        'lgb': model_dir / (Path(lgb_file).stem + '.npz'),
+        'scaler': model_dir / (Path(scaler_file).stem + '.npz'),
+        'lstm': model_dir / (Path(lstm_file).stem + '.ts'),
+        'golden': model_dir / 'export_golden.npz',
+    }
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import math
+import time
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .ensemble import voter_signals, vote
+from .feature_store import features_from_bars
+from .features import FEATURE_COLS, RSI_PERIOD
+
+logger = logging.getLogger('tqqq_agent')
+
+VIX_COL = FEATURE_COLS.index('VIX')
+# calendar features stay exact in the noise scenarios
+CALENDAR_COLS = [FEATURE_COLS.index(c) for c in ('month', 'dow')]
+SMA_DAYS = 200
+
+# (prefix, tails, close, sma200): window i is prefix + tails[i]; close/sma200 feed the SMA vote
+ScenarioSet = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+class Scenarios:
+    """Day-ahead scenario inputs built from one daily history (fetch_ohlcv layout).
+
+    Every generator returns a ScenarioSet for Models.score_scenarios: the shared
+    history rows of the LSTM window, one tail of scenario rows per scenario, and the
+    close and SMA200 the SMA voter compares.
+    """
+
+    def __init__(self, bars: pd.DataFrame, symbol: str = 'QQQ', vix: str = '^VIX', seq_len: int = 252):
+        close = bars['Adj Close']
+        df = pd.concat({'QQQ': close[symbol], 'VIX': close[vix]}, axis=1).dropna()
+        volume = bars['Volume'][symbol].reindex(df.index)
+        _, self.X = features_from_bars(bars, symbol, vix)
+        if len(self.X) < seq_len:
+            raise ValueError(f'Not enough historical rows: {len(self.X)}')
+        self.seq_len = seq_len
+        self.dates = df.index
+        self.closes = df['QQQ'].to_numpy(dtype=np.float64)
+        self.vix = df['VIX'].to_numpy(dtype=np.float64)
+        self.volume = volume.ffill().bfill().to_numpy(dtype=np.float64)
+
+    def _today(self, n: int):
+        # the window up to yesterday; each scenario's tail is today's row (or a change to it)
+        close = np.full(n, self.closes[-1])
+        return self.X[-self.seq_len:-1], close, np.full(n, self.closes[-SMA_DAYS:].mean())
+
+    def current(self) -> ScenarioSet:
+        # the live signal as a one-scenario set
+        prefix, close, sma = self._today(1)
+        return prefix, self.X[None, -1:], close, sma
+
+    def vix_shocks(self, shocks: Iterable[float]) -> ScenarioSet:
+        # today's row with VIX moved by each shock (points), everything else unchanged
+        shocks = np.asarray(list(shocks), dtype=np.float32)
+        tails = np.repeat(self.X[None, -1:], len(shocks), axis=0)
+        tails[:, 0, VIX_COL] = np.maximum(tails[:, 0, VIX_COL] + shocks, 0.0)
+        prefix, close, sma = self._today(len(shocks))
+        return prefix, tails, close, sma
+
+    def noise(self, n: int, scale: float = 0.1, seed: int = 0) -> ScenarioSet:
+        # today's row with every non-calendar feature jittered by N(0, scale) relative noise (input sensitivity)
+        rng = np.random.default_rng(seed)
+        row = self.X[-1].astype(np.float64)
+        jitter = rng.normal(0.0, scale, (n, len(row)))
+        jitter[:, CALENDAR_COLS] = 0.0
+        tails = (row * (1 + jitter))[:, None].astype(np.float32)
+        prefix, close, sma = self._today(n)
+        return prefix, tails, close, sma
+
+    def bootstrap(self, n: int, horizon: int = 1, lookback: int = 252, block: int = 5,
+                  seed: int = 0) -> ScenarioSet:
+        """n price paths horizon days ahead, block-bootstrapped from the last lookback days.
+
+        Each simulated day takes one historical day's return, VIX change and volume together,
+        in blocks of consecutive days to keep volatility clustering. Feature rows are computed
+        for all paths at once with the same formulas as FeatureEngine, so they match
+        build_features on the extended history. The scenario is the signal on the last
+        simulated day.
+        """
+        if not 0 < horizon < self.seq_len:
+            raise ValueError(f'horizon must be between 1 and {self.seq_len - 1}')
+        rng = np.random.default_rng(seed)
+        lookback = min(lookback, len(self.closes) - 1)
+        rets = self.closes[1:] / self.closes[:-1] - 1.0
+        dvix = np.diff(self.vix)
+        first = len(rets) - lookback
+        blocks = -(-horizon // block)
+        starts = rng.integers(first, len(rets) - block + 1, size=(n, blocks))
+        idx = (starts[:, :, None] + np.arange(block)).reshape(n, -1)[:, :horizon]
+
+        paths = self.closes[-1] * np.cumprod(1.0 + rets[idx], axis=1)
+        vix = np.empty((n, horizon))
+        level = np.full(n, self.vix[-1])
+        for d in range(horizon):
+            level = vix[:, d] = np.maximum(level + dvix[idx[:, d]], 1.0)
+        dates = pd.bdate_range(self.dates[-1] + pd.offsets.BDay(1), periods=horizon)
+
+        # each path's closes: enough history for the longest window, then the simulated days
+        windows = [int(c[4:]) for c in FEATURE_COLS if c.startswith(('ret_', 'vol_'))]
+        back = max(windows + [RSI_PERIOD]) + 1
+        closes = np.concatenate([np.broadcast_to(self.closes[-back:], (n, back)), paths], axis=1)
+        day_rets = closes[:, 1:] / closes[:, :-1] - 1.0
+        diffs = np.diff(closes, axis=1)
+        cols = {'VIX': vix, 'volume': self.volume[idx + 1],
+                'month': np.broadcast_to(dates.month.to_numpy(), (n, horizon)),
+                'dow': np.broadcast_to(dates.weekday.to_numpy(), (n, horizon))}
+        for c in FEATURE_COLS:
+            if c.startswith('ret_'):
+                p = int(c[4:])
+                cols[c] = paths / closes[:, back - p:back - p + horizon] - 1.0
+            elif c.startswith('vol_'):
+                p = int(c[4:])
+                last = np.lib.stride_tricks.sliding_window_view(day_rets[:, back - p:], p, axis=1)
+                cols[c] = last.std(axis=2, ddof=1)
+        moves = np.lib.stride_tricks.sliding_window_view(diffs[:, back - RSI_PERIOD:], RSI_PERIOD, axis=1)
+        gain_sum = np.maximum(moves, 0.0).sum(axis=2)
+        cols['rsi'] = 100 - 100 / (1 + gain_sum / np.abs(moves).sum(axis=2))
+        tails = np.stack([cols[c] for c in FEATURE_COLS], axis=2).astype(np.float32)
+
+        keep = max(SMA_DAYS - horizon, 0)
+        history = self.closes[len(self.closes) - keep:].sum() if keep else 0.0
+        sma = (history + paths[:, -min(horizon, SMA_DAYS):].sum(axis=1)) / SMA_DAYS
+        return self.X[len(self.X) - self.seq_len + horizon:], tails, paths[:, -1], sma
+
+
+def vote_distribution(lgb_prob, lstm_probs, close, sma200, th_lgb: float, th_lstm: float,
+                      th_vote: int, z: float = 1.96) -> Dict:
+    # share of scenarios voting long with a Wilson interval, plus per-voter rates and bands
+    lgb_prob = np.asarray(lgb_prob, dtype=np.float64)
+    lstm_bull = np.asarray(lstm_probs, dtype=np.float64)[:, 0]
+    signals = voter_signals(close, sma200, lgb_prob, lstm_bull, th_lgb, th_lstm)
+    count, go_long = vote(*signals, th_vote)
+    n = len(go_long)
+    p = float(go_long.mean()) if n else float('nan')
+    denom = 1 + z * z / n if n else 1.0
+    centre = (p + z * z / (2 * n)) / denom if n else p
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom if n else float('nan')
+    quantiles = (0.05, 0.5, 0.95)
+    return {
+        'n': n,
+        'p_long': p,
+        'ci': [max(0.0, centre - half), min(1.0, centre + half)],
+        'bullish_counts': (np.bincount(count, minlength=4) / max(n, 1)).tolist(),
+        'voter_rates': {name: float(s.mean()) for name, s in zip(('sma', 'lgb', 'lstm'), signals)},
+        'lgb_prob_q': np.quantile(lgb_prob, quantiles).tolist() if n else [],
+        'lstm_bull_q': np.quantile(lstm_bull, quantiles).tolist() if n else [],
+    }
+
+
+def evaluate(models, scenarios: ScenarioSet, th_lgb: float, th_lstm: float, th_vote: int,
+             batch_size: int = None, threads: int = None) -> Dict:
+    prefix, tails, close, sma200 = scenarios
+    lgb_prob, lstm_probs = models.score_scenarios(prefix, tails, batch_size=batch_size, threads=threads)
+    return vote_distribution(lgb_prob, lstm_probs, close, sma200, th_lgb, th_lstm, th_vote)
+
+
+def main(argv=None):
+    from .main import LGB_FILE, LSTM_FILE, SCALER_FILE, TH_LGB, TH_LSTM, TH_VOTE, load_bars, model_dir
+    from .models import Models
+
+    parser = argparse.ArgumentParser(description="Distribution of tomorrow's vote over stress and bootstrap scenarios")
+    parser.add_argument('--paths', type=int, default=2000, help='bootstrap paths per horizon')
+    parser.add_argument('--horizons', default='1,5,21', help='comma-separated days ahead')
+    parser.add_argument('--lookback', type=int, default=252)
+    parser.add_argument('--block', type=int, default=5)
+    parser.add_argument('--vix-shocks', default='-5,5,10,20,40', help='VIX point shocks to today (empty: none)')
+    parser.add_argument('--noise', type=int, default=0, help='N feature-noise scenarios')
+    parser.add_argument('--noise-scale', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--threads', type=int, default=None, help='torch / classifier threads (default: all cores)')
+    parser.add_argument('--batch-size', type=int, default=None, help='LSTM sequences per batch (default: sized to the host)')
+    args = parser.parse_args(argv)
+
+    models = Models(model_dir(), LGB_FILE, LSTM_FILE, SCALER_FILE)
+    models.load()
+    scenarios = Scenarios(load_bars())
+    sets = {'current': scenarios.current()}
+    if args.vix_shocks:
+        sets['vix shocks'] = scenarios.vix_shocks(float(s) for s in args.vix_shocks.split(','))
+    if args.noise:
+        sets['feature noise'] = scenarios.noise(args.noise, args.noise_scale, args.seed)
+    for h in (int(h) for h in args.horizons.split(',') if h.strip()):
+        sets[f'bootstrap {h}d'] = scenarios.bootstrap(args.paths, h, args.lookback, args.block, args.seed)
+
+    results = {}
+    for name, scenario_set in sets.items():
+        t0 = time.perf_counter()
+        r = results[name] = evaluate(models, scenario_set, TH_LGB, TH_LSTM, TH_VOTE, args.batch_size, args.threads)
+        logger.info('%-14s n=%-5d P(long)=%.3f [%.3f, %.3f] votes 0/1/2/3=%s lgb q05/50/95=%s lstm bull=%s (%.0f ms)',
+                    name, r['n'], r['p_long'], r['ci'][0], r['ci'][1],
+                    '/'.join(f'{c:.2f}' for c in r['bullish_counts']),
+                    '/'.join(f'{q:.2f}' for q in r['lgb_prob_q']), '/'.join(f'{q:.2f}' for q in r['lstm_bull_q']),
+                    (time.perf_counter() - t0) * 1e3)
+    return results
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    main()
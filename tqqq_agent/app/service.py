@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from .batch import SEQ_LEN, parse_universe, vote_results
+from .ensemble import lgb_bull_prob
+from .features import FeatureEngine
+from .instrumentation import METRICS, incr
+from .models import StreamingLSTM
+from .registry import HotModels
+
+logger = logging.getLogger('tqqq_agent')
+
+# request paths reported as their own metrics label; anything else counts as 'other'
+PATHS = ('/signal', '/health', '/metrics')
+SMA_DAYS = 200
+
+
+class SymbolState:
+    """Completed daily history of one symbol: a FeatureEngine, a StreamingLSTM and the
+    last SMA_DAYS closes, advanced by the bars each refresh adds.
+
+    The newest fetched bar may still be forming, so it is only previewed; it is
+    committed once a later bar arrives.
+    """
+
+    def __init__(self, models, df: pd.DataFrame, volume: np.ndarray):
+        # df: completed bars with the symbol's close in 'close' and 'VIX', as batch.symbol_features keeps them
+        self.models = models
+        self.engine = FeatureEngine()
+        self.closes = deque(maxlen=SMA_DAYS)
+        self.last_date = self.last_close = None
+        rows = self._push(df, volume)
+        if len(rows) < SEQ_LEN:
+            raise ValueError(f'Not enough historical rows: {len(rows)}')
+        self.stream = StreamingLSTM(models, seq_len=SEQ_LEN)
+        self.stream.warm_up(np.asarray(rows[-SEQ_LEN:], dtype=np.float32))
+
+    def _push(self, df: pd.DataFrame, volume: np.ndarray) -> List[np.ndarray]:
+        rows = []
+        close, vix = df['close'].to_numpy(dtype=np.float64), df['VIX'].to_numpy(dtype=np.float64)
+        for i, date in enumerate(df.index):
+            row = self.engine.update(date, close[i], vix[i], volume[i])
+            if row is not None:
+                rows.append(FeatureEngine.vector(row)[0])
+            self.closes.append(close[i])
+        if len(df):
+            self.last_date, self.last_close = df.index[-1], close[-1]
+        return rows
+
+    def advance(self, df: pd.DataFrame, volume: np.ndarray) -> bool:
+        # commit the completed bars after last_date; False when the committed history was revised
+        pos = df.index.searchsorted(self.last_date)
+        if pos >= len(df) or df.index[pos] != self.last_date or \
+                not np.isclose(df['close'].iloc[pos], self.last_close, rtol=1e-9, atol=0.0):
+            return False
+        for row in self._push(df.iloc[pos + 1:], volume[pos + 1:]):
+            self.stream.step(row.astype(np.float32))
+        return True
+
+    def preview(self, date, close: float, vix: float, volume: float):
+        # (feature row, LSTM probabilities, SMA200) if the forming bar closed now
+        row = self.engine.preview(date, close, vix, volume)
+        if row is None:
+            return None
+        x = FeatureEngine.vector(row)
+        recent = list(self.closes)[-(SMA_DAYS - 1):] + [close]
+        return x, self.stream.peek(x[0].astype(np.float32)), float(np.mean(recent))
+
+
+class SignalService:
+    """Resident signal process: models are loaded once, feature state and signals stay in memory.
+
+    A background thread refreshes data every refresh_seconds, steps each symbol's
+    SymbolState with the new bars and re-renders the /signal response; request handlers
+    only return pre-serialized bytes.
+    """
+
+    def __init__(self, models, universe: List[Tuple[str, str]], th_lgb: float, th_lstm: float,
+                 th_vote: int, fetch: Callable, refresh_seconds: float = 300, events=None):
+        # a Models, or a HotModels that swaps in new registry versions between refreshes
+        self.models = models
+        self.universe = universe
+        self.thresholds = (th_lgb, th_lstm, th_vote)
+        # fetch(tickers) -> OHLCV frame with (field, ticker) columns, e.g. a cached fetch_ohlcv
+        self.fetch = fetch
+        self.refresh_seconds = refresh_seconds
+        # optional event_log.EventLog; each refresh appends one decision record per symbol
+        self.events = events
+        # per-symbol SymbolState, only touched by the refreshing thread
+        self.states: Dict[str, SymbolState] = {}
+        self._bodies = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._metrics_lock = threading.Lock()
+        self.started = time.time()
+        self.last_refresh = None
+        self.last_refresh_seconds = 0.0
+        self.refresh_ok = 0
+        self.refresh_errors = 0
+        self.requests = {}
+        self.request_seconds = {}
+
+    def refresh(self) -> bool:
+        t0 = time.perf_counter()
+        try:
+            tickers = sorted({s for s, _ in self.universe}) + ['^VIX']
+            bars = self.fetch(tickers)
+            # one model version for the whole refresh, even if a swap lands meanwhile
+            models = self.models.snapshot() if isinstance(self.models, HotModels) else self.models
+            results = self._signals(bars, models)
+        except Exception as e:
+            logger.error('Signal refresh failed: %s', e)
+            self.refresh_errors += 1
+            return False
+        now = time.time()
+        bodies = {r['symbol']: json.dumps(dict(r, generated_at=now)).encode() for r in results}
+        bodies[None] = json.dumps({'generated_at': now, 'signals': results}).encode()
+        # swap whole references so readers never see a half-updated set
+        self._bodies = bodies
+        self.last_refresh = now
+        self.last_refresh_seconds = time.perf_counter() - t0
+        self.refresh_ok += 1
+        if self.events is not None:
+            version = self.models.version if isinstance(self.models, HotModels) else None
+            for r in results:
+                self.events.log('decision', dict(r, model_version=version), r['symbol'], bars.index[-1])
+        return True
+
+    def _state(self, symbol: str, models, df: pd.DataFrame, volume: np.ndarray) -> SymbolState:
+        # step the kept state with new bars; rebuild it for a new model version or revised history
+        state = self.states.get(symbol)
+        if state is not None and state.models is models and state.advance(df, volume):
+            incr('service.state_advances')
+            return state
+        incr('service.state_rebuilds')
+        state = self.states[symbol] = SymbolState(models, df, volume)
+        return state
+
+    def _signals(self, bars: pd.DataFrame, models) -> List[Dict]:
+        close, volume = bars['Adj Close'], bars['Volume']
+        entries, X, regime_probs, last, sma200 = [], [], [], [], []
+        for signal_symbol, trade_symbol in self.universe:
+            if signal_symbol not in close.columns:
+                logger.error('No bars for %s', signal_symbol)
+                continue
+            df = pd.concat({'close': close[signal_symbol], 'VIX': close['^VIX']}, axis=1).dropna()
+            vol = volume[signal_symbol].reindex(df.index).to_numpy(dtype=np.float64)
+            try:
+                state = self._state(signal_symbol, models, df.iloc[:-1], vol[:-1])
+            except ValueError as e:
+                logger.error('%s: %s', signal_symbol, e)
+                self.states.pop(signal_symbol, None)
+                continue
+            out = state.preview(df.index[-1], df['close'].iloc[-1], df['VIX'].iloc[-1], vol[-1])
+            if out is None:
+                logger.error('No feature row for %s on %s', signal_symbol, df.index[-1].date())
+                continue
+            entries.append((signal_symbol, trade_symbol, df.index[-1]))
+            X.append(out[0])
+            regime_probs.append(out[1])
+            last.append(df['close'].iloc[-1])
+            sma200.append(out[2])
+        if not entries:
+            return []
+        # one scaler/classifier call for the whole universe; the LSTM only stepped one row each
+        lgb_prob = lgb_bull_prob(models.predict_lgb_prob(models.scaler.transform(np.vstack(X))))
+        return vote_results(entries, lgb_prob, np.asarray(regime_probs), np.asarray(last), np.asarray(sma200),
+                            *self.thresholds)
+
+    def _loop(self):
+        while not self._stop.wait(self.refresh_seconds):
+            self.refresh()
+
+    def start(self):
+        if not self._bodies:
+            self.refresh()
+        self._thread = threading.Thread(target=self._loop, name='signal-refresh', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def signal_body(self, symbol: Optional[str] = None) -> Optional[bytes]:
+        return self._bodies.get(symbol)
+
+    def healthy(self) -> bool:
+        # healthy once a signal exists and the data is no older than a few refresh intervals
+        if self.last_refresh is None:
+            return False
+        return time.time() - self.last_refresh < max(3 * self.refresh_seconds, 60)
+
+    def observe(self, path: str, seconds: float):
+        # a fixed label set: probes of arbitrary paths must not grow the metrics
+        path = path if path in PATHS else 'other'
+        with self._metrics_lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            self.request_seconds[path] = self.request_seconds.get(path, 0.0) + seconds
+
+    def metrics_text(self) -> str:
+        lines = [
+            '# TYPE tqqq_refresh_total counter',
+            f'tqqq_refresh_total{{result="ok"}} {self.refresh_ok}',
+            f'tqqq_refresh_total{{result="error"}} {self.refresh_errors}',
+            '# TYPE tqqq_refresh_duration_seconds gauge',
+            f'tqqq_refresh_duration_seconds {self.last_refresh_seconds:.6f}',
+            '# TYPE tqqq_signal_age_seconds gauge',
+            f'tqqq_signal_age_seconds {time.time() - self.last_refresh if self.last_refresh else -1:.3f}',
+            '# TYPE tqqq_uptime_seconds gauge',
+            f'tqqq_uptime_seconds {time.time() - self.started:.3f}',
+            '# TYPE tqqq_http_requests_total counter',
+        ]
+        with self._metrics_lock:
+            requests = dict(self.requests)
+            seconds = dict(self.request_seconds)
+        if isinstance(self.models, HotModels):
+            lines += ['# TYPE tqqq_model_info gauge', f'tqqq_model_info{{version="{self.models.version}"}} 1']
+        lines += [f'tqqq_http_requests_total{{path="{p}"}} {n}' for p, n in sorted(requests.items())]
+        lines.append('# TYPE tqqq_http_request_seconds_total counter')
+        lines += [f'tqqq_http_request_seconds_total{{path="{p}"}} {s:.6f}' for p, s in sorted(seconds.items())]
+        # per-stage timings and counters recorded by utils/Models during refreshes
+        return '\n'.join(lines) + '\n' + METRICS.to_prometheus()
+
+
+def make_handler(service: SignalService):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code: int, body: bytes, content_type: str = 'application/json'):
+            self.send_response(code)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            t0 = time.perf_counter()
+            url = urlparse(self.path)
+            if url.path == '/signal':
+                symbol = parse_qs(url.query).get('symbol', [None])[0]
+                body = service.signal_body(symbol)
+                if body is None:
+                    self._send(404 if symbol else 503, b'{"error": "no signal"}')
+                else:
+                    self._send(200, body)
+            elif url.path == '/health':
+                ok = service.healthy()
+                self._send(200 if ok else 503, b'{"status": "ok"}' if ok else b'{"status": "stale"}')
+            elif url.path == '/metrics':
+                self._send(200, service.metrics_text().encode(), 'text/plain; version=0.0.4')
+            else:
+                self._send(404, b'{"error": "not found"}')
+            service.observe(url.path, time.perf_counter() - t0)
+
+        def log_message(self, fmt, *args):
+            # per-request access logs would dominate latency; keep them at debug
+            logger.debug('%s - ' + fmt, self.address_string(), *args)
+
+    return Handler
+
+
+def serve(service: SignalService, host: str = '0.0.0.0', port: int = 8080) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    from .main import (MODEL_DIR, MODEL_REGISTRY_DIR, LGB_FILE, LSTM_FILE, SCALER_FILE, BAR_CACHE_DIR,
+                       DATA_PROVIDER, EVENT_LOG_URL, FETCH_OPTIONS, TH_LGB, TH_LSTM, TH_VOTE)
+    from .event_log import EventLog, store_from_url
+    from .ingest import fetch_bars, provider_from_spec
+    from .models import Models
+    from .registry import ModelRegistry
+
+    if MODEL_REGISTRY_DIR:
+        # new versions activated in the registry are validated and swapped in without a restart
+        models = HotModels(ModelRegistry(MODEL_REGISTRY_DIR, LGB_FILE, LSTM_FILE, SCALER_FILE),
+                           poll_seconds=float(os.getenv('MODEL_POLL_SECONDS', 30)))
+        models.start()
+    else:
+        models = Models(MODEL_DIR, LGB_FILE, LSTM_FILE, SCALER_FILE)
+        models.load()
+    universe = parse_universe(os.getenv('SYMBOL_UNIVERSE', 'QQQ:TQQQ'))
+    events = EventLog(store_from_url(EVENT_LOG_URL), run_id='service') if EVENT_LOG_URL else None
+    # same provider, retry and cache configuration as main.load_bars
+    provider = provider_from_spec(DATA_PROVIDER)
+    service = SignalService(models, universe, TH_LGB, TH_LSTM, TH_VOTE,
+                            fetch=lambda tickers: fetch_bars(tickers, period='2y', interval='1d', provider=provider,
+                                                             cache_dir=BAR_CACHE_DIR, **FETCH_OPTIONS),
+                            refresh_seconds=float(os.getenv('REFRESH_SECONDS', 300)), events=events)
+    service.start()
+    host = os.getenv('SERVICE_HOST', '0.0.0.0')
+    server = serve(service, host=host, port=int(os.getenv('SERVICE_PORT', 8080)))
+    logger.info('Serving signals on %s:%d (refresh every %.0fs)', host, server.server_port,
+                service.refresh_seconds)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        if isinstance(models, HotModels):
+            models.stop()
+        if events is not None:
+            events.close()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    main()
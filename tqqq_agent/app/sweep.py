@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .backtest import TRADING_DAYS, voter_probs
+
+logger = logging.getLogger('tqqq_agent')
+
+METRICS = ['sharpe', 'max_drawdown', 'total_return', 'cagr', 'turnover_per_year', 'exposure']
+
+
+def grid(th_lgb: Iterable[float], th_lstm: Iterable[float], th_vote: Iterable[int]) -> np.ndarray:
+    # every (th_lgb, th_lstm, th_vote) combination as an (n, 3) float array
+    mesh = np.meshgrid(np.asarray(list(th_lgb), dtype=np.float64), np.asarray(list(th_lstm), dtype=np.float64),
+                       np.asarray(list(th_vote), dtype=np.float64), indexing='ij')
+    return np.stack([m.ravel() for m in mesh], axis=1)
+
+
+def random_combos(n: int, seed: int = 0, lgb_range=(0.3, 0.9), lstm_range=(0.2, 0.9),
+                  votes: Sequence[int] = (1, 2, 3)) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return np.stack([rng.uniform(*lgb_range, n), rng.uniform(*lstm_range, n),
+                     rng.choice(np.asarray(votes, dtype=np.float64), n)], axis=1)
+
+
+def _arrays(probs: pd.DataFrame) -> Dict[str, np.ndarray]:
+    return {
+        'sma': (probs['close'].to_numpy() > probs['sma200'].to_numpy()).astype(np.int8),
+        'lgb_prob': probs['lgb_prob'].to_numpy(dtype=np.float64),
+        'lstm_bull': probs['lstm_bull'].to_numpy(dtype=np.float64),
+        'next_ret': probs['next_ret'].to_numpy(dtype=np.float64),
+    }
+
+
+def evaluate_combos(arrays: Dict[str, np.ndarray], combos: np.ndarray, cost_bps: float = 0.0) -> np.ndarray:
+    """Metrics for many threshold combinations at once, one row per combo in METRICS order.
+
+    Uses the same comparisons as ensemble.voter_signals/vote and the same position and
+    cost model as backtest.evaluate, broadcast to a (combos, days) matrix.
+    """
+    th_lgb, th_lstm, th_vote = combos[:, :1], combos[:, 1:2], combos[:, 2:3]
+    count = (arrays['sma'][None, :] + (arrays['lgb_prob'][None, :] > th_lgb)
+             + (arrays['lstm_bull'][None, :] >= th_lstm))
+    position = count >= th_vote
+    k, n = position.shape
+    out = np.zeros((k, len(METRICS)))
+    if n == 0:
+        return out
+
+    # bool trades/positions and in-place float passes keep this at a handful of (k, n) arrays
+    trades = np.empty_like(position)
+    trades[:, 0] = position[:, 0]
+    np.not_equal(position[:, 1:], position[:, :-1], out=trades[:, 1:])
+    ret = np.where(position, arrays['next_ret'][None, :], 0.0)
+    if cost_bps:
+        np.subtract(ret, cost_bps / 1e4, out=ret, where=trades)
+    mean = ret.mean(axis=1)
+    std = np.sqrt(np.maximum(np.einsum('ij,ij->i', ret, ret) / n - mean * mean, 0.0))
+    ret += 1.0
+    equity = np.cumprod(ret, axis=1, out=ret)
+    drawdown = np.maximum.accumulate(equity, axis=1)
+    np.divide(equity, drawdown, out=drawdown)
+    final = equity[:, -1]
+    years = n / TRADING_DAYS
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[:, 0] = np.where(std > 0, mean / std * np.sqrt(TRADING_DAYS), 0.0)
+        out[:, 1] = drawdown.min(axis=1) - 1.0
+        out[:, 2] = final - 1.0
+        out[:, 3] = np.where(final > 0, final ** (1.0 / years) - 1.0, -1.0)
+    out[:, 4] = np.count_nonzero(trades, axis=1) / years
+    out[:, 5] = np.count_nonzero(position, axis=1) / n
+    return out
+
+
+_worker_arrays = None
+
+
+def _init_worker(arrays):
+    global _worker_arrays
+    _worker_arrays = arrays
+
+
+def _evaluate_chunk(args):
+    combos, cost_bps = args
+    return evaluate_combos(_worker_arrays, combos, cost_bps)
+
+
+def sweep(probs: pd.DataFrame, combos: np.ndarray, cost_bps: float = 0.0, workers: int = 1,
+          chunk_size: int = 512, rank_by: str = 'sharpe') -> pd.DataFrame:
+    """Rank threshold combinations over precomputed voter inputs (backtest.voter_probs).
+
+    The model outputs are fixed, so each combination only costs a few array passes.
+    Chunks of combinations are spread over a process pool; every worker receives the
+    voter arrays once through the pool initializer.
+    """
+    arrays = _arrays(probs)
+    chunks = [(combos[i:i + chunk_size], cost_bps) for i in range(0, len(combos), chunk_size)]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(arrays,)) as pool:
+            parts = list(pool.map(_evaluate_chunk, chunks))
+    else:
+        parts = [evaluate_combos(arrays, c, cost) for c, cost in chunks]
+    metrics = np.concatenate(parts) if parts else np.zeros((0, len(METRICS)))
+
+    out = pd.DataFrame(metrics, columns=METRICS)
+    out.insert(0, 'th_vote', combos[:, 2].astype(int))
+    out.insert(0, 'th_lstm', combos[:, 1])
+    out.insert(0, 'th_lgb', combos[:, 0])
+    # drawdowns are negative, so higher is better for every metric except turnover
+    out = out.sort_values(rank_by, ascending=rank_by == 'turnover_per_year', kind='stable')
+    return out.reset_index(drop=True)
+
+
+def _range(spec: str) -> np.ndarray:
+    # 'start:stop:step' (inclusive stop) or a comma-separated list
+    if ':' in spec:
+        start, stop, step = (float(x) for x in spec.split(':'))
+        return np.round(np.arange(start, stop + step / 2, step), 10)
+    return np.asarray([float(x) for x in spec.split(',')])
+
+
+def main(argv=None):
+    from .main import MODEL_DIR, LGB_FILE, LSTM_FILE, SCALER_FILE, BAR_CACHE_DIR
+    from .models import Models
+    from .utils import build_features, fetch_ohlcv
+
+    parser = argparse.ArgumentParser(description='Threshold sweep over the three-vote ensemble')
+    parser.add_argument('--period', default='max')
+    parser.add_argument('--trade-symbol', default='TQQQ')
+    parser.add_argument('--leverage', type=float, default=3.0)
+    parser.add_argument('--cost-bps', type=float, default=0.0)
+    parser.add_argument('--lgb', default='0.30:0.90:0.01', help="start:stop:step or comma list")
+    parser.add_argument('--lstm', default='0.20:0.90:0.01', help="start:stop:step or comma list")
+    parser.add_argument('--votes', default='1,2,3')
+    parser.add_argument('--random', type=int, default=0, help='sample N random combinations instead of the grid')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=int(os.getenv('BATCH_WORKERS', os.cpu_count() or 1)))
+    parser.add_argument('--rank-by', default='sharpe', choices=METRICS)
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--out', default=None, help='write every ranked result to this CSV')
+    args = parser.parse_args(argv)
+
+    models = Models(MODEL_DIR, LGB_FILE, LSTM_FILE, SCALER_FILE)
+    models.load()
+    bars = fetch_ohlcv(['QQQ', '^VIX', args.trade_symbol], period=args.period, interval='1d',
+                       cache_dir=BAR_CACHE_DIR)
+    df = bars['Adj Close'][['QQQ', '^VIX']].dropna()
+    df.columns = ['QQQ', 'VIX']
+    df = build_features(df, bars['Volume']['QQQ'])
+    probs = voter_probs(df, models, trade_close=bars['Adj Close'][args.trade_symbol], leverage=args.leverage)
+
+    lgb, lstm = _range(args.lgb), _range(args.lstm)
+    votes = [int(v) for v in args.votes.split(',')]
+    if args.random:
+        combos = random_combos(args.random, args.seed, (lgb.min(), lgb.max()), (lstm.min(), lstm.max()), votes)
+    else:
+        combos = grid(lgb, lstm, votes)
+    results = sweep(probs, combos, cost_bps=args.cost_bps, workers=args.workers, rank_by=args.rank_by)
+    logger.info('Evaluated %d combinations over %d days', len(results), len(probs))
+    with pd.option_context('display.width', 160, 'display.max_columns', 20):
+        logger.info('Top %d by %s:\n%s', args.top, args.rank_by, results.head(args.top).to_string(index=False))
+    if args.out:
+        results.to_csv(args.out, index=False)
+    return results
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    main()
@@ -0,0 +1,40 @@
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+# Seeded synthetic OHLCV bars in the same (field, ticker) layout fetch_ohlcv returns.
+# Distributions follow the original USE_MOCK_DATA generator: prices are a geometric
+# random walk with N(0.0005, 0.01) returns, VIX ~ 20 + N(0, 1), volume ~ |N(1e7, 2e6)|.
+
+TRADING_DAYS = 252
+MINUTES_PER_DAY = 390
+
+
+def synthetic_bars(n_bars: int, tickers: Iterable[str] = ('QQQ',), seed: int = 0,
+                   end: Optional[pd.Timestamp] = None, freq: str = 'B',
+                   start_price: float = 100.0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(end if end is not None else pd.Timestamp.now().normalize())
+    index = pd.date_range(end=end, periods=n_bars, freq=freq)
+    fields = {f: {} for f in ('Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume')}
+
+    def add(ticker, close, volume):
+        open_ = np.empty_like(close)
+        open_[0] = close[0]
+        open_[1:] = close[:-1]
+        wick = np.abs(rng.normal(0.0, 0.003, (2, n_bars)))
+        fields['Open'][ticker] = open_
+        fields['High'][ticker] = np.maximum(open_, close) * (1 + wick[0])
+        fields['Low'][ticker] = np.minimum(open_, close) * (1 - wick[1])
+        fields['Close'][ticker] = close
+        fields['Adj Close'][ticker] = close
+        fields['Volume'][ticker] = volume
+
+    for ticker in tickers:
+        close = start_price * np.cumprod(1 + rng.normal(0.0005, 0.01, n_bars))
+        add(ticker, close, np.abs(rng.normal(1e7, 2e6, n_bars)))
+    add('^VIX', 20 + rng.normal(0, 1, n_bars), np.zeros(n_bars))
+
+    return pd.concat({f: pd.DataFrame(cols, index=index) for f, cols in fields.items()},
+                     axis=1, names=['Price', 'Ticker'])
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .feature_store import compute_features
+from .features import FEATURE_COLS
+
+logger = logging.getLogger('tqqq_agent')
+
+SEQ_LEN = 252
+# labels look HORIZON bars ahead; the LSTM's three regimes split forward returns at +/-BAND
+HORIZON = 21
+BAND = 0.02
+REGIMES = ['bull', 'sideways', 'bear']
+
+
+def forward_returns(close: np.ndarray, horizon: int = HORIZON) -> np.ndarray:
+    out = np.full(len(close), np.nan)
+    out[:-horizon] = close[horizon:] / close[:-horizon] - 1.0
+    return out
+
+
+def regimes(fwd_ret: np.ndarray, band: float = BAND) -> np.ndarray:
+    # class 0 is bull, matching predict_lstm_probs(...)[:, 0] at inference time
+    return np.where(fwd_ret > band, 0, np.where(fwd_ret < -band, 2, 1)).astype(np.int64)
+
+
+def build_dataset(bars: pd.DataFrame, symbols: Sequence[str], vix: str = '^VIX',
+                  horizon: int = HORIZON) -> Dict[str, Dict[str, np.ndarray]]:
+    """Per-symbol float32 FEATURE_COLS matrices (same rows as build_features) with labels.
+
+    Rows whose forward return is not known yet are dropped; they are the newest
+    `horizon` bars and only matter at inference time.
+    """
+    close = bars['Adj Close']
+    out = {}
+    for sym in symbols:
+        dates, X = compute_features(bars.index, close[sym].to_numpy(), close[vix].to_numpy(),
+                                    bars['Volume'][sym].to_numpy())
+        all_dates = bars.index.values.astype('datetime64[ns]').view('int64')
+        fwd = forward_returns(close[sym].to_numpy(dtype=np.float64), horizon)[np.searchsorted(all_dates, dates)]
+        known = np.isfinite(fwd)
+        out[sym] = {'dates': dates[known], 'X': X[known], 'fwd_ret': fwd[known]}
+        logger.info('%s: %d labeled rows', sym, int(known.sum()))
+    return out
+
+
+class WindowDataset:
+    """LSTM training windows read straight out of the per-symbol feature matrices.
+
+    Only window end positions are stored; __getitem__ slices seq_len rows from the
+    (scaled) matrix, so no (windows, seq_len, features) array is ever built.
+    """
+
+    def __init__(self, matrices: List[np.ndarray], labels: List[np.ndarray], ends: List[np.ndarray],
+                 seq_len: int = SEQ_LEN):
+        self.matrices = matrices
+        self.labels = labels
+        self.seq_len = seq_len
+        self.index = np.concatenate([np.stack([np.full(len(e), i), e], axis=1)
+                                     for i, e in enumerate(ends)]) if ends else np.zeros((0, 2), int)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        import torch
+        m, end = self.index[i]
+        window = self.matrices[m][end - self.seq_len + 1:end + 1]
+        return torch.from_numpy(window), int(self.labels[m][end])
+
+
+def _window_ends(lo: int, hi: int, seq_len: int, stride: int) -> np.ndarray:
+    # window end rows in [lo, hi) that have seq_len rows of history
+    return np.arange(max(lo, seq_len - 1), hi, stride)
+
+
+def train_classifier(X: np.ndarray, y: np.ndarray, threads: int, seed: int = 0):
+    try:
+        from lightgbm import LGBMClassifier
+        model = LGBMClassifier(n_estimators=300, learning_rate=0.03, num_leaves=31, min_child_samples=50,
+                               subsample=0.8, subsample_freq=1, colsample_bytree=0.8,
+                               n_jobs=threads, random_state=seed, verbose=-1)
+    except Exception as e:
+        # same fallback as generate_models.py when LightGBM (libomp) is unavailable
+        logger.warning('LightGBM unavailable (%s); training a RandomForest classifier', e)
+        from sklearn.ensemble import RandomForestClassifier
+        model = RandomForestClassifier(n_estimators=300, min_samples_leaf=50, n_jobs=threads, random_state=seed)
+    model.fit(X, y)
+    return model
+
+
+def fold_scaler(model, mean: np.ndarray, scale: np.ndarray):
+    """Make a network trained on (x - mean) / scale accept raw x.
+
+    Inference feeds the LSTM unscaled FEATURE_COLS rows, so the standardization is
+    folded into the first layer: W' = W / scale and b' = b - W' @ mean.
+    """
+    import torch
+    with torch.no_grad():
+        w = model.lstm.weight_ih_l0
+        scale_t = torch.as_tensor(scale, dtype=w.dtype)
+        mean_t = torch.as_tensor(mean, dtype=w.dtype)
+        w.div_(scale_t)
+        model.lstm.bias_ih_l0.sub_(w @ mean_t)
+    return model
+
+
+def _evaluate_lstm(model, loader):
+    import torch
+    model.eval()
+    loss_fn = torch.nn.CrossEntropyLoss(reduction='sum')
+    total, correct, n = 0.0, 0, 0
+    with torch.no_grad():
+        for seqs, y in loader:
+            logits = model(seqs)
+            total += float(loss_fn(logits, y))
+            correct += int((logits.argmax(dim=1) == y).sum())
+            n += len(y)
+    return (total / n, correct / n) if n else (float('nan'), float('nan'))
+
+
+def train(bars: pd.DataFrame, symbols: Sequence[str], out_dir: str, version: Optional[str] = None,
+          resume: bool = False, epochs: int = 10, batch_size: int = 128, lr: float = 1e-3,
+          seq_len: int = SEQ_LEN, stride: int = 1, horizon: int = HORIZON, band: float = BAND,
+          val_frac: float = 0.15, threads: Optional[int] = None, workers: int = 0,
+          thresholds: Optional[Dict] = None, seed: int = 0) -> Path:
+    """Train scaler, classifier and LSTM and write them to <out_dir>/<version>/.
+
+    The version directory holds lgb_model.pkl, scaler.pkl, lstm_model.pth (the file
+    names Models expects, so MODEL_DIR can point at it), metadata.json and the
+    checkpoint.pt used by resume=True.
+    """
+    import joblib
+    import torch
+    from sklearn.preprocessing import StandardScaler
+    from torch.utils.data import DataLoader
+    from .models import lstm_regime
+
+    threads = threads or os.cpu_count() or 1
+    torch.set_num_threads(threads)
+    torch.manual_seed(seed)
+    version = version or datetime.now(timezone.utc).strftime('v%Y%m%d-%H%M%S')
+    vdir = Path(out_dir) / version
+    ckpt_path = vdir / 'checkpoint.pt'
+    if vdir.exists() and not resume:
+        raise FileExistsError(f'{vdir} exists; pass resume=True (--resume) to continue it')
+    vdir.mkdir(parents=True, exist_ok=True)
+
+    data = build_dataset(bars, symbols, horizon=horizon)
+    # time-ordered split per symbol: the last val_frac of each history validates. Training stops
+    # horizon rows before the cut, since those rows' labels look into the validation window.
+    cuts = {s: int(len(d['X']) * (1 - val_frac)) for s, d in data.items()}
+    train_stop = {s: max(cut - horizon, 0) for s, cut in cuts.items()}
+    X_train = np.concatenate([d['X'][:train_stop[s]] for s, d in data.items()])
+    y_train = np.concatenate([d['fwd_ret'][:train_stop[s]] > 0 for s, d in data.items()]).astype(np.int64)
+    X_val = np.concatenate([d['X'][cuts[s]:] for s, d in data.items()])
+    y_val = np.concatenate([d['fwd_ret'][cuts[s]:] > 0 for s, d in data.items()]).astype(np.int64)
+
+    if resume and (vdir / 'scaler.pkl').exists() and (vdir / 'lgb_model.pkl').exists():
+        scaler = joblib.load(vdir / 'scaler.pkl')
+        classifier = joblib.load(vdir / 'lgb_model.pkl')
+    else:
+        t0 = time.perf_counter()
+        scaler = StandardScaler().fit(X_train)
+        classifier = train_classifier(scaler.transform(X_train), y_train, threads, seed)
+        joblib.dump(scaler, vdir / 'scaler.pkl')
+        joblib.dump(classifier, vdir / 'lgb_model.pkl')
+        logger.info('Classifier trained on %d rows in %.1fs', len(X_train), time.perf_counter() - t0)
+    clf_acc = float((classifier.predict(scaler.transform(X_val)) == y_val).mean()) if len(X_val) else float('nan')
+
+    # the LSTM trains on standardized windows; the scaling is folded into its weights on export
+    mean, scale = scaler.mean_.astype(np.float32), scaler.scale_.astype(np.float32)
+    matrices = [np.ascontiguousarray((d['X'] - mean) / scale, dtype=np.float32) for d in data.values()]
+    labels = [regimes(d['fwd_ret'], band) for d in data.values()]
+    train_ends = [_window_ends(0, train_stop[s], seq_len, stride) for s, d in data.items()]
+    val_ends = [_window_ends(cuts[s], len(d['X']), seq_len, 1) for s, d in data.items()]
+    train_ds = WindowDataset(matrices, labels, train_ends, seq_len)
+    val_ds = WindowDataset(matrices, labels, val_ends, seq_len)
+    if not len(train_ds):
+        raise ValueError(f'No LSTM training windows: need more than {seq_len} feature rows per symbol')
+    loader_kw = {'num_workers': workers, 'persistent_workers': workers > 0}
+    train_loader = DataLoader(train_ds, batch_size=batch_size, shuffle=True, drop_last=False,
+                              generator=torch.Generator().manual_seed(seed), **loader_kw)
+    val_loader = DataLoader(val_ds, batch_size=batch_size * 2, **loader_kw)
+
+    model = lstm_regime(len(FEATURE_COLS))
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    # inverse-frequency class weights; sideways usually dominates at short horizons
+    counts = np.bincount(np.concatenate([lab[e] for lab, e in zip(labels, train_ends)]), minlength=3)
+    weights = torch.tensor(counts.sum() / np.maximum(counts, 1) / 3, dtype=torch.float32)
+    loss_fn = torch.nn.CrossEntropyLoss(weight=weights)
+    start_epoch, best, history = 0, None, []
+    if resume and ckpt_path.exists():
+        ckpt = torch.load(ckpt_path, map_location='cpu', weights_only=False)
+        model.load_state_dict(ckpt['model'])
+        optimizer.load_state_dict(ckpt['optimizer'])
+        start_epoch, best, history = ckpt['epoch'], ckpt['best'], ckpt['history']
+        logger.info('Resuming %s from epoch %d', version, start_epoch)
+
+    for epoch in range(start_epoch, epochs):
+        t0 = time.perf_counter()
+        model.train()
+        total, n = 0.0, 0
+        for seqs, y in train_loader:
+            optimizer.zero_grad()
+            loss = loss_fn(model(seqs), y)
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+            optimizer.step()
+            total += loss.item() * len(y)
+            n += len(y)
+        val_loss, val_acc = _evaluate_lstm(model, val_loader)
+        history.append({'epoch': epoch + 1, 'train_loss': total / n, 'val_loss': val_loss, 'val_acc': val_acc,
+                        'seconds': round(time.perf_counter() - t0, 2)})
+        logger.info('Epoch %d/%d train_loss %.4f val_loss %.4f val_acc %.3f (%.1fs)', epoch + 1, epochs,
+                    total / n, val_loss, val_acc, history[-1]['seconds'])
+        if best is None or not val_loss > best['val_loss']:
+            best = {'epoch': epoch + 1, 'val_loss': val_loss, 'val_acc': val_acc,
+                    'state': {k: v.clone() for k, v in model.state_dict().items()}}
+        # checkpoint after every epoch so an interrupted run resumes where it stopped
+        tmp = ckpt_path.with_suffix('.tmp')
+        torch.save({'epoch': epoch + 1, 'model': model.state_dict(), 'optimizer': optimizer.state_dict(),
+                    'best': best, 'history': history}, tmp)
+        os.replace(tmp, ckpt_path)
+
+    export = lstm_regime(len(FEATURE_COLS))
+    export.load_state_dict(best['state'])
+    torch.save(fold_scaler(export, mean, scale).state_dict(), vdir / 'lstm_model.pth')
+
+    all_dates = np.concatenate([d['dates'] for d in data.values()])
+    metadata = {
+        'name': 'tqqq_ensemble',
+        'version': version,
+        'training_date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'feature_cols': list(FEATURE_COLS),
+        'thresholds': thresholds or {},
+        'symbols': list(symbols),
+        'data_range': [str(pd.Timestamp(int(all_dates.min()))), str(pd.Timestamp(int(all_dates.max())))],
+        'rows': {'train': int(len(X_train)), 'val': int(len(X_val)),
+                 'lstm_train_windows': len(train_ds), 'lstm_val_windows': len(val_ds)},
+        'labels': {'horizon': horizon, 'band': band, 'classifier': 'forward return > 0', 'regimes': REGIMES},
+        'classifier': {'type': type(classifier).__name__, 'val_accuracy': clf_acc},
+        'lstm': {'seq_len': seq_len, 'stride': stride, 'epochs': len(history), 'best_epoch': best['epoch'],
+                 'val_loss': best['val_loss'], 'val_accuracy': best['val_acc'],
+                 'input': 'raw FEATURE_COLS rows (scaler folded into the first layer)', 'history': history},
+        'files': {'lgb': 'lgb_model.pkl', 'scaler': 'scaler.pkl', 'lstm': 'lstm_model.pth'},
+    }
+    (vdir / 'metadata.json').write_text(json.dumps(metadata, indent=2) + '\n')
+    logger.info('Wrote %s (classifier val acc %.3f, LSTM val acc %.3f)', vdir, clf_acc, best['val_acc'])
+    return vdir
+
+
+def main(argv=None):
+    from .main import BAR_CACHE_DIR, TH_LGB, TH_LSTM, TH_VOTE
+    from .synthetic import synthetic_bars
+
+    parser = argparse.ArgumentParser(description='Train scaler, classifier and LSTM into a versioned model directory')
+    parser.add_argument('--symbols', default='QQQ', help='comma-separated signal symbols to pool')
+    parser.add_argument('--period', default='max')
+    parser.add_argument('--provider', default=None, help="DATA_PROVIDER spec, e.g. 'replay:data/'")
+    parser.add_argument('--synthetic', type=int, default=0, help='train on N synthetic bars (smoke test)')
+    parser.add_argument('--out-dir', default=os.getenv('MODEL_DIR', './models'))
+    parser.add_argument('--version', default=None, help='version directory name (default: UTC timestamp)')
+    parser.add_argument('--resume', action='store_true', help='continue --version from its checkpoint')
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=128)
+    parser.add_argument('--lr', type=float, default=1e-3)
+    parser.add_argument('--stride', type=int, default=1, help='bars between training windows')
+    parser.add_argument('--horizon', type=int, default=HORIZON)
+    parser.add_argument('--band', type=float, default=BAND)
+    parser.add_argument('--threads', type=int, default=None, help='torch / classifier threads (default: all cores)')
+    parser.add_argument('--workers', type=int, default=0, help='DataLoader worker processes')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--publish', default=None, metavar='REGISTRY', help='publish the version to this model registry')
+    parser.add_argument('--activate', action='store_true', help='with --publish, make it the current version')
+    args = parser.parse_args(argv)
+    if args.resume and not args.version:
+        parser.error('--resume needs --version')
+
+    symbols = [s.strip() for s in args.symbols.split(',') if s.strip()]
+    tickers = symbols + ['^VIX']
+    if args.synthetic:
+        bars = synthetic_bars(args.synthetic, tickers=symbols, seed=args.seed)
+    elif args.provider:
+        from .ingest import fetch_bars, provider_from_spec
+        bars = fetch_bars(tickers, period=args.period, provider=provider_from_spec(args.provider),
+                          cache_dir=BAR_CACHE_DIR)
+    else:
+        from .utils import fetch_ohlcv
+        bars = fetch_ohlcv(tickers, period=args.period, interval='1d', cache_dir=BAR_CACHE_DIR)
+
+    vdir = train(bars, symbols, args.out_dir, version=args.version, resume=args.resume, epochs=args.epochs,
+                 batch_size=args.batch_size, lr=args.lr, stride=args.stride, horizon=args.horizon,
+                 band=args.band, threads=args.threads, workers=args.workers, seed=args.seed,
+                 thresholds={'lgb': TH_LGB, 'lstm': TH_LSTM, 'vote': TH_VOTE})
+    if args.publish:
+        from .registry import ModelRegistry
+        ModelRegistry(args.publish).publish(vdir, activate=args.activate)
+    return vdir
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    main()
@@ -1,12 +1,82 @@
-from typing import Tuple, List
+import os
+import tempfile
+from typing import Tuple, List, Optional
 import pandas as pd
 import numpy as np
-import yfinance as yf
 
+from .bar_cache import BarCache, period_start, split_download
+from .instrumentation import incr, stage, timed
 
-def fetch_data(tickers: List[str], period: str = "2y", interval: str = "1d") -> pd.DataFrame:
+# yfinance is imported on the first download; see _yfinance()
+yf = None
+
+
+def _yfinance():
+    global yf
+    if yf is None:
+        import yfinance
+        # Ensure yfinance uses a safe, writable tz-cache location to avoid cache-folder errors
+        try:
+            yfinance.set_tz_cache_location(os.path.join(tempfile.gettempdir(), 'py-yfinance-cache'))
+        except Exception:
+            # non-fatal: continue without setting cache
+            pass
+        yf = yfinance
+    return yf
+
+
+def _download(tickers: List[str], **kwargs) -> pd.DataFrame:
     # Explicitly set auto_adjust to avoid FutureWarning and be explicit about which price to use
-    raw = yf.download(tickers, period=period, interval=interval, auto_adjust=False)
+    incr('fetch.download_requests')
+    with stage('fetch.download'):
+        return _yfinance().download(tickers, auto_adjust=False, progress=False, **kwargs)
+
+
+@timed('fetch')
+def fetch_ohlcv(tickers: List[str], period: str = "2y", interval: str = "1d",
+                cache_dir: Optional[str] = None) -> pd.DataFrame:
+    # All OHLCV fields for all tickers with (field, ticker) columns, as yf.download returns them.
+    # With a cache_dir, bars are served from the local BarCache and only the tail is refetched.
+    if cache_dir is None:
+        return _download(tickers, period=period, interval=interval)
+
+    cache = BarCache(cache_dir, interval=interval)
+    start = period_start(period)
+    fresh = None
+    if all(cache.covers(t, start) for t in tickers):
+        # re-request from the bar before the oldest last cached bar: a partial last bar gets
+        # finalised, and the final bar before it shows whether the provider re-adjusted history
+        since = min(cache.tail_start(t) for t in tickers).strftime('%Y-%m-%d')
+        raw = _download(tickers, start=since, interval=interval)
+        fresh = split_download(raw, tickers)
+        if any(cache.adjusted(t, fresh[t]) for t in fresh):
+            incr('fetch.readjusted')
+            fresh = None
+    replace = fresh is None
+    if replace:
+        # an unseen ticker, a longer period than cached or re-adjusted prices: one batched
+        # download of the full period replaces the cached bars
+        raw = _download(tickers, period=period, interval=interval)
+        fresh = split_download(raw, tickers)
+
+    frames = {}
+    for t in tickers:
+        if t in fresh and len(fresh[t]):
+            bars = cache.store(t, fresh[t], replace=replace, start=start)
+        else:
+            bars = cache.load(t)
+        if bars is None:
+            continue
+        frames[t] = bars if start is None else bars[bars.index >= start]
+    if not frames:
+        return raw
+    out = pd.concat(frames, axis=1, names=['Ticker', 'Price'])
+    return out.swaplevel(axis=1).sort_index(axis=1)
+
+
+def fetch_data(tickers: List[str], period: str = "2y", interval: str = "1d",
+               cache_dir: Optional[str] = None) -> pd.DataFrame:
+    raw = fetch_ohlcv(tickers, period=period, interval=interval, cache_dir=cache_dir)
     # try to select adjusted close first (old behavior); fall back to Close if missing
     try:
         df = raw['Adj Close']
@@ -24,17 +94,19 @@ def fetch_data(tickers: List[str], period: str = "2y", interval: str = "1d") ->
     return df
 
 
-def build_features(df: pd.DataFrame, vol_series: pd.Series) -> pd.DataFrame:
+@timed('build_features')
+def build_features(df: pd.DataFrame, vol_series: pd.Series, price_col: str = 'QQQ') -> pd.DataFrame:
+    # df holds the signal symbol's close in price_col plus a VIX column
     df = df.copy()
     df['volume'] = vol_series.reindex(df.index)
 
     for p in [5,10,20,50,100,200]:
-        df[f'ret_{p}'] = df['QQQ'].pct_change(p)
-        df[f'vol_{p}'] = df['QQQ'].pct_change().rolling(p).std()
+        df[f'ret_{p}'] = df[price_col].pct_change(p)
+        df[f'vol_{p}'] = df[price_col].pct_change().rolling(p).std()
     # 1-day return used by the LSTM/feature set
-    df['ret_1'] = df['QQQ'].pct_change(1)
-    df['rsi'] = 100 - 100/(1 + (df['QQQ'].diff(1).clip(lower=0).rolling(14).mean() / 
-                              abs(df['QQQ'].diff(1)).rolling(14).mean()))
+    df['ret_1'] = df[price_col].pct_change(1)
+    df['rsi'] = 100 - 100/(1 + (df[price_col].diff(1).clip(lower=0).rolling(14).mean() / 
+                              abs(df[price_col].diff(1)).rolling(14).mean()))
     df['month'] = df.index.month
     df['dow'] = df.index.dayofweek
     df = df.dropna()
@@ -46,3 +118,13 @@ def prepare_lstm_sequence(df: pd.DataFrame, feature_cols: List[str], seq_len: in
         raise ValueError(f'Need at least {seq_len} rows for LSTM sequence, got {len(df)}')
     seq = df[feature_cols].tail(seq_len).values
     return seq
+
+
+def lstm_windows(df: pd.DataFrame, feature_cols: List[str], seq_len: int = 252) -> np.ndarray:
+    # Every seq_len window of the feature matrix as a read-only strided view with shape
+    # (n_windows, seq_len, n_features). Only the float32 feature matrix itself is allocated;
+    # window i covers rows i .. i+seq_len-1 and ends at row i+seq_len-1.
+    if len(df) < seq_len:
+        raise ValueError(f'Need at least {seq_len} rows for LSTM sequence, got {len(df)}')
+    feats = np.ascontiguousarray(df[feature_cols].to_numpy(dtype=np.float32))
+    return np.lib.stride_tricks.sliding_window_view(feats, seq_len, axis=0).transpose(0, 2, 1)
@@ -0,0 +1,92 @@
+"""
+Export optimized inference artifacts next to the original models.
+It creates (in MODEL_DIR, default tqqq_agent/models):
+ - lgb_model.npz       flattened tree ensemble, evaluated with numpy only (app/runtime.FlatForest)
+ - scaler.npz          StandardScaler mean/scale vectors (app/runtime.FlatScaler)
+ - lstm_model.ts       TorchScript trace of the LSTMRegime model
+ - export_golden.npz   golden inputs and the original models' outputs; Models checks the
+                       compiled artifacts against it on every MODEL_BACKEND=compiled load
+
+Usage:
+    python tqqq_agent/export_models.py [--model-dir DIR]
+
+Then run the agent with MODEL_BACKEND=compiled.
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.models import Models  # noqa: E402
+from app.runtime import flatten_classifier, flatten_scaler  # noqa: E402
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--model-dir', default=os.getenv('MODEL_DIR', str(Path(__file__).resolve().parent / 'models')))
+parser.add_argument('--lgb-file', default=os.getenv('LGB_MODEL_FILE', 'lgb_model.pkl'))
+parser.add_argument('--lstm-file', default=os.getenv('LSTM_MODEL_FILE', 'lstm_model.pth'))
+parser.add_argument('--scaler-file', default=os.getenv('SCALER_FILE', 'scaler.pkl'))
+parser.add_argument('--seq-len', type=int, default=252)
+args = parser.parse_args()
+
+import torch  # noqa: E402
+
+models = Models(args.model_dir, args.lgb_file, args.lstm_file, args.scaler_file, backend='eager')
+models.load()
+if not hasattr(models.lgb_model, 'predict_proba') or type(models.lgb_model).__name__ == 'MockLGB':
+    raise SystemExit('Original classifier failed to load; nothing to export')
+if not isinstance(models.lstm_model, torch.nn.Module):
+    raise SystemExit('Original LSTM failed to load; nothing to export')
+paths = models.compiled_paths
+print('Model dir:', args.model_dir)
+
+# Classifier and scaler -> flat numpy arrays
+flat = flatten_classifier(models.lgb_model)
+flat.save(paths['lgb'])
+print(f'Saved {paths["lgb"].name} ({len(flat.roots)} trees, {len(flat.feature)} nodes, depth {flat.depth})')
+flatten_scaler(models.scaler).save(paths['scaler'])
+print(f'Saved {paths["scaler"].name}')
+
+# LSTM -> TorchScript
+example = torch.zeros(1, args.seq_len, models.lstm_model.lstm.input_size)
+with warnings.catch_warnings():
+    warnings.simplefilter('ignore')
+    traced = torch.jit.trace(models.lstm_model.eval(), example)
+traced.save(str(paths['lstm']))
+print(f'Saved {paths["lstm"].name}')
+
+# Golden inputs: outputs of the original models that every compiled load is checked against
+rng = np.random.RandomState(0)
+n_features = int(models.lstm_model.lstm.input_size)
+X = rng.normal(size=(256, n_features))
+seqs = rng.normal(size=(8, args.seq_len, n_features)).astype(np.float32)
+lgb_prob = np.asarray(models.predict_lgb_prob(models.scaler.transform(X)), dtype=np.float64)
+lstm_probs = models.predict_lstm_windows(seqs)
+np.savez(paths['golden'], X=X, seqs=seqs, lgb_prob=lgb_prob, lstm_probs=lstm_probs)
+print(f'Saved {paths["golden"].name}')
+
+compiled = Models(args.model_dir, args.lgb_file, args.lstm_file, args.scaler_file, backend='compiled')
+compiled.load()
+lgb_err, lstm_err = compiled.check_parity(paths['golden'])
+print(f'Parity OK: classifier max err {lgb_err:.2e}, LSTM max err {lstm_err:.2e}')
+
+
+def _time(fn, n=200):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e3
+
+
+row = X[:1]
+seq = torch.from_numpy(seqs[:1])
+print('Single-row latency (ms): classifier eager %.3f compiled %.3f; LSTM eager %.3f compiled %.3f' % (
+    _time(lambda: models.predict_lgb_prob(models.scaler.transform(row))),
+    _time(lambda: compiled.predict_lgb_prob(compiled.scaler.transform(row))),
+    _time(lambda: models.predict_lstm_probs(seq), 50),
+    _time(lambda: compiled.predict_lstm_probs(seq), 50)))
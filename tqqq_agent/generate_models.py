@@ -10,6 +10,7 @@ Usage:
     python tqqq_agent/generate_models.py
 
 This script trains tiny models on synthetic data and saves them.
+For real models trained on market data use app/train.py (see README "Training").
 """
 from pathlib import Path
 import os
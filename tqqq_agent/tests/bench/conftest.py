@@ -0,0 +1,100 @@
+import json
+import os
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Benchmarks run only with TQQQ_BENCH=1, e.g.
+#   pip install -r requirements-dev.txt
+#   TQQQ_BENCH=1 python -m pytest tests/bench -q
+# Each case is timed with pytest-benchmark and run once more under tracemalloc for peak
+# memory. Times are gated as ratios to a fixed reference workload timed in the same run,
+# so baseline.json carries across hosts; peak memory is gated in bytes. Both fail past
+# the tolerances below. TQQQ_BENCH_UPDATE=1 rewrites baseline.json instead of gating.
+
+BASELINE = Path(__file__).with_name('baseline.json')
+TIME_TOLERANCE = float(os.getenv('TQQQ_BENCH_TIME_TOLERANCE', 0.5))
+MEM_TOLERANCE = float(os.getenv('TQQQ_BENCH_MEM_TOLERANCE', 0.25))
+UPDATE = os.getenv('TQQQ_BENCH_UPDATE', '').lower() in ('1', 'true', 'yes')
+
+ENABLED = os.getenv('TQQQ_BENCH', '').lower() in ('1', 'true', 'yes')
+
+_results = {}
+
+
+def pytest_configure(config):
+    if ENABLED and not config.pluginmanager.hasplugin('benchmark'):
+        raise pytest.UsageError('TQQQ_BENCH=1 needs pytest-benchmark: pip install -r requirements-dev.txt')
+
+
+def pytest_collection_modifyitems(config, items):
+    if ENABLED:
+        return
+    skip = pytest.mark.skip(reason='benchmarks run with TQQQ_BENCH=1')
+    for item in items:
+        if 'bench' in item.nodeid.split('::')[0]:
+            item.add_marker(skip)
+
+
+def _baseline():
+    if BASELINE.exists():
+        return json.loads(BASELINE.read_text())
+    return {}
+
+
+def _reference_work():
+    # fixed host-speed yardstick: vectorized numpy plus an interpreter-bound loop
+    a = np.random.default_rng(0).random((256, 256))
+    for _ in range(8):
+        a = np.sort(a @ a.T / 256, axis=1)
+    total = 0.0
+    for x in a[:64].ravel():
+        total += x * x
+    return total
+
+
+@pytest.fixture(scope='session')
+def reference_s():
+    # median of the reference workload, timed in this run
+    _reference_work()
+    times = []
+    for _ in range(15):
+        t0 = time.perf_counter()
+        _reference_work()
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times))
+
+
+@pytest.fixture
+def gate(benchmark, request, reference_s):
+    def run(fn, rounds: int = 5):
+        result = benchmark.pedantic(fn, rounds=rounds, iterations=1, warmup_rounds=1)
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        name = request.node.name
+        median = benchmark.stats.stats.median
+        ratio = median / reference_s
+        _results[name] = {'ratio': round(ratio, 4), 'peak_bytes': int(peak)}
+        base = _baseline().get(name)
+        if base and not UPDATE:
+            assert ratio <= base['ratio'] * (1 + TIME_TOLERANCE), (
+                f'{name}: median {median * 1e3:.2f} ms is {ratio:.2f}x the reference workload, '
+                f'regressed past baseline {base["ratio"]:.2f}x (+{TIME_TOLERANCE:.0%})')
+            assert peak <= base['peak_bytes'] * (1 + MEM_TOLERANCE) + 64 * 1024, (
+                f'{name}: peak memory {peak / 1e6:.1f} MB regressed past baseline '
+                f'{base["peak_bytes"] / 1e6:.1f} MB (+{MEM_TOLERANCE:.0%})')
+        return result
+    return run
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if UPDATE and _results:
+        merged = dict(_baseline(), **_results)
+        BASELINE.write_text(json.dumps(merged, indent=2, sort_keys=True) + '\n')
@@ -0,0 +1,137 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tqqq_agent.app import main as main_mod
+from tqqq_agent.app import utils
+from tqqq_agent.app.feature_store import features_from_bars
+from tqqq_agent.app.features import FEATURE_COLS
+from tqqq_agent.app.intraday import IntradaySession, replay
+from tqqq_agent.app.models import Models
+from tqqq_agent.app.synthetic import MINUTES_PER_DAY, TRADING_DAYS, synthetic_bars
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'models')
+FILES = ('lgb_model.pkl', 'lstm_model.pth', 'scaler.pkl')
+
+# daily histories plus one year of minute bars treated as a single long series
+SIZES = {
+    '2y': (2 * TRADING_DAYS, 'B'),
+    '10y': (10 * TRADING_DAYS, 'B'),
+    '30y': (30 * TRADING_DAYS, 'B'),
+    'minute-1y': (TRADING_DAYS * MINUTES_PER_DAY, 'min'),
+}
+DAILY = ['2y', '10y', '30y']
+
+
+def _inputs(size):
+    n, freq = SIZES[size]
+    bars = synthetic_bars(n, seed=42, freq=freq)
+    df = bars['Adj Close'][['QQQ', '^VIX']].copy()
+    df.columns = ['QQQ', 'VIX']
+    return bars, df, bars['Volume']['QQQ']
+
+
+@pytest.fixture(scope='module')
+def models():
+    m = Models(MODEL_DIR, *FILES)
+    m.load()
+    return m
+
+
+@pytest.fixture(scope='module')
+def features():
+    cache = {}
+
+    def get(size):
+        if size not in cache:
+            _, df, vol = _inputs(size)
+            cache[size] = utils.build_features(df, vol)
+        return cache[size]
+    return get
+
+
+@pytest.mark.parametrize('size', list(SIZES))
+def test_build_features(gate, size):
+    _, df, vol = _inputs(size)
+    gate(lambda: utils.build_features(df, vol), rounds=3 if size.startswith('minute') else 5)
+
+
+@pytest.mark.parametrize('size', list(SIZES))
+def test_features_from_bars(gate, size):
+    bars, _, _ = _inputs(size)
+    gate(lambda: features_from_bars(bars), rounds=3 if size.startswith('minute') else 5)
+
+
+@pytest.mark.parametrize('size', list(SIZES))
+def test_prepare_lstm_sequence(gate, features, size):
+    df = features(size)
+    gate(lambda: utils.prepare_lstm_sequence(df, FEATURE_COLS, seq_len=252))
+
+
+@pytest.mark.parametrize('size', list(SIZES))
+def test_scaler_transform(gate, models, features, size):
+    X = features(size)[FEATURE_COLS].to_numpy()
+    gate(lambda: models.scaler.transform(X))
+
+
+def test_predict_lgb_prob_single_row(gate, models, features):
+    X = models.scaler.transform(features('2y')[FEATURE_COLS].iloc[-1:].to_numpy())
+    gate(lambda: models.predict_lgb_prob(X), rounds=20)
+
+
+@pytest.mark.parametrize('size', DAILY)
+def test_predict_lgb_prob_history(gate, models, features, size):
+    X = models.scaler.transform(features(size)[FEATURE_COLS].to_numpy())
+    gate(lambda: models.predict_lgb_prob(X))
+
+
+def test_predict_lstm_probs_single_window(gate, models, features):
+    import torch
+    seq = torch.tensor(utils.prepare_lstm_sequence(features('2y'), FEATURE_COLS), dtype=torch.float32)[None]
+    gate(lambda: models.predict_lstm_probs(seq), rounds=20)
+
+
+@pytest.mark.parametrize('size', DAILY)
+def test_predict_lstm_windows_history(gate, models, features, size):
+    windows = utils.lstm_windows(features(size), FEATURE_COLS)
+    gate(lambda: models.predict_lstm_windows(windows), rounds=3)
+
+
+@pytest.mark.parametrize('size', list(SIZES))
+def test_main_end_to_end(gate, monkeypatch, size):
+    bars, _, _ = _inputs(size)
+    monkeypatch.setattr(main_mod, 'load_bars', lambda: bars)
+    monkeypatch.setattr(main_mod, 'MODEL_DIR', MODEL_DIR)
+    monkeypatch.setattr(main_mod, 'PREDICTION_CACHE_DIR', None)
+    monkeypatch.setattr(main_mod, 'EVENT_LOG_URL', None)
+    monkeypatch.setattr(main_mod, 'USE_MOCK_DATA', False)
+    logging.getLogger('tqqq_agent').setLevel(logging.WARNING)
+    try:
+        gate(lambda: main_mod.main([]))
+    finally:
+        logging.getLogger('tqqq_agent').setLevel(logging.INFO)
+
+
+def test_main_mock_mode(gate, monkeypatch):
+    monkeypatch.setattr(main_mod, 'MODEL_DIR', MODEL_DIR)
+    monkeypatch.setattr(main_mod, 'PREDICTION_CACHE_DIR', None)
+    monkeypatch.setattr(main_mod, 'EVENT_LOG_URL', None)
+    monkeypatch.setattr(main_mod, 'USE_MOCK_DATA', True)
+    logging.getLogger('tqqq_agent').setLevel(logging.WARNING)
+    try:
+        gate(lambda: main_mod.main([]), rounds=3)
+    finally:
+        logging.getLogger('tqqq_agent').setLevel(logging.INFO)
+
+
+def test_intraday_session_day(gate, models):
+    # one session of minute bars, re-evaluating the vote on every bar (per-bar cost = median / 390)
+    bars, _, _ = _inputs('2y')
+    session = IntradaySession(models, 0.6, 0.65, 2).warm_up(bars)
+    end = bars.index[-1] + pd.Timedelta(days=1, hours=15, minutes=59)
+    minutes = synthetic_bars(MINUTES_PER_DAY, seed=7, freq='min', end=end,
+                             start_price=float(bars['Adj Close']['QQQ'].iloc[-1]))
+    gate(lambda: replay(session, minutes))
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# make `tqqq_agent.app` importable when pytest is run from inside tqqq_agent/
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pandas as pd
+import torch
+
+from tqqq_agent.app.backtest import run_backtest
+from tqqq_agent.app.features import FEATURE_COLS
+from tqqq_agent.app.models import Models
+from tqqq_agent.app.utils import build_features, prepare_lstm_sequence
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', 'models')
+
+
+def _features(n=700, seed=1):
+    rng = np.random.default_rng(seed)
+    idx = pd.bdate_range('2015-01-01', periods=n)
+    df = pd.DataFrame({'QQQ': 100 * np.cumprod(1 + rng.normal(0.0005, 0.01, n)),
+                       'VIX': 20 + rng.normal(0, 1, n)}, index=idx)
+    vol = pd.Series(np.abs(rng.normal(1e7, 2e6, n)), index=idx)
+    return build_features(df, vol)
+
+
+def _models():
+    models = Models(MODEL_DIR, 'lgb_model.pkl', 'lstm_model.pth', 'scaler.pkl')
+    models.load()
+    return models
+
+
+def test_backtest_matches_single_day_signal():
+    df = _features()
+    models = _models()
+    result = run_backtest(df, models, 0.6, 0.65, 2, batch_size=64)
+    probs = result['probs']
+    assert len(probs) == len(df) - 252
+    assert probs.index[0] == df.index[251]
+
+    # the last replayed day must agree with what main() computes for that day
+    day = probs.index[-1]
+    hist = df.loc[:day]
+    seq = torch.tensor(prepare_lstm_sequence(hist, FEATURE_COLS), dtype=torch.float32).unsqueeze(0)
+    lstm_bull = models.predict_lstm_probs(seq)[0][0]
+    lgb = models.predict_lgb_prob(models.scaler.transform(hist[FEATURE_COLS].iloc[-1:].values))[0][1]
+    assert np.isclose(probs.at[day, 'lstm_bull'], lstm_bull, atol=1e-5)
+    assert np.isclose(probs.at[day, 'lgb_prob'], lgb)
+    assert np.isclose(probs.at[day, 'sma200'], hist['QQQ'].iloc[-200:].mean())
+
+
+def test_backtest_equity_and_turnover():
+    df = _features()
+    result = run_backtest(df, _models(), 0.0, 0.0, 0)
+    # threshold 0 keeps the strategy long every day: one entry, leveraged buy and hold
+    assert result['turnover'] == 1.0
+    expected = np.cumprod(1 + result['probs']['next_ret'].to_numpy())
+    np.testing.assert_allclose(result['equity'].to_numpy(), expected)
+    assert set(result['hit_rate']) == {'sma', 'lgb', 'lstm', 'vote'}
+
+
+def test_lstm_windows_are_views_and_batching_is_invariant():
+    from tqqq_agent.app.utils import lstm_windows
+    df = _features(500)
+    windows = lstm_windows(df, FEATURE_COLS, seq_len=252)
+    assert windows.shape == (len(df) - 251, 252, len(FEATURE_COLS))
+    assert not windows.flags.owndata
+    np.testing.assert_array_equal(windows[-1], prepare_lstm_sequence(df, FEATURE_COLS).astype(np.float32))
+
+    models = _models()
+    np.testing.assert_allclose(models.predict_lstm_windows(windows, batch_size=7),
+                               models.predict_lstm_windows(windows, batch_size=1000), atol=1e-5)
@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from tqqq_agent.app import utils
+
+
+def _raw(dates, tickers, start_value=100.0):
+    fields = ['Adj Close', 'Close', 'High', 'Low', 'Open', 'Volume']
+    cols = pd.MultiIndex.from_product([fields, tickers], names=['Price', 'Ticker'])
+    values = start_value + np.arange(len(dates) * len(cols), dtype=float).reshape(len(dates), len(cols))
+    return pd.DataFrame(values, index=pd.DatetimeIndex(dates), columns=cols)
+
+
+def _source(days, tickers, calls):
+    # fake yf.download over a fixed history, honouring period= and start=
+    history = _raw(days, tickers)
+
+    def download(tickers, **kwargs):
+        calls.append(kwargs)
+        if 'start' in kwargs:
+            return history[history.index >= kwargs['start']]
+        start = utils.period_start(kwargs['period'])
+        return history if start is None else history[history.index >= start]
+    return history, download
+
+
+def test_fetch_ohlcv_downloads_once_then_only_the_tail(tmp_path, monkeypatch):
+    calls = []
+    days = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=30)
+    history, download = _source(days[:-1], ['QQQ', '^VIX'], calls)
+    monkeypatch.setattr(utils, 'yf', SimpleNamespace(download=download))
+
+    first = utils.fetch_ohlcv(['QQQ', '^VIX'], period='1y', cache_dir=str(tmp_path))
+    assert len(calls) == 1 and calls[0]['period'] == '1y'
+    assert len(first) == 29
+    assert set(first.columns.get_level_values(0)) >= {'Adj Close', 'Volume'}
+
+    # a new bar, and a revised (partial) last bar
+    tail = _raw(days[-2:], ['QQQ', '^VIX'], start_value=1000.0)
+    _, download = _source(days, ['QQQ', '^VIX'], calls)
+    monkeypatch.setattr(utils, 'yf', SimpleNamespace(
+        download=lambda tickers, **kw: pd.concat([download(tickers, **kw).iloc[:-2], tail])))
+    second = utils.fetch_ohlcv(['QQQ', '^VIX'], period='1y', cache_dir=str(tmp_path))
+    assert len(calls) == 2
+    # incremental request starts at the final bar before the last cached one, not a fresh period
+    assert calls[1]['start'] == days[-3].strftime('%Y-%m-%d')
+    assert len(second) == 30
+    # overlapping bar is replaced by the newer download
+    assert second['Adj Close']['QQQ'].iloc[-2] >= 1000.0
+    pd.testing.assert_frame_equal(second.iloc[:-2], first.iloc[:-1])
+
+
+def test_longer_period_or_readjusted_history_refetches(tmp_path, monkeypatch):
+    calls = []
+    days = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=600)
+    history, download = _source(days, ['QQQ'], calls)
+    monkeypatch.setattr(utils, 'yf', SimpleNamespace(download=download))
+
+    short = utils.fetch_ohlcv(['QQQ'], period='1y', cache_dir=str(tmp_path))
+    full = utils.fetch_ohlcv(['QQQ'], period='max', cache_dir=str(tmp_path))
+    assert [('period' in c, c.get('period')) for c in calls] == [(True, '1y'), (True, 'max')]
+    assert len(full) == 600 and len(short) < 300
+    # the cached full history also serves any shorter period from the tail
+    assert len(utils.fetch_ohlcv(['QQQ'], period='1y', cache_dir=str(tmp_path))) == len(short)
+    assert 'start' in calls[-1]
+
+    # a dividend re-adjusts every earlier Adj Close: the whole period is downloaded again
+    history[('Adj Close', 'QQQ')] *= 0.99
+    out = utils.fetch_ohlcv(['QQQ'], period='max', cache_dir=str(tmp_path))
+    assert 'start' in calls[-2] and calls[-1].get('period') == 'max'
+    np.testing.assert_allclose(out['Adj Close']['QQQ'].to_numpy(), full['Adj Close']['QQQ'].to_numpy() * 0.99)
+
+
+def test_fetch_data_selects_adjusted_close(tmp_path, monkeypatch):
+    days = pd.bdate_range(end='2024-06-28', periods=5)
+    monkeypatch.setattr(utils, 'yf', SimpleNamespace(download=lambda tickers, **kw: _raw(days, tickers)))
+    df = utils.fetch_data(['QQQ', '^VIX'], period='max', cache_dir=str(tmp_path))
+    assert list(df.columns) == ['QQQ', '^VIX']
+    assert len(df) == 5
@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+import pandas as pd
+import torch
+
+from tqqq_agent.app.batch import parse_universe, signals_from_bars
+from tqqq_agent.app.features import FEATURE_COLS
+from tqqq_agent.app.models import Models
+from tqqq_agent.app.utils import build_features
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', 'models')
+
+
+def _bars(symbols, n=600, seed=3):
+    rng = np.random.default_rng(seed)
+    idx = pd.bdate_range('2021-01-01', periods=n)
+    close = {s: 100 * np.cumprod(1 + rng.normal(0.0005, 0.01, n)) for s in symbols}
+    close['^VIX'] = 20 + rng.normal(0, 1, n)
+    volume = {s: np.abs(rng.normal(1e7, 2e6, n)) for s in close}
+    return pd.concat({'Adj Close': pd.DataFrame(close, index=idx),
+                      'Volume': pd.DataFrame(volume, index=idx)}, axis=1)
+
+
+def test_parse_universe():
+    assert parse_universe('QQQ:TQQQ, SPY:UPRO,IWM') == [('QQQ', 'TQQQ'), ('SPY', 'UPRO'), ('IWM', 'IWM')]
+
+
+def test_batched_signals_match_single_symbol_path():
+    models = Models(MODEL_DIR, 'lgb_model.pkl', 'lstm_model.pth', 'scaler.pkl')
+    models.load()
+    bars = _bars(['QQQ', 'SPY', 'SOXX'])
+    universe = parse_universe('QQQ:TQQQ,SPY:UPRO,SOXX:SOXL')
+    results = signals_from_bars(bars, universe, models, 0.6, 0.65, 2, workers=2)
+    assert [r['symbol'] for r in results] == ['QQQ', 'SPY', 'SOXX']
+
+    for r in results:
+        df = pd.DataFrame({r['symbol']: bars['Adj Close'][r['symbol']], 'VIX': bars['Adj Close']['^VIX']})
+        df = build_features(df, bars['Volume'][r['symbol']], price_col=r['symbol'])
+        lgb = models.predict_lgb_prob(models.scaler.transform(df[FEATURE_COLS].iloc[-1:].values))[0][1]
+        seq = torch.tensor(df[FEATURE_COLS].tail(252).values, dtype=torch.float32).unsqueeze(0)
+        assert np.isclose(r['lgb_prob'], lgb)
+        assert np.isclose(r['lstm_bull'], models.predict_lstm_probs(seq)[0][0], atol=1e-5)
@@ -0,0 +1,62 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from tqqq_agent.app import event_log
+from tqqq_agent.app.event_log import EventLog, SQLiteStore, export, read_events, read_export, store_from_url
+from tqqq_agent.app.instrumentation import METRICS
+
+
+def test_batched_append_only_log(tmp_path, monkeypatch):
+    batches = []
+    real_write = event_log.write_batch
+    monkeypatch.setattr(event_log, 'write_batch', lambda s, c, rows: batches.append(len(rows)) or real_write(s, c, rows))
+    store = store_from_url(f'sqlite:///{tmp_path}/events.sqlite')
+    log = EventLog(store, run_id='r1', batch_size=100)
+    for i in range(1000):
+        log.log('decision', {'i': i, 'go_long': i % 2 == 0}, 'QQQ', '2025-01-02')
+    log.close()
+
+    events = read_events(store, kind='decision')
+    assert [e['payload']['i'] for e in events] == list(range(1000))
+    assert events[0]['run_id'] == 'r1' and events[0]['bar_date'] == '2025-01-02'
+    assert sum(batches) == 1000 and max(batches) == 100 and len(batches) <= 20
+    conn = store.connect()
+    with pytest.raises(sqlite3.DatabaseError, match='append-only'):
+        conn.execute('DELETE FROM events')
+    with pytest.raises(sqlite3.DatabaseError, match='append-only'):
+        conn.execute("UPDATE events SET kind = 'x'")
+    conn.close()
+
+
+def test_log_never_blocks_on_a_stalled_store(tmp_path):
+    release = threading.Event()
+
+    class Stalled(SQLiteStore):
+        def connect(self):
+            release.wait(5)
+            return super().connect()
+
+    METRICS.reset()
+    log = EventLog(Stalled(tmp_path / 'events.sqlite'), queue_size=10, batch_size=5)
+    t0 = time.perf_counter()
+    accepted = [log.log('features', {'i': i}) for i in range(50)]
+    assert time.perf_counter() - t0 < 0.5
+    assert 10 <= sum(accepted) < 50
+    assert METRICS.snapshot()['counters']['events.dropped'] == 50 - sum(accepted)
+    release.set()
+    log.close()
+    assert len(read_events(log.store)) == sum(accepted)
+
+
+def test_columnar_export(tmp_path):
+    store = SQLiteStore(tmp_path / 'events.sqlite')
+    log = EventLog(store)
+    log.log('prediction', {'lgb_prob': 0.7, 'lstm_probs': [0.5, 0.3, 0.2]}, 'QQQ')
+    log.log('decision', {'go_long': True}, 'QQQ')
+    log.close()
+    frame = read_export(export(store, tmp_path / 'out' / 'predictions.npz', kind='prediction'))
+    assert list(frame['kind']) == ['prediction']
+    assert frame['payload.lgb_prob'][0] == 0.7 and frame['payload.lstm_probs'][0] == '[0.5, 0.3, 0.2]'
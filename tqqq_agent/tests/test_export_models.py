@@ -0,0 +1,76 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from tqqq_agent.app.models import Models, StreamingLSTM
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+FILES = ('lgb_model.pkl', 'lstm_model.pth', 'scaler.pkl')
+
+
+@pytest.fixture(scope='module')
+def exported(tmp_path_factory):
+    model_dir = tmp_path_factory.mktemp('models')
+    for name in FILES:
+        shutil.copy(os.path.join(ROOT, 'models', name), model_dir / name)
+    subprocess.run([sys.executable, os.path.join(ROOT, 'export_models.py'), '--model-dir', str(model_dir)],
+                   check=True, capture_output=True)
+    return model_dir
+
+
+def test_compiled_backend_matches_eager(exported):
+    eager = Models(str(exported), *FILES, backend='eager')
+    eager.load()
+    compiled = Models(str(exported), *FILES, backend='compiled')
+    compiled.load()
+    assert type(compiled.lgb_model).__name__ == 'FlatForest'
+
+    rng = np.random.default_rng(7)
+    X = rng.normal(size=(500, 10)) * 3
+    np.testing.assert_allclose(compiled.predict_lgb_prob(compiled.scaler.transform(X)),
+                               eager.predict_lgb_prob(eager.scaler.transform(X)), atol=1e-12)
+    seqs = rng.normal(size=(4, 252, 10)).astype(np.float32)
+    np.testing.assert_allclose(compiled.predict_lstm_windows(seqs), eager.predict_lstm_windows(seqs), atol=1e-6)
+
+    stream = StreamingLSTM(compiled, seq_len=252)
+    assert stream.incremental
+    stream.warm_up(seqs[0])
+    stream.step(seqs[1][0])
+
+
+def test_compiled_load_rejects_parity_mismatch(exported, tmp_path):
+    for name in os.listdir(exported):
+        shutil.copy(exported / name, tmp_path / name)
+    with np.load(tmp_path / 'export_golden.npz') as g:
+        golden = dict(g)
+    golden['lstm_probs'] = golden['lstm_probs'][:, ::-1].copy()
+    np.savez(tmp_path / 'export_golden.npz', **golden)
+    with pytest.raises(ValueError, match='parity'):
+        Models(str(tmp_path), *FILES, backend='compiled').load()
+
+
+@pytest.mark.parametrize('zero_as_missing', [True, False])
+def test_flattened_lightgbm_matches_on_zero_and_nan_inputs(zero_as_missing):
+    lgb = pytest.importorskip('lightgbm')
+    from tqqq_agent.app.runtime import flatten_classifier
+
+    rng = np.random.default_rng(11)
+    X = rng.normal(size=(2000, 10))
+    # exact zeros (e.g. ret_1 on a flat day) and gaps in the training data
+    X[rng.random(X.shape) < 0.15] = 0.0
+    X[rng.random(X.shape) < 0.05] = np.nan
+    y = ((np.nan_to_num(X[:, 9]) > 0) ^ (rng.random(2000) < 0.2)).astype(int)
+    model = lgb.LGBMClassifier(n_estimators=30, num_leaves=8, zero_as_missing=zero_as_missing, verbose=-1)
+    model.fit(X, y)
+
+    flat = flatten_classifier(model)
+    if zero_as_missing:
+        assert flat.zero_missing.any()
+    test = rng.normal(size=(500, 10))
+    test[rng.random(test.shape) < 0.3] = 0.0
+    test[rng.random(test.shape) < 0.1] = np.nan
+    np.testing.assert_allclose(flat.predict_proba(test), model.predict_proba(test), atol=1e-12)
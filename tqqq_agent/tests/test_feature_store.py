@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from tqqq_agent.app.feature_store import FeatureStore, features_from_bars
+from tqqq_agent.app.features import FEATURE_COLS
+from tqqq_agent.app.synthetic import synthetic_bars
+from tqqq_agent.app.utils import build_features
+
+
+def _reference(bars):
+    df = bars['Adj Close'][['QQQ', '^VIX']].copy()
+    df.columns = ['QQQ', 'VIX']
+    return build_features(df, bars['Volume']['QQQ'])
+
+
+def test_features_match_build_features():
+    bars = synthetic_bars(600, seed=3)
+    # a missing VIX print must drop the same row build_features drops
+    bars.loc[bars.index[450], ('Adj Close', '^VIX')] = np.nan
+    ref = _reference(bars)
+    dates, X = features_from_bars(bars)
+
+    assert X.dtype == np.float32 and X.flags['C_CONTIGUOUS']
+    assert X.shape == (len(ref), len(FEATURE_COLS))
+    assert (dates == ref.index.values.astype('datetime64[ns]').view('int64')).all()
+    np.testing.assert_allclose(X, ref[FEATURE_COLS].to_numpy(), rtol=1e-6, atol=1e-6)
+
+
+def test_missing_close_drops_the_same_rows_as_build_features():
+    bars = synthetic_bars(800, seed=3)
+    bars.loc[bars.index[450], ('Adj Close', 'QQQ')] = np.nan
+    ref = _reference(bars)
+    dates, X = features_from_bars(bars)
+    assert (dates == ref.index.values.astype('datetime64[ns]').view('int64')).all()
+    np.testing.assert_allclose(X, ref[FEATURE_COLS].to_numpy(), rtol=1e-6, atol=1e-6)
+
+
+def test_build_only_computes_new_rows(tmp_path, monkeypatch):
+    from tqqq_agent.app import feature_store
+    bars = synthetic_bars(700, seed=6)
+    store = FeatureStore(tmp_path)
+    store.build('QQQ', bars.iloc[:-5])
+
+    sizes = []
+    real = feature_store.compute_features
+    monkeypatch.setattr(feature_store, 'compute_features',
+                        lambda index, *a, **kw: sizes.append(len(index)) or real(index, *a, **kw))
+    # the last stored bar was partial; the next run sees its final values plus new bars
+    bars.loc[bars.index[-6], ('Adj Close', 'QQQ')] *= 1.01
+    dates, X = store.build('QQQ', bars)
+    assert sizes == [200 + 7]
+    ref_dates, ref_X = features_from_bars(bars)
+    assert (dates == ref_dates).all()
+    np.testing.assert_array_equal(X, ref_X)
+
+    # re-adjusted history no longer matches the stored rows: everything is rebuilt
+    bars.loc[:bars.index[-20], ('Adj Close', 'QQQ')] *= 0.98
+    dates, X = store.build('QQQ', bars)
+    assert sizes[-1] == len(bars)
+    np.testing.assert_array_equal(X, features_from_bars(bars)[1])
+
+
+def test_store_roundtrip_is_memory_mapped(tmp_path):
+    bars = synthetic_bars(500, seed=4)
+    store = FeatureStore(tmp_path)
+    assert store.load('QQQ') is None
+
+    dates, X = store.build('QQQ', bars, models={'backend': 'eager'})
+    assert isinstance(X, np.memmap) and X.dtype == np.float32
+    np.testing.assert_array_equal(X, features_from_bars(bars)[1])
+    assert store.meta('QQQ')['feature_cols'] == FEATURE_COLS
+    assert store.meta('QQQ')['models'] == {'backend': 'eager'}
+
+    torch = pytest.importorskip('torch')
+    window = X[None, -252:]
+    assert np.shares_memory(torch.from_numpy(np.asarray(window)).numpy(), X)
+
+
+def test_contract_mismatch_is_a_miss(tmp_path):
+    dates, X = features_from_bars(synthetic_bars(500, seed=5))
+    FeatureStore(tmp_path).store('QQQ', dates, X)
+    assert FeatureStore(tmp_path).load('QQQ') is not None
+    assert FeatureStore(tmp_path, feature_cols=FEATURE_COLS[::-1]).load('QQQ') is None
+    with pytest.raises(ValueError):
+        FeatureStore(tmp_path).store('QQQ', dates, X[:, :3])
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from tqqq_agent.app.features import FEATURE_COLS, FeatureEngine
+from tqqq_agent.app.utils import build_features
+
+
+def _history(n=600, seed=0):
+    rng = np.random.default_rng(seed)
+    idx = pd.bdate_range('2020-01-01', periods=n)
+    close = 100 * np.cumprod(1 + rng.normal(0.0005, 0.01, n))
+    df = pd.DataFrame({'QQQ': close, 'VIX': 20 + rng.normal(0, 1, n)}, index=idx)
+    vol = pd.Series(np.abs(rng.normal(1e7, 2e6, n)), index=idx)
+    return df, vol
+
+
+def test_engine_matches_build_features():
+    df, vol = _history()
+    expected = build_features(df, vol)
+
+    engine = FeatureEngine(resum_every=97)
+    rows = {}
+    for date in df.index:
+        row = engine.update(date, df.at[date, 'QQQ'], df.at[date, 'VIX'], vol[date])
+        if row is not None:
+            rows[date] = row
+    got = pd.DataFrame.from_dict(rows, orient='index')
+
+    assert list(got.index) == list(expected.index)
+    np.testing.assert_allclose(got[expected.columns].to_numpy(dtype=float),
+                               expected.to_numpy(dtype=float), rtol=1e-9, atol=1e-12)
+
+
+def test_engine_skips_windows_with_a_nan_close():
+    df, vol = _history(900, seed=1)
+    df.iloc[300, 0] = np.nan
+    expected = build_features(df, vol)
+
+    engine = FeatureEngine()
+    rows = {}
+    for date in df.index:
+        row = engine.update(date, df.at[date, 'QQQ'], df.at[date, 'VIX'], vol[date])
+        if row is not None:
+            rows[date] = row
+    got = pd.DataFrame.from_dict(rows, orient='index')
+
+    # rows resume once the NaN has left the longest window, with clean running sums
+    assert list(got.index) == list(expected.index)
+    assert expected.index[99] == df.index[299] and expected.index[100] == df.index[501]
+    np.testing.assert_allclose(got[expected.columns].to_numpy(dtype=float),
+                               expected.to_numpy(dtype=float), rtol=1e-9, atol=1e-12)
+
+
+def test_engine_state_persists(tmp_path):
+    df, vol = _history()
+    engine = FeatureEngine.from_frame(df.iloc[:-1], vol)
+    engine.save(tmp_path / 'engine.pkl')
+    restored = FeatureEngine.load(tmp_path / 'engine.pkl')
+
+    last = df.index[-1]
+    row = restored.update(last, df.at[last, 'QQQ'], df.at[last, 'VIX'], vol[last])
+    expected = build_features(df, vol)[FEATURE_COLS].iloc[-1:].to_numpy()
+    np.testing.assert_allclose(FeatureEngine.vector(row), expected, rtol=1e-9)
@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+MODEL_DIR = os.path.join(ROOT, 'tqqq_agent', 'models')
+HEAVY = {'torch', 'pandas', 'yfinance', 'joblib', 'sklearn', 'lightgbm'}
+# cumulative import budget for the CLI module, in microseconds
+BUDGET_US = int(os.getenv('TQQQ_IMPORT_BUDGET_US', 1_000_000))
+
+
+def _importtime(args, **env):
+    proc = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=ROOT, capture_output=True,
+                          text=True, env=dict(os.environ, **env))
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cum, name = line[len('import time:'):].split('|')
+        cumulative[name.strip()] = int(cum)
+    return proc, cumulative
+
+
+def _heavy(cumulative):
+    return sorted({name.split('.')[0] for name in cumulative} & HEAVY)
+
+
+def test_cli_import_stays_within_budget():
+    proc, cumulative = _importtime(['-c', 'import tqqq_agent.app.main'])
+    assert proc.returncode == 0, proc.stderr
+    assert _heavy(cumulative) == []
+    assert cumulative['tqqq_agent.app.main'] < BUDGET_US
+
+
+def test_check_mode_validates_without_torch():
+    proc, cumulative = _importtime(['-m', 'tqqq_agent.app.main', '--check'], MODEL_DIR=MODEL_DIR)
+    assert proc.returncode == 0, proc.stderr
+    assert 'Check OK' in proc.stderr
+    assert _heavy(cumulative) == []
+
+    proc, _ = _importtime(['-m', 'tqqq_agent.app.main', '--check'], MODEL_DIR=MODEL_DIR, THRESH_VOTE='4',
+                          LSTM_MODEL_FILE='missing.pth')
+    assert proc.returncode == 1
+    assert 'THRESH_VOTE' in proc.stderr and 'missing.pth' in proc.stderr
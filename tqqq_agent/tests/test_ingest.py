@@ -0,0 +1,139 @@
+import asyncio
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tqqq_agent.app.ingest import (HTTPProvider, Ingestor, Provider, ReplayProvider, TransientError,
+                                   fetch_bars, is_transient, serve_replay, write_replay)
+from tqqq_agent.app.synthetic import synthetic_bars
+
+
+@pytest.fixture
+def replay(tmp_path):
+    bars = synthetic_bars(300, tickers=('QQQ', 'SPY'), seed=7, end=pd.Timestamp('2024-06-28'))
+    write_replay(bars, tmp_path)
+    return bars, ReplayProvider(tmp_path)
+
+
+def _serve(source, **kwargs):
+    server = serve_replay(source, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def test_http_provider_retries_transient_errors(replay):
+    bars, source = replay
+    server, url = _serve(source, fail_first=2)
+    try:
+        out = fetch_bars(['QQQ', '^VIX'], period='max', provider=HTTPProvider(url), backoff=0)
+    finally:
+        server.shutdown()
+    assert server.requests == {'QQQ': 3, '^VIX': 3}
+    assert len(out) == len(bars)
+    np.testing.assert_allclose(out['Adj Close']['QQQ'].to_numpy(), bars['Adj Close']['QQQ'].to_numpy())
+
+
+def test_retries_are_bounded_and_lookup_errors_are_not_retried(replay):
+    _, source = replay
+    server, url = _serve(source, fail_first=10)
+    try:
+        with pytest.raises(TransientError):
+            fetch_bars(['QQQ'], provider=HTTPProvider(url), retries=2, backoff=0)
+        with pytest.raises(LookupError):
+            fetch_bars(['NOPE'], provider=HTTPProvider(url), retries=2, backoff=0)
+    finally:
+        server.shutdown()
+    assert server.requests == {'QQQ': 3, 'NOPE': 1}
+
+
+class _SlowProvider(Provider):
+    def __init__(self, source):
+        self.source = source
+        self.active = 0
+        self.peak = 0
+        self.calls = []
+
+    async def fetch(self, ticker, period='2y', interval='1d', start=None):
+        self.calls.append((ticker, start))
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        return await self.source.fetch(ticker, period=period, interval=interval, start=start)
+
+
+def test_concurrency_limit_and_coalescing(replay):
+    _, source = replay
+    provider = _SlowProvider(source)
+    ingestor = Ingestor(provider, concurrency=2)
+
+    async def go():
+        # duplicates of in-flight requests share one provider call
+        same = await asyncio.gather(*(ingestor.fetch('QQQ') for _ in range(5)))
+        await ingestor.fetch_many(['QQQ', 'SPY', '^VIX'], period='1y')
+        return same
+
+    same = asyncio.run(go())
+    assert all(f.equals(same[0]) for f in same)
+    assert len({id(f) for f in same}) == len(same)
+    assert provider.calls.count(('QQQ', None)) == 2
+    assert provider.peak == 2
+
+
+def test_cached_tickers_only_request_the_tail(replay, tmp_path):
+    _, source = replay
+    provider = _SlowProvider(source)
+    first = fetch_bars(['QQQ', '^VIX'], period='max', provider=provider, cache_dir=str(tmp_path / 'bars'))
+    second = fetch_bars(['QQQ', '^VIX'], period='max', provider=provider, cache_dir=str(tmp_path / 'bars'))
+    # the tail starts at the final bar before the last cached one
+    tail = first.index[-2]
+    assert provider.calls[:2] == [('QQQ', None), ('^VIX', None)]
+    assert sorted(provider.calls[2:]) == [('QQQ', tail), ('^VIX', tail)]
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_only_network_errors_are_transient():
+    # stand-ins shaped like requests.exceptions.ConnectTimeout and yfinance's missing-ticker error
+    class Timeout(OSError):
+        pass
+
+    class ConnectTimeout(Timeout):
+        pass
+
+    class YFPricesMissingError(Exception):
+        pass
+
+    assert is_transient(ConnectionResetError()) and is_transient(ConnectTimeout())
+    assert not is_transient(YFPricesMissingError('NOPE: no price data found'))
+    assert not is_transient(ValueError('bad period'))
+
+
+def test_timed_out_calls_do_not_stack_threads():
+    class Stuck(Provider):
+        max_threads = 2
+
+        def __init__(self):
+            self.release = threading.Event()
+            self.running = 0
+            self.peak = 0
+            self.lock = threading.Lock()
+
+        def _block(self):
+            with self.lock:
+                self.running += 1
+                self.peak = max(self.peak, self.running)
+            self.release.wait(5)
+            with self.lock:
+                self.running -= 1
+
+        async def fetch(self, ticker, period='2y', interval='1d', start=None):
+            return await self._blocking(self._block)
+
+    provider = Stuck()
+    ingestor = Ingestor(provider, concurrency=4, retries=3, backoff=0, timeout=0.05)
+    with pytest.raises((TransientError, asyncio.TimeoutError)):
+        asyncio.run(ingestor.fetch_many(['A', 'B', 'C']))
+    provider.release.set()
+    assert provider.peak == 2
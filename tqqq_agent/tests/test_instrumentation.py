@@ -0,0 +1,47 @@
+import json
+
+from tqqq_agent.app.instrumentation import METRICS, Metrics, export, timed
+
+
+def test_stage_timers_counters_and_dumps():
+    m = Metrics()
+    for _ in range(3):
+        with m.stage('fetch'):
+            pass
+    m.incr('fetch.download_requests', 2)
+
+    snap = m.snapshot()
+    assert snap['stages']['fetch']['count'] == 3
+    assert snap['counters'] == {'fetch.download_requests': 2}
+    assert json.loads(m.to_json(run_id='x'))['run_id'] == 'x'
+
+    prom = m.to_prometheus()
+    assert 'tqqq_stage_seconds_count{stage="fetch"} 3' in prom
+    assert 'tqqq_events_total{event="fetch.download_requests"} 2' in prom
+    assert 'tqqq.fetch.download_requests:2|c' in m.to_statsd()
+
+
+def test_statsd_sends_increments_since_last_flush():
+    m = Metrics()
+    m.incr('refresh', 3)
+    with m.stage('fetch'):
+        pass
+    first = m.to_statsd()
+    assert 'tqqq.refresh:3|c' in first and 'tqqq.stage.fetch:' in first
+
+    m.incr('refresh', 2)
+    assert m.to_statsd() == 'tqqq.refresh:2|c'
+    assert m.to_statsd() == ''
+
+
+def test_timed_records_into_global_registry_and_exports(tmp_path, monkeypatch):
+    METRICS.reset()
+
+    @timed('unit.work')
+    def work():
+        return 42
+
+    assert work() == 42
+    monkeypatch.setenv('METRICS_FILE', str(tmp_path / 'tqqq.prom'))
+    export(run_id='test')
+    assert 'stage="unit.work"' in (tmp_path / 'tqqq.prom').read_text()
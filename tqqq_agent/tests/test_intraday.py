@@ -0,0 +1,92 @@
+import copy
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from tqqq_agent.app.feature_store import features_from_bars
+from tqqq_agent.app.features import FEATURE_COLS, FeatureEngine
+from tqqq_agent.app.intraday import BarRing, IntradaySession, replay
+from tqqq_agent.app.models import Models, StreamingLSTM
+from tqqq_agent.app.synthetic import MINUTES_PER_DAY, synthetic_bars
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', 'models')
+
+
+def _models():
+    models = Models(MODEL_DIR, 'lgb_model.pkl', 'lstm_model.pth', 'scaler.pkl')
+    models.load()
+    return models
+
+
+def _minutes(daily, day):
+    # minute bars for one daily bar: closes drift from the previous close to the day's close
+    prev = daily['Adj Close'].iloc[day - 1]
+    bar = daily.iloc[day]
+    index = daily.index[day] + pd.Timedelta(hours=9, minutes=30) + pd.to_timedelta(np.arange(MINUTES_PER_DAY), 'min')
+    frames = {}
+    for f in ('Open', 'High', 'Low', 'Close', 'Volume'):
+        cols = {}
+        for t in ('QQQ', '^VIX'):
+            path = np.linspace(prev[t], bar[('Adj Close', t)], MINUTES_PER_DAY + 1)
+            cols[t] = {'Open': path[:-1], 'High': np.maximum(path[:-1], path[1:]), 'Low': np.minimum(path[:-1], path[1:]),
+                       'Close': path[1:], 'Volume': np.full(MINUTES_PER_DAY, bar[('Volume', t)] / MINUTES_PER_DAY)}[f]
+        frames[f] = pd.DataFrame(cols, index=index)
+    return pd.concat(frames, axis=1)
+
+
+def test_bar_ring_keeps_newest_bars():
+    ring = BarRing(4)
+    for i in range(10):
+        ring.append(i, i, i, i, i, i)
+    ts, ohlcv = ring.last()
+    assert len(ring) == 4 and list(ts) == [6, 7, 8, 9] and list(ring.last(2)[1][:, 3]) == [8, 9]
+
+
+def test_previews_do_not_commit():
+    bars = synthetic_bars(300, seed=3)
+    df = pd.concat({'QQQ': bars['Adj Close']['QQQ'], 'VIX': bars['Adj Close']['^VIX']}, axis=1)
+    engine = FeatureEngine.from_frame(df.iloc[:-1], bars['Volume']['QQQ'])
+    date, close, vix, vol = df.index[-1], df['QQQ'].iloc[-1], df['VIX'].iloc[-1], bars['Volume']['QQQ'].iloc[-1]
+    preview = engine.preview(date, close, vix, vol)
+    assert engine.n == len(df) - 1
+    expected = copy.deepcopy(engine).update(date, close, vix, vol)
+    assert all(np.isclose(preview[c], expected[c], rtol=1e-12) for c in FEATURE_COLS)
+
+    stream = StreamingLSTM(_models(), seq_len=50)
+    rows = np.random.default_rng(0).normal(size=(51, 10)).astype(np.float32)
+    stream.warm_up(rows[:50])
+    before = stream.last_probs
+    peeked = stream.peek(rows[50])
+    assert stream.last_probs is before
+    np.testing.assert_allclose(peeked, stream.step(rows[50]), atol=1e-7)
+
+
+def test_session_close_matches_daily_signal():
+    daily = synthetic_bars(600, seed=5)
+    models = _models()
+    session = IntradaySession(models, 0.6, 0.65, 2, intraday_features=True).warm_up(daily.iloc[:-1])
+    minutes = _minutes(daily, len(daily) - 1)
+
+    t0 = time.perf_counter()
+    signals = []
+    signal = replay(session, minutes, signals.append)
+    per_bar = (time.perf_counter() - t0) / len(signals)
+    assert len(signals) == MINUTES_PER_DAY and per_bar < 5e-3
+
+    # at the last bar the partial day is the full daily bar
+    _, X = features_from_bars(daily)
+    np.testing.assert_allclose(
+        signal['lgb_prob'], models.predict_lgb_prob(models.scaler.transform(X[-1:].astype(np.float64)))[0, 1],
+        atol=1e-9)
+    # the carried LSTM state has seen the warm-up window plus the new row
+    np.testing.assert_allclose(signal['lstm_probs'], models.predict_lstm_windows(X[None, -253:])[0], atol=1e-5)
+    closes = daily['Adj Close']['QQQ'].to_numpy()
+    assert np.isclose(signal['sma200'], closes[-200:].mean())
+    assert signal['intraday']['elapsed'] == 1.0
+
+    # the next day's first bar commits the previous one
+    n = session.engine.n
+    session.on_bar('QQQ', daily.index[-1] + pd.Timedelta(days=1, hours=9, minutes=30), *[closes[-1]] * 4, 1e5)
+    assert session.engine.n == n + 1 and session.rings['QQQ'].ts.shape == (MINUTES_PER_DAY,)
@@ -0,0 +1,73 @@
+import logging
+import os
+
+from tqqq_agent.app import main as main_mod
+from tqqq_agent.app import utils
+from tqqq_agent.app.event_log import SQLiteStore, read_events
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', 'models')
+
+
+def _signal_lines(caplog):
+    keep = ('SMA200', 'LightGBM prob', 'LSTM Bull prob', 'Bullish models', 'SIGNAL')
+    return [r.getMessage() for r in caplog.records if any(k in r.getMessage() for k in keep)]
+
+
+def test_mock_data_runs_real_pipeline_deterministically(monkeypatch, caplog, tmp_path):
+    monkeypatch.setattr(main_mod, 'USE_MOCK_DATA', True)
+    monkeypatch.setattr(main_mod, 'MODEL_DIR', MODEL_DIR)
+    monkeypatch.setattr(main_mod, 'PREDICTION_CACHE_DIR', None)
+    monkeypatch.setattr(main_mod, 'EVENT_LOG_URL', str(tmp_path / 'events.sqlite'))
+    monkeypatch.setattr(utils, 'fetch_ohlcv', lambda *a, **kw: (_ for _ in ()).throw(AssertionError('fetched')))
+
+    caplog.set_level(logging.INFO, logger='tqqq_agent')
+    main_mod.main([])
+    first = _signal_lines(caplog)
+    caplog.clear()
+    main_mod.main([])
+
+    assert len(first) == 5
+    assert first == _signal_lines(caplog)
+    snap = main_mod.METRICS.snapshot()
+    assert 'build_features' in snap['stages']
+    assert 'models.lgb_predict' in snap['stages'] and 'models.lstm_predict' in snap['stages']
+
+    events = read_events(SQLiteStore(tmp_path / 'events.sqlite'))
+    assert [e['kind'] for e in events] == ['features', 'prediction', 'decision'] * 2
+    assert events[-1]['payload']['bullish_count'] == int(first[3].split()[-1].split('/')[0])
+
+
+def test_rerun_is_served_from_prediction_cache(monkeypatch, caplog, tmp_path):
+    monkeypatch.setattr(main_mod, 'USE_MOCK_DATA', True)
+    monkeypatch.setattr(main_mod, 'MODEL_DIR', MODEL_DIR)
+    monkeypatch.setattr(main_mod, 'PREDICTION_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(main_mod, 'EVENT_LOG_URL', None)
+    loads = []
+    real_load = main_mod.Models.load
+    monkeypatch.setattr(main_mod.Models, 'load', lambda self, *a, **kw: loads.append(1) or real_load(self, *a, **kw))
+
+    caplog.set_level(logging.INFO, logger='tqqq_agent')
+    main_mod.main([])
+    first = _signal_lines(caplog)
+    caplog.clear()
+    main_mod.main([])
+
+    assert loads == [1]
+    assert 'Prediction cache hit' in caplog.text
+    assert _signal_lines(caplog) == first
+    counters = main_mod.METRICS.snapshot()['counters']
+    assert counters['cache.features_hits'] == 1 and counters['cache.predictions_hits'] == 1
+
+
+def test_cache_write_failure_does_not_cost_the_signal(monkeypatch, caplog, tmp_path):
+    from tqqq_agent.app.prediction_cache import PredictionCache
+    monkeypatch.setattr(main_mod, 'USE_MOCK_DATA', True)
+    monkeypatch.setattr(main_mod, 'MODEL_DIR', MODEL_DIR)
+    monkeypatch.setattr(main_mod, 'PREDICTION_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(main_mod, 'EVENT_LOG_URL', None)
+    monkeypatch.setattr(PredictionCache, 'put_prediction', lambda *a, **kw: (_ for _ in ()).throw(OSError('disk full')))
+
+    caplog.set_level(logging.INFO, logger='tqqq_agent')
+    main_mod.main([])
+    assert len(_signal_lines(caplog)) == 5
+    assert 'Prediction cache write failed: disk full' in caplog.text
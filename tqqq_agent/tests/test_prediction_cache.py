@@ -0,0 +1,83 @@
+import os
+import time
+
+import numpy as np
+
+from tqqq_agent.app.prediction_cache import PredictionCache, artifact_hash, feature_spec_hash
+
+
+def _artifacts(tmp_path, content=b'v1'):
+    paths = []
+    for name in ('lgb_model.pkl', 'lstm_model.pth', 'scaler.pkl'):
+        p = tmp_path / name
+        p.write_bytes(content + name.encode())
+        paths.append(p)
+    return paths
+
+
+def test_features_roundtrip_and_ttl(tmp_path):
+    cache = PredictionCache(tmp_path / 'cache', ttl_seconds=60)
+    spec = feature_spec_hash()
+    dates, X = np.arange(3, dtype=np.int64), np.ones((3, 10), dtype=np.float32)
+    assert cache.get_features('QQQ', '2024-01-02', spec) is None
+    cache.put_features('QQQ', '2024-01-02', spec, dates, X)
+
+    got_dates, got_X = cache.get_features('QQQ', '2024-01-02', spec)
+    assert got_X.dtype == np.float32 and (got_X == X).all() and (got_dates == dates).all()
+    assert cache.get_features('QQQ', '2024-01-03', spec) is None
+
+    cache.ttl_seconds = -1
+    assert cache.get_features('QQQ', '2024-01-02', spec) is None
+
+
+def test_prediction_invalidated_when_artifacts_change(tmp_path):
+    paths = _artifacts(tmp_path)
+    cache = PredictionCache(tmp_path / 'cache')
+    key = cache.prediction_key(np.zeros((252, 10)), 'eager', 1, 0.6, 0.65, 2)
+    v1 = artifact_hash(paths)
+    cache.put_prediction(key, v1, {'lgb_prob': 0.7, 'lstm_probs': [0.5, 0.3, 0.2]})
+    assert cache.get_prediction(key, v1)['lgb_prob'] == 0.7
+    assert cache.prediction_key(np.zeros((252, 10)), 'eager', 1, 0.6, 0.65, 3) != key
+
+    paths[1].write_bytes(b'retrained')
+    v2 = artifact_hash(paths)
+    assert v2 != v1
+    assert cache.get_prediction(key, v2) is None
+    # another process still serving v1 keeps its entries
+    cache.put_prediction(key, v2, {'lgb_prob': 0.4, 'lstm_probs': [0.2, 0.3, 0.5]})
+    assert cache.get_prediction(key, v1)['lgb_prob'] == 0.7
+    assert cache.get_prediction(key, v2)['lgb_prob'] == 0.4
+
+
+def test_prune_evicts_least_recently_used_versions(tmp_path):
+    cache = PredictionCache(tmp_path, ttl_seconds=3600)
+    for i, version in enumerate(('a' * 64, 'b' * 64, 'c' * 64)):
+        cache.put_prediction('k', version, {'i': i})
+        directory = tmp_path / 'predictions' / version[:16]
+        for p in (directory / 'k.json', directory):
+            os.utime(p, (time.time() - 30 + i, time.time() - 30 + i))
+    assert cache.get_prediction('k', 'a' * 64) is not None
+    cache.max_versions = 2
+    cache.prune()
+    assert sorted(p.name for p in (tmp_path / 'predictions').iterdir()) == ['a' * 16, 'c' * 16]
+
+    # a version left with only expired entries is removed
+    cache.ttl_seconds = 20
+    cache.prune('predictions')
+    assert [p.name for p in (tmp_path / 'predictions').iterdir()] == ['a' * 16]
+
+
+def test_lru_eviction(tmp_path):
+    cache = PredictionCache(tmp_path, max_entries=2)
+    version = 'a' * 64
+    for i, key in enumerate(('k1', 'k2')):
+        cache.put_prediction(key, version, {'i': i})
+        # make the write order visible to mtime-based LRU on coarse filesystems
+        path = tmp_path / 'predictions' / version[:16] / f'{key}.json'
+        os.utime(path, (time.time() - 10 + i, time.time() - 10 + i))
+    assert cache.get_prediction('k1', version) is not None
+    cache.put_prediction('k3', version, {'i': 3})
+
+    assert cache.get_prediction('k2', version) is None
+    assert cache.get_prediction('k1', version) is not None
+    assert cache.get_prediction('k3', version) is not None
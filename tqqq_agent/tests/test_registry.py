@@ -0,0 +1,107 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+import torch
+
+from tqqq_agent.app.models import MockLGB, MockLSTM, Models
+from tqqq_agent.app.registry import HotModels, ModelRegistry
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', 'models')
+FILES = ('lgb_model.pkl', 'lstm_model.pth', 'scaler.pkl')
+SEQS = np.random.default_rng(3).normal(size=(2, 252, 10)).astype(np.float32)
+
+
+def _variant(tmp_path, name, bias_shift=0.0):
+    # a copy of the repo models; a shifted LSTM output bias makes its outputs distinguishable
+    src = tmp_path / 'src' / name
+    shutil.copytree(MODEL_DIR, src, ignore=lambda d, names: [n for n in names if n not in FILES])
+    if bias_shift:
+        state = torch.load(src / 'lstm_model.pth', map_location='cpu')
+        state['fc.bias'] = state['fc.bias'] + torch.tensor([bias_shift, 0.0, 0.0])
+        torch.save(state, src / 'lstm_model.pth')
+    return src
+
+
+def test_publish_verify_and_tamper(tmp_path):
+    registry = ModelRegistry(tmp_path / 'registry')
+    registry.publish(_variant(tmp_path, 'v1'), activate=True)
+    assert registry.versions() == ['v1'] and registry.current() == 'v1'
+    manifest = registry.verify('v1')
+    assert set(FILES) | {'golden.npz'} <= set(manifest['files'])
+    assert not registry.load('v1').mocked
+
+    with pytest.raises(FileExistsError):
+        registry.publish(_variant(tmp_path, 'again'), version='v1')
+    with open(registry.path('v1') / 'scaler.pkl', 'ab') as f:
+        f.write(b'\0')
+    with pytest.raises(ValueError, match='checksum'):
+        registry.load('v1')
+
+
+def test_failed_publish_leaves_nothing_behind(tmp_path):
+    registry = ModelRegistry(tmp_path / 'registry')
+    src = _variant(tmp_path, 'v1')
+    good = (src / 'lstm_model.pth').read_bytes()
+    (src / 'lstm_model.pth').write_bytes(b'not a model')
+    with pytest.raises(RuntimeError):
+        registry.publish(src)
+    assert list(registry.root.iterdir()) == []
+
+    (src / 'lstm_model.pth').write_bytes(good)
+    assert registry.publish(src) == 'v1' and registry.versions() == ['v1']
+    assert [p.name for p in registry.root.iterdir()] == ['v1']
+
+
+def test_failed_load_raises_unless_mocks_allowed(tmp_path, monkeypatch):
+    src = _variant(tmp_path, 'broken')
+    (src / 'lstm_model.pth').write_bytes(b'not a model')
+    monkeypatch.delenv('ALLOW_MOCK_MODELS', raising=False)
+    with pytest.raises(RuntimeError, match='ALLOW_MOCK_MODELS'):
+        Models(str(src), *FILES).load()
+    models = Models(str(src), *FILES)
+    models.load(allow_mock=True)
+    assert isinstance(models.lstm_model, MockLSTM) and not isinstance(models.lgb_model, MockLGB)
+
+
+def test_hot_swap_rejects_bad_version_and_rolls_back(tmp_path):
+    registry = ModelRegistry(tmp_path / 'registry')
+    registry.publish(_variant(tmp_path, 'v1'), activate=True)
+    registry.publish(_variant(tmp_path, 'v2', bias_shift=2.0))
+    hot = HotModels(registry, poll_seconds=3600)
+    hot.start()
+    try:
+        v1 = hot.snapshot()
+        registry.activate('v2')
+        assert hot.load() and hot.version == 'v2'
+        assert hot.snapshot().predict_lstm_windows(SEQS)[0, 0] > v1.predict_lstm_windows(SEQS)[0, 0]
+
+        # v3 is activated but its weights changed after publishing
+        registry.publish(_variant(tmp_path, 'v3'), activate=True)
+        with open(registry.path('v3') / 'lstm_model.pth', 'ab') as f:
+            f.write(b'\0')
+        assert not hot.load() and hot.version == 'v2'
+
+        # republishing v3 (a new created_at) makes it eligible again
+        shutil.rmtree(registry.path('v3'))
+        registry.publish(_variant(tmp_path, 'v3b'), version='v3', activate=True)
+        assert hot.load() and hot.version == 'v3'
+
+        assert hot.rollback() == 'v2' and hot.version == 'v2'
+        assert hot.rollback() == 'v1' and hot.version == 'v1'
+    finally:
+        hot.stop()
+
+
+def test_refused_rollback_raises_and_keeps_registry_state(tmp_path):
+    registry = ModelRegistry(tmp_path / 'registry')
+    registry.publish(_variant(tmp_path, 'v1'), activate=True)
+    registry.publish(_variant(tmp_path, 'v2', bias_shift=2.0), activate=True)
+    hot = HotModels(registry, keep=1)
+    hot.load()
+    with open(registry.path('v1') / 'scaler.pkl', 'ab') as f:
+        f.write(b'\0')
+    with pytest.raises(RuntimeError, match='refused'):
+        hot.rollback()
+    assert hot.version == 'v2' and registry.current() == 'v2' and registry.state()['history'] == ['v1']
@@ -0,0 +1,97 @@
+import os
+
+import numpy as np
+import pandas as pd
+import torch
+
+from tqqq_agent.app.models import Models
+from tqqq_agent.app.features import FeatureEngine
+from tqqq_agent.app.scenarios import CALENDAR_COLS, VIX_COL, Scenarios, evaluate, vote_distribution
+from tqqq_agent.app.synthetic import synthetic_bars
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', 'models')
+FILES = ('lgb_model.pkl', 'lstm_model.pth', 'scaler.pkl')
+
+
+def test_shared_prefix_scoring_matches_full_windows():
+    models = Models(MODEL_DIR, *FILES)
+    models.load()
+    rng = np.random.default_rng(0)
+    prefix = rng.normal(size=(249, 10)).astype(np.float32)
+    tails = rng.normal(size=(40, 3, 10)).astype(np.float32)
+    windows = np.concatenate([np.broadcast_to(prefix, (40, 249, 10)), tails], axis=1)
+
+    threads = torch.get_num_threads()
+    lgb, lstm = models.score_scenarios(prefix, tails, batch_size=16, threads=2)
+    assert torch.get_num_threads() == threads
+    lgb_full, lstm_full = models.score(windows, batch_size=7)
+    np.testing.assert_allclose(lgb, lgb_full, atol=1e-12)
+    np.testing.assert_allclose(lstm, lstm_full, atol=1e-5)
+    np.testing.assert_allclose(lstm[:1], models.predict_lstm_windows(windows[:1], batch_size=1), atol=1e-5)
+
+    mocks = Models(MODEL_DIR, *FILES)
+    mocks.load(mock=True)
+    lgb, lstm = mocks.score_scenarios(prefix, tails)
+    assert lgb.shape == (40,) and np.allclose(lstm, 1 / 3)
+
+
+def test_scenario_sets():
+    bars = synthetic_bars(700, seed=2)
+    scenarios = Scenarios(bars)
+    prefix, tails, close, sma = scenarios.vix_shocks([0, 10])
+    assert prefix.shape == (251, 10) and tails.shape == (2, 1, 10)
+    assert tails[1, 0, VIX_COL] - tails[0, 0, VIX_COL] == 10
+    assert (np.delete(tails[1, 0], VIX_COL) == np.delete(tails[0, 0], VIX_COL)).all()
+
+    prefix, tails, close, sma = scenarios.bootstrap(50, horizon=5, seed=1)
+    assert prefix.shape == (247, 10) and tails.shape == (50, 5, 10)
+    np.testing.assert_array_equal(tails, scenarios.bootstrap(50, horizon=5, seed=1)[1])
+    assert np.isfinite(tails).all() and (close > 0).all()
+
+    prefix, tails, close, sma = scenarios.bootstrap(20, horizon=1, seed=3)
+    closes = bars['Adj Close']['QQQ'].to_numpy()
+    np.testing.assert_allclose(sma, (closes[-199:].sum() + close) / 200)
+    np.testing.assert_allclose(tails[:, 0, 9], close / closes[-1] - 1, rtol=1e-5)
+
+    prefix, tails, close, sma = scenarios.noise(30, seed=5)
+    assert (tails[:, 0, CALENDAR_COLS] == scenarios.X[-1, CALENDAR_COLS]).all()
+    assert (tails[:, 0, VIX_COL] != scenarios.X[-1, VIX_COL]).any()
+
+
+def test_bootstrap_matches_feature_engine():
+    bars = synthetic_bars(500, seed=6)
+    scenarios = Scenarios(bars)
+    prefix, tails, close, sma = scenarios.bootstrap(3, horizon=8, seed=2)
+    df = bars['Adj Close'][['QQQ', '^VIX']].set_axis(['QQQ', 'VIX'], axis=1).dropna()
+    for p in range(3):
+        engine = FeatureEngine.from_frame(df, bars['Volume']['QQQ'])
+        date, px = df.index[-1], scenarios.closes[-1]
+        for d in range(8):
+            # replay the path through the engine: the same close, VIX and volume as the tail row
+            date += pd.offsets.BDay(1)
+            px *= 1 + tails[p, d, 9].astype(np.float64)
+            row = engine.update(date, px, float(tails[p, d, VIX_COL]), float(tails[p, d, 6]))
+            np.testing.assert_allclose(FeatureEngine.vector(row)[0], tails[p, d], rtol=1e-4, atol=1e-5)
+
+
+def test_vote_distribution():
+    models = Models(MODEL_DIR, *FILES)
+    models.load()
+    scenarios = Scenarios(synthetic_bars(700, seed=4))
+    current = evaluate(models, scenarios.current(), 0.6, 0.65, 2)
+    assert current['n'] == 1 and current['p_long'] in (0.0, 1.0)
+
+    # the current scenario is exactly the live 252-row window
+    prefix, tails, close, sma = scenarios.current()
+    np.testing.assert_array_equal(prefix, scenarios.X[-252:-1])
+    np.testing.assert_array_equal(tails[0], scenarios.X[-1:])
+    live = models.predict_lstm_windows(scenarios.X[None, -252:])
+    np.testing.assert_allclose(models.score_scenarios(prefix, tails)[1], live, atol=1e-5)
+    np.testing.assert_allclose(current['lstm_bull_q'][1], live[0, 0], atol=1e-5)
+
+    lgb = np.array([0.7, 0.7, 0.2, 0.2])
+    lstm = np.array([[0.8, 0.1, 0.1], [0.1, 0.8, 0.1], [0.8, 0.1, 0.1], [0.1, 0.1, 0.8]])
+    r = vote_distribution(lgb, lstm, np.full(4, 10.0), np.full(4, 9.0), 0.6, 0.65, 2)
+    assert r['p_long'] == 0.75 and r['bullish_counts'] == [0.0, 0.25, 0.5, 0.25]
+    assert r['ci'][0] < 0.75 < r['ci'][1]
+    assert r['voter_rates'] == {'sma': 1.0, 'lgb': 0.5, 'lstm': 0.5}
@@ -0,0 +1,100 @@
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+from tqqq_agent.app.models import Models
+from tqqq_agent.app.service import SignalService, serve
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', 'models')
+
+
+def _fetch(tickers, n=600):
+    rng = np.random.default_rng(5)
+    idx = pd.bdate_range('2021-01-01', periods=n)
+    close = pd.DataFrame({t: 100 * np.cumprod(1 + rng.normal(0.0005, 0.01, n)) for t in tickers}, index=idx)
+    volume = pd.DataFrame({t: np.abs(rng.normal(1e7, 2e6, n)) for t in tickers}, index=idx)
+    return pd.concat({'Adj Close': close, 'Volume': volume}, axis=1)
+
+
+def _get(port, path):
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=5) as r:
+            return r.status, r.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def test_service_serves_cached_signal_health_and_metrics():
+    models = Models(MODEL_DIR, 'lgb_model.pkl', 'lstm_model.pth', 'scaler.pkl')
+    models.load()
+    calls = []
+    service = SignalService(models, [('QQQ', 'TQQQ')], 0.6, 0.65, 2,
+                            fetch=lambda t: calls.append(t) or _fetch(t), refresh_seconds=3600)
+    server = serve(service, host='127.0.0.1', port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+    try:
+        assert _get(port, '/health')[0] == 503
+        service.start()
+        assert _get(port, '/health')[0] == 200
+
+        status, body = _get(port, '/signal?symbol=QQQ')
+        assert status == 200
+        signal = json.loads(body)
+        assert signal['trade_symbol'] == 'TQQQ' and 0 <= signal['bullish_count'] <= 3
+        assert _get(port, '/signal?symbol=SPY')[0] == 404
+
+        t0 = time.perf_counter()
+        for _ in range(50):
+            _get(port, '/signal')
+        # cached responses never trigger a refresh
+        assert len(calls) == 1
+        assert (time.perf_counter() - t0) / 50 < 0.05
+
+        status, body = _get(port, '/metrics')
+        assert status == 200
+        assert 'tqqq_http_requests_total{path="/signal"} 52' in body.decode()
+    finally:
+        service.stop()
+        server.shutdown()
+        server.server_close()
+
+
+def test_refresh_steps_kept_feature_state():
+    from tqqq_agent.app.batch import signals_from_bars
+    from tqqq_agent.app.instrumentation import METRICS
+
+    models = Models(MODEL_DIR, 'lgb_model.pkl', 'lstm_model.pth', 'scaler.pkl')
+    models.load()
+    full = _fetch(['QQQ', '^VIX'])
+    bars = {'n': len(full) - 3}
+    service = SignalService(models, [('QQQ', 'TQQQ')], 0.6, 0.65, 2,
+                            fetch=lambda t: full.iloc[:bars['n']], refresh_seconds=3600)
+    METRICS.reset()
+    assert service.refresh()
+    for n in (len(full) - 2, len(full)):
+        bars['n'] = n
+        assert service.refresh()
+    counters = METRICS.snapshot()['counters']
+    assert counters['service.state_rebuilds'] == 1 and counters['service.state_advances'] == 2
+
+    got = json.loads(service.signal_body('QQQ'))
+    want = signals_from_bars(full, [('QQQ', 'TQQQ')], models, 0.6, 0.65, 2)[0]
+    assert got['date'] == want['date'] and got['sma200'] == want['sma200']
+    assert abs(got['lgb_prob'] - want['lgb_prob']) < 1e-9
+    assert abs(got['lstm_bull'] - want['lstm_bull']) < 1e-5
+
+    # revised history (e.g. a dividend re-adjustment) rebuilds the state
+    full.loc[:, ('Adj Close', 'QQQ')] *= 0.99
+    assert service.refresh()
+    assert METRICS.snapshot()['counters']['service.state_rebuilds'] == 2
+
+    service.observe('/wp-login.php', 0.001)
+    service.observe('/signal', 0.001)
+    assert set(service.requests) == {'other', '/signal'}
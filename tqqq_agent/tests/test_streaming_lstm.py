@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+import torch
+
+from tqqq_agent.app.models import Models, StreamingLSTM
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', 'models')
+
+
+def _models():
+    models = Models(MODEL_DIR, 'lgb_model.pkl', 'lstm_model.pth', 'scaler.pkl')
+    models.load()
+    return models
+
+
+def _full(models, rows):
+    return models.predict_lstm_probs(torch.from_numpy(np.asarray(rows, dtype=np.float32))[None])[0]
+
+
+def test_step_carries_state_exactly():
+    models = _models()
+    rows = np.random.default_rng(0).normal(size=(60, 10)).astype(np.float32)
+    stream = StreamingLSTM(models, seq_len=50, resync_every=100)
+    np.testing.assert_allclose(stream.warm_up(rows[:50]), _full(models, rows[:50]), atol=1e-6)
+    for i in range(50, 60):
+        probs = stream.step(rows[i])
+    # the carried state has seen every row since the warm-up origin
+    np.testing.assert_allclose(probs, _full(models, rows[:60]), atol=1e-5)
+
+
+def test_resync_restores_full_window_result(tmp_path):
+    models = _models()
+    rows = np.random.default_rng(1).normal(size=(70, 10)).astype(np.float32)
+    stream = StreamingLSTM(models, seq_len=50, resync_every=5)
+    stream.warm_up(rows[:50])
+    for i in range(50, 55):
+        probs = stream.step(rows[i])
+    np.testing.assert_allclose(probs, _full(models, rows[5:55]), atol=1e-6)
+    assert stream.drift() < 1e-6
+
+    stream.save(tmp_path / 'stream.pt')
+    restored = StreamingLSTM(models, seq_len=50, resync_every=5).load(tmp_path / 'stream.pt')
+    np.testing.assert_allclose(restored.step(rows[55]), stream.step(rows[55]), atol=1e-6)
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+from tqqq_agent.app.backtest import evaluate
+from tqqq_agent.app.sweep import grid, random_combos, sweep
+
+
+def _probs(n=800, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.cumprod(1 + rng.normal(0.0005, 0.01, n))
+    return pd.DataFrame({
+        'close': close,
+        'sma200': pd.Series(close).rolling(50, min_periods=1).mean().to_numpy(),
+        'lgb_prob': rng.uniform(0, 1, n),
+        'lstm_bull': rng.uniform(0, 1, n),
+        'next_ret': rng.normal(0.001, 0.03, n),
+    }, index=pd.bdate_range('2018-01-01', periods=n))
+
+
+def test_sweep_matches_single_backtest_evaluation():
+    probs = _probs()
+    combos = grid([0.4, 0.6], [0.5, 0.65], [1, 2, 3])
+    results = sweep(probs, combos, cost_bps=5, chunk_size=4)
+    assert len(results) == 12
+    assert results['sharpe'].is_monotonic_decreasing
+
+    for row in results.itertuples():
+        ref = evaluate(probs, row.th_lgb, row.th_lstm, row.th_vote, cost_bps=5)
+        assert np.isclose(row.total_return, ref['total_return'])
+        assert np.isclose(row.turnover_per_year, ref['turnover_per_year'])
+        assert np.isclose(row.exposure, ref['exposure'])
+        equity = ref['equity']
+        assert np.isclose(row.max_drawdown, (equity / equity.cummax() - 1).min())
+
+
+def test_process_pool_gives_the_same_ranking():
+    probs = _probs(seed=1)
+    combos = random_combos(3000, seed=2)
+    serial = sweep(probs, combos, chunk_size=500)
+    parallel = sweep(probs, combos, chunk_size=500, workers=2)
+    pd.testing.assert_frame_equal(serial, parallel)
+    assert set(serial['th_vote']) <= {1, 2, 3}
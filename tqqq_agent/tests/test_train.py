@@ -0,0 +1,54 @@
+import json
+
+import numpy as np
+import torch
+
+from tqqq_agent.app.features import FEATURE_COLS
+from tqqq_agent.app.models import Models, lstm_regime
+from tqqq_agent.app.synthetic import synthetic_bars
+from tqqq_agent.app.train import HORIZON, WindowDataset, build_dataset, fold_scaler, train
+
+
+def test_window_dataset_reads_views():
+    X = np.arange(40, dtype=np.float32).reshape(20, 2)
+    ds = WindowDataset([X], [np.arange(20)], [np.array([4, 9])], seq_len=5)
+    seq, label = ds[1]
+    assert len(ds) == 2 and label == 9
+    assert np.shares_memory(seq.numpy(), X)
+    assert (seq.numpy() == X[5:10]).all()
+
+
+def test_folded_scaler_matches_scaled_input():
+    torch.manual_seed(0)
+    model = lstm_regime(len(FEATURE_COLS)).eval()
+    raw = np.random.default_rng(0).normal([0.01] * 6 + [1e7, 6, 2, 0.0], [0.02] * 6 + [2e6, 3, 1.4, 0.01],
+                                          size=(3, 252, len(FEATURE_COLS))).astype(np.float32)
+    mean, scale = raw.reshape(-1, raw.shape[-1]).mean(0), raw.reshape(-1, raw.shape[-1]).std(0)
+    with torch.no_grad():
+        expected = model(torch.from_numpy((raw - mean) / scale))
+        got = fold_scaler(model, mean, scale)(torch.from_numpy(raw))
+    np.testing.assert_allclose(got.numpy(), expected.numpy(), atol=1e-4)
+
+
+def test_train_writes_loadable_version_and_resumes(tmp_path):
+    bars = synthetic_bars(700, seed=11)
+    kw = dict(batch_size=64, stride=8, threads=1, thresholds={'lgb': 0.6, 'lstm': 0.65, 'vote': 2})
+    vdir = train(bars, ['QQQ'], str(tmp_path), version='v1', epochs=1, **kw)
+
+    meta = json.loads((vdir / 'metadata.json').read_text())
+    assert meta['version'] == 'v1' and meta['feature_cols'] == FEATURE_COLS
+    assert meta['thresholds'] == {'lgb': 0.6, 'lstm': 0.65, 'vote': 2}
+    assert meta['lstm']['epochs'] == 1 and 'training_date' in meta
+    # training rows end horizon bars before the validation window, so no label looks into it
+    rows = len(build_dataset(bars, ['QQQ'])['QQQ']['X'])
+    assert meta['rows']['train'] + HORIZON + meta['rows']['val'] == rows
+
+    models = Models(str(vdir), 'lgb_model.pkl', 'lstm_model.pth', 'scaler.pkl', backend='eager')
+    models.load()
+    assert not models.mocked
+    probs = models.predict_lstm_windows(np.zeros((2, 252, len(FEATURE_COLS)), dtype=np.float32))
+    assert probs.shape == (2, 3) and np.allclose(probs.sum(axis=1), 1, atol=1e-5)
+
+    vdir = train(bars, ['QQQ'], str(tmp_path), version='v1', resume=True, epochs=2, **kw)
+    meta = json.loads((vdir / 'metadata.json').read_text())
+    assert [h['epoch'] for h in meta['lstm']['history']] == [1, 2]